@@ -0,0 +1,119 @@
+import time
+import socket
+import logging
+import threading
+import configparser
+
+
+def load_connectivity_config(config_file='settings.cfg'):
+    """Load the services to probe and the probe timing settings."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'services': {
+            'mysql': (config.get('MySQL', 'host', fallback='127.0.0.1'),
+                      config.getint('MySQL', 'port', fallback=3306)),
+            'drive': (config.get('Connectivity', 'drive_host', fallback='www.googleapis.com'), 443)
+        },
+        'probe_timeout': config.getfloat('Connectivity', 'probe_timeout', fallback=2.0),
+        'min_interval': config.getfloat('Connectivity', 'min_interval', fallback=2.0),
+        'max_interval': config.getfloat('Connectivity', 'max_interval', fallback=60.0),
+        'down_max_interval': config.getfloat('Connectivity', 'down_max_interval', fallback=10.0)
+    }
+
+
+class ConnectivityManager:
+    """Tracks whether the services the till depends on are reachable.
+
+    Each service is probed with a TCP connect on its own schedule. After a
+    state change it is probed every min_interval seconds; while the state
+    holds, the interval doubles up to max_interval (or down_max_interval
+    while it is down, so recovery is noticed quickly). Consumers check
+    is_up() before connecting and subscribe() to hear about changes;
+    report_failure() lets a consumer that hit an error mark a service down
+    straight away instead of waiting for the next probe.
+    """
+
+    def __init__(self, config=None, services=None):
+        self.config = config or load_connectivity_config()
+        self.services = dict(self.config['services'])
+        if services is not None:
+            self.services = {name: self.services[name] for name in services}
+        self.logger = logging.getLogger(__name__)
+        self.states = {name: None for name in self.services}
+        self.intervals = {name: self.config['min_interval'] for name in self.services}
+        self.next_probe = {name: 0.0 for name in self.services}
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start probing in a background thread."""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_probe_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def subscribe(self, callback):
+        """Call callback(service, is_up) on every state change, from the probe thread."""
+        self.subscribers.append(callback)
+
+    def is_up(self, service):
+        """False only when the service is known to be down; unknown counts as up."""
+        return self.states.get(service) is not False
+
+    def report_failure(self, service):
+        """Mark a service down after a failed connect and re-probe it soon."""
+        if service not in self.services:
+            # Not probed by this manager, so it could never be marked up again
+            self.logger.debug(f"Ignoring failure of unmonitored service {service}")
+            return
+        self.set_state(service, False)
+        self.wake_event.set()
+
+    def run_probe_loop(self):
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for service in self.services:
+                if self.next_probe[service] <= now:
+                    self.set_state(service, self.probe(service))
+                    self.next_probe[service] = time.monotonic() + self.intervals[service]
+            wait = min(self.next_probe.values()) - time.monotonic()
+            self.wake_event.wait(max(wait, 0))
+            self.wake_event.clear()
+
+    def probe(self, service):
+        try:
+            with socket.create_connection(self.services[service], timeout=self.config['probe_timeout']):
+                return True
+        except OSError:
+            return False
+
+    def set_state(self, service, is_up):
+        if service not in self.services:
+            return
+        with self.lock:
+            changed = self.states[service] != is_up
+            self.states[service] = is_up
+            if changed:
+                # Probe often right after a change, then back off while it holds
+                self.intervals[service] = self.config['min_interval']
+                self.next_probe[service] = time.monotonic() + self.intervals[service]
+            else:
+                limit = self.config['max_interval'] if is_up else self.config['down_max_interval']
+                self.intervals[service] = min(self.intervals[service] * 2, limit)
+
+        if changed:
+            self.logger.info(f"{service} is {'reachable' if is_up else 'unreachable'}")
+            for callback in self.subscribers:
+                try:
+                    callback(service, is_up)
+                except Exception as e:
+                    self.logger.error(f"Error in connectivity subscriber: {e}")
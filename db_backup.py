@@ -0,0 +1,162 @@
+import os
+import time
+import gzip
+import shutil
+import sqlite3
+import logging
+import threading
+import configparser
+from datetime import datetime
+
+# Give up on stepped copying after this many restarts caused by till writes
+# and take the snapshot in a single pass instead (WAL keeps writers running).
+MAX_RESTARTS = 5
+
+
+def load_backup_config(config_file='settings.cfg'):
+    """Load backup settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'enabled': config.getboolean('Backup', 'enabled', fallback=False),
+        'directory': config.get('Backup', 'directory', fallback='backups'),
+        'interval_minutes': config.getint('Backup', 'interval_minutes', fallback=60),
+        'keep': config.getint('Backup', 'keep', fallback=24),
+        'compress': config.getboolean('Backup', 'compress', fallback=True),
+        'pages_per_step': config.getint('Backup', 'pages_per_step', fallback=64),
+        'step_sleep': config.getfloat('Backup', 'step_sleep', fallback=0.05)
+    }
+
+
+class DatabaseBackup:
+    """Takes online snapshots of users.db without blocking the till.
+
+    Pages are copied with the sqlite3 backup API a few at a time, sleeping
+    between steps so the till's own writes never queue behind the copy.
+    """
+
+    def __init__(self, db_name='users.db', config=None):
+        self.db_name = db_name
+        self.config = config or load_backup_config()
+        self.logger = logging.getLogger(__name__)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start taking backups in a background thread."""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_backup_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the background thread after the current step and wait for it."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run_backup_loop(self):
+        """Back up on the configured interval until stopped."""
+        self.logger.info("Starting database backup service")
+        interval = self.config['interval_minutes'] * 60
+        while not self.stop_event.is_set():
+            try:
+                self.run_once()
+            except InterruptedError as e:
+                if not self.stop_event.is_set():
+                    self.logger.error(f"Error backing up database: {e}")
+            except Exception as e:
+                self.logger.error(f"Error backing up database: {e}")
+            self.stop_event.wait(interval)
+        self.logger.info("Database backup service stopped")
+
+    def run_once(self):
+        """Take one snapshot, optionally compress it and rotate old ones."""
+        directory = self.config['directory']
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        started = time.monotonic()
+        base_name = os.path.splitext(os.path.basename(self.db_name))[0]
+        snapshot = os.path.join(directory, f"{base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+        temp_path = snapshot + '.tmp'
+
+        try:
+            self.copy_database(temp_path)
+        except Exception:
+            # A cancelled or failed copy leaves only a partial temp file
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if not self.verify(temp_path):
+            os.remove(temp_path)
+            raise sqlite3.DatabaseError("Backup failed integrity check")
+
+        if self.config['compress']:
+            with open(temp_path, 'rb') as source, gzip.open(snapshot + '.gz.tmp', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(temp_path)
+            temp_path, snapshot = snapshot + '.gz.tmp', snapshot + '.gz'
+        os.replace(temp_path, snapshot)
+
+        self.rotate(base_name)
+        self.logger.info(f"Backed up {self.db_name} to {snapshot} in {time.monotonic() - started:.1f}s")
+        return snapshot
+
+    def copy_database(self, target_path):
+        """Copy the live database to target_path in small page steps."""
+        restarts = [0]
+        last_remaining = [None]
+
+        def progress(status, remaining, total):
+            # Remaining pages go up when a till write restarted the copy
+            if last_remaining[0] is not None and remaining > last_remaining[0]:
+                restarts[0] += 1
+                if restarts[0] > MAX_RESTARTS:
+                    raise InterruptedError("Backup restarted too often")
+            last_remaining[0] = remaining
+            if self.stop_event.is_set():
+                raise InterruptedError("Backup cancelled")
+            time.sleep(self.config['step_sleep'])
+
+        source = sqlite3.connect(self.db_name)
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=self.config['pages_per_step'], progress=progress)
+            except InterruptedError:
+                if self.stop_event.is_set():
+                    raise
+                self.logger.info("Database busy, taking backup in a single pass")
+                source.backup(target, pages=-1)
+        finally:
+            target.close()
+            source.close()
+
+    def verify(self, path):
+        """Return True if the snapshot passes SQLite's quick check."""
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("PRAGMA quick_check").fetchone()[0] == 'ok'
+        finally:
+            conn.close()
+
+    def rotate(self, base_name):
+        """Delete the oldest snapshots beyond the configured count."""
+        directory = self.config['directory']
+        snapshots = sorted(
+            f for f in os.listdir(directory)
+            if f.startswith(f"{base_name}_") and (f.endswith('.db') or f.endswith('.db.gz'))
+        )
+        for file_name in snapshots[:-self.config['keep']]:
+            os.remove(os.path.join(directory, file_name))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backup_service = DatabaseBackup()
+    try:
+        backup_service.run_backup_loop()
+    except KeyboardInterrupt:
+        backup_service.stop()
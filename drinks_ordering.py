@@ -1,30 +1,34 @@
+# Imported first so the startup timing report covers the other imports
+from startup_timer import StartupTimer, timing_requested
 import tkinter as tk
-from tkinter import ttk, messagebox
-import json
-from decimal import Decimal
-from datetime import datetime
-import os
-import socket
+from tkinter import ttk, messagebox, simpledialog
 import threading
-import time
-from google_drive_utils import download_credentials_file
-import io
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-import pickle
+import os
 from user_management import UserManagement
-from PIL import Image, ImageTk
-import base64
+from money import Money
+from menu_compiler import load_compiled_menu
+from menu_index import diff_menu_indexes
+from menu_refresher import MenuRefresher, load_menu_config
+from menu_distribution import MenuServer, MenuSyncClient, load_distribution_config
+from menu_search import MenuSearch
+from quick_keys import SalesRanker, load_quick_keys_config
+from tabs import TabManager, WALK_IN
+from pos_engine import PosEngine, PaymentError
+from nfc_reader import TagReader, load_nfc_config
+from promotions import load_promotions, load_promotions_config, PromotionError
+from thumbnails import ThumbnailCache, load_thumbnail_config
+from connectivity import ConnectivityManager
+from db_backup import DatabaseBackup
+from transaction_logger import TransactionLogger
+from ledger_sync import LedgerReplicator, load_replication_config
 
-# If modifying these scopes, delete the file token.pickle.
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# Result buttons kept ready for the item search box
+MAX_SEARCH_RESULTS = 15
 
 class DrinksOrderingSystem:
-    def __init__(self, root):
+    def __init__(self, root, timer=None):
         self.root = root
+        self.timer = timer or StartupTimer()
         self.root.title("Drinks Ordering System")
         self.root.geometry("1200x800")
         #self.root.geometry("1920x1080")
@@ -34,14 +38,28 @@ class DrinksOrderingSystem:
         self.root.attributes('-fullscreen', True)
         
         # Add keyboard shortcut to close program (Ctrl+J)
-        self.root.bind('<Control-j>', lambda e: self.root.destroy())
+        self.root.bind('<Control-j>', lambda e: self.close())
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
+        # Initialize order; named bar tabs are kept alongside the walk-in order
+        self.tabs = TabManager()
+        self.order = self.tabs.order
+        self.total_amount = Money(0)
         
-        # Initialize order
-        self.current_order = []
-        self.total_amount = Decimal('0.00')
+        # Product thumbnails for menu buttons, loaded as levels are shown
+        thumbnail_config = load_thumbnail_config()
+        self.thumbnails = ThumbnailCache(self.root, thumbnail_config) if thumbnail_config['enabled'] else None
         
-        # Initialize user management
-        self.user_management = UserManagement()
+        # Transaction log entries are written by a background thread
+        self.transaction_logger = TransactionLogger()
+        self.transaction_logger.start()
+        
+        # Initialize user management; database setup waits until after the first frame
+        self.user_management = UserManagement(defer_setup=True)
+        # Started by warm_up once the database is ready
+        self.database_backup = None
+        self.ledger_replicator = None
+        self.timer.mark("services")
         
         # Configure style
         self.style = ttk.Style()
@@ -89,11 +107,95 @@ class DrinksOrderingSystem:
         # Load menu data
         self.load_menu_data()
         
+        # Bring back the orders and tabs that were open when the till last stopped
+        restored = self.tabs.restore(self.menu_index)
+        if restored:
+            print(f"Restored {restored} open tab(s)")
+        self.timer.mark("restore orders")
+        
+        # Rank items by recent sales for the quick-keys panel
+        self.quick_keys_config = load_quick_keys_config()
+        self.sales_ranker = SalesRanker(self.quick_keys_config['half_life_minutes'])
+        self.sales_ranker.seed_from_logs(
+            self.quick_keys_config['directory'],
+            self.quick_keys_config['seed_files'],
+            normalize=self.canonical_label
+        )
+        
+        # Happy hours, bundles and category deals, compiled once for checkout
+        self.promotions = None
+        promotions_config = load_promotions_config()
+        if promotions_config['enabled']:
+            try:
+                self.promotions = load_promotions(promotions_config['file'])
+            except PromotionError as e:
+                print(f"Error loading promotions: {str(e)}")
+        
+        # Pricing, payment and logging; this class only draws it and reads input
+        self.engine = PosEngine(
+            self.menu_index, self.user_management, self.tabs, self.transaction_logger, self.sales_ranker,
+            self.promotions
+        )
+        
+        self.timer.mark("menu")
+        
+        # Card taps come straight from the reader device, whatever has focus
+        self.awaiting_card = False
+        self.balance_dialog = None
+        self.nfc_reader = None
+        nfc_config = load_nfc_config()
+        if nfc_config['device']:
+            self.nfc_reader = TagReader(nfc_config, notify=lambda: self.root.after(0, self.handle_card_taps))
+            self.nfc_reader.start()
+        
         # Create content area
         self.create_content_area()
+        self.recover_payments()
+        self.timer.mark("build ui")
+        
+        # One probe thread tracks MySQL and Drive for everything on this till
+        self.connectivity = ConnectivityManager()
+        
+        # Keep the menu current in the background
+        self.start_menu_updates()
         
         # Start network monitoring after UI is set up
         self.start_network_monitoring()
+        
+        # Once the first frame is on screen, warm up the database in the background
+        self.root.after_idle(lambda: self.root.after(0, self.on_first_paint))
+    
+    def on_first_paint(self):
+        self.timer.mark("first paint")
+        self.status_var.set("Ready")
+        threading.Thread(target=self.warm_up, daemon=True).start()
+    
+    def warm_up(self):
+        """Set up the wallet database and start the services that use it."""
+        try:
+            self.user_management.warm_up()
+            
+            # Start online backups of users.db if enabled in settings.cfg
+            self.database_backup = DatabaseBackup(self.user_management.db_name)
+            if self.database_backup.config['enabled']:
+                self.database_backup.start()
+            
+            # Exchange wallet ledger events with other tills if enabled
+            replication_config = load_replication_config()
+            if replication_config['enabled'] and self.user_management.wallet is None:
+                replicator = LedgerReplicator(self.user_management, replication_config)
+                try:
+                    replicator.start()
+                    self.ledger_replicator = replicator
+                except OSError as e:
+                    # Usually the port is taken; this till would otherwise run with replication silently off
+                    message = f"Ledger replication NOT running: cannot listen on port {replication_config['port']} ({e})"
+                    print(message)
+                    self.root.after(0, lambda: messagebox.showerror("Replication", message))
+        except Exception as e:
+            print(f"Error warming up: {str(e)}")
+        self.timer.mark("warm-up")
+        self.timer.report()
     
     def create_default_menu(self):
         """Creates a default menu file if it doesn't exist."""
@@ -118,37 +220,30 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
             file.write(default_menu)
         print("Created default menu file")
     
-    def check_network_connection(self):
-        try:
-            # Try to connect to a reliable server (Google's DNS)
-            socket.create_connection(("8.8.8.8", 53), timeout=2)
-            return True
-        except OSError:
-            return False
+    def on_connectivity_change(self, service, is_up):
+        """Called from the probe thread when MySQL or Drive goes up or down."""
+        self.root.after(0, self.update_network_status)
     
     def update_network_status(self):
-        """Updates the network status in a thread-safe way."""
-        while True:
-            try:
-                is_connected = self.check_network_connection()
-                if is_connected != self.is_online:
-                    self.is_online = is_connected
-                    if is_connected:
-                        self.root.after(0, lambda: self.network_status.set("Online"))
-                        self.root.after(0, lambda: self.network_label.configure(foreground="green"))
-                        self.root.after(0, self.load_menu_data)
-                    else:
-                        self.root.after(0, lambda: self.network_status.set("Offline"))
-                        self.root.after(0, lambda: self.network_label.configure(foreground="red"))
-                time.sleep(5)
-            except Exception as e:
-                print(f"Error in network status update: {e}")
-                time.sleep(5)  # Wait before retrying
+        """Show which services are reachable in the status bar."""
+        states = self.connectivity.states
+        down = [service for service, state in states.items() if state is False]
+        self.is_online = not down
+        if not down:
+            self.network_status.set("Online")
+            self.network_label.configure(foreground="green")
+        elif len(down) == len(states):
+            self.network_status.set("Offline")
+            self.network_label.configure(foreground="red")
+        else:
+            names = {'mysql': 'Server', 'drive': 'Drive'}
+            self.network_status.set(", ".join(names.get(service, service) for service in down) + " offline")
+            self.network_label.configure(foreground="orange")
     
     def start_network_monitoring(self):
-        # Start network monitoring in a separate thread
-        network_thread = threading.Thread(target=self.update_network_status, daemon=True)
-        network_thread.start()
+        # Probe in the background and update the status bar on changes
+        self.connectivity.subscribe(self.on_connectivity_change)
+        self.connectivity.start()
     
     def create_content_area(self):
         # Create main content frame
@@ -159,6 +254,31 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         menu_frame = ttk.Frame(content_frame)
         menu_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 20))
         
+        # Item search box above the menu
+        search_frame = ttk.Frame(menu_frame)
+        search_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 10))
+        ttk.Label(search_frame, text="Search:", font=('Arial', 16)).pack(side=tk.LEFT, padx=5)
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var, font=('Arial', 16))
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.search_entry.bind('<Escape>', lambda e: self.clear_search())
+        ttk.Button(search_frame, text="Clear", command=self.clear_search).pack(side=tk.LEFT, padx=5)
+        self.search_var.trace_add('write', lambda *args: self.update_search_results())
+        
+        # Quick keys for the current best sellers
+        self.quick_keys_frame = ttk.LabelFrame(menu_frame, text="Quick Keys", padding="5")
+        self.quick_keys_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 10))
+        self.quick_key_buttons = []
+        self.quick_key_labels = ()
+        columns = max(1, (self.quick_keys_config['count'] + 1) // 2)
+        for position in range(self.quick_keys_config['count']):
+            button = ttk.Button(self.quick_keys_frame)
+            button.grid(row=position // columns, column=position % columns, sticky="ew", padx=2, pady=2)
+            self.quick_key_buttons.append(button)
+        for column in range(columns):
+            self.quick_keys_frame.columnconfigure(column, weight=1)
+        self.update_quick_keys()
+        
         # Create canvas and scrollbar
         self.canvas = tk.Canvas(menu_frame)
         scrollbar = ttk.Scrollbar(menu_frame, orient="vertical", command=self.canvas.yview)
@@ -209,8 +329,16 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         self.canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Create navigation history
+        # Create navigation history and the per-level widget cache
         self.navigation_history = []
+        self.level_frames = {}
+        self.current_level_frame = None
+        
+        # Search results reuse a fixed set of buttons instead of rebuilding per keystroke
+        self.showing_search = False
+        self.search_results_frame = ttk.Frame(self.scrollable_frame)
+        self.search_status = ttk.Label(self.search_results_frame, text="No matching items", font=('Arial', 14))
+        self.search_buttons = [ttk.Button(self.search_results_frame, width=30) for _ in range(MAX_SEARCH_RESULTS)]
         
         # Create category buttons
         self.show_level(self.menu_data)
@@ -219,12 +347,31 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         summary_frame = ttk.LabelFrame(content_frame, text="Order Summary", padding="20")
         summary_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
         
-        # Order list with increased row height
-        self.order_tree = ttk.Treeview(summary_frame, columns=("Description", "Price"), show="headings", height=15)
+        # Bar tabs: pick the walk-in order or an open tab, or open a new one
+        tab_frame = ttk.Frame(summary_frame)
+        tab_frame.pack(fill=tk.X)
+        ttk.Label(tab_frame, text="Tab:").pack(side=tk.LEFT, padx=5)
+        self.tab_var = tk.StringVar()
+        self.tab_combo = ttk.Combobox(tab_frame, textvariable=self.tab_var, state="readonly", font=('Arial', 16), width=20)
+        self.tab_combo.bind("<<ComboboxSelected>>", lambda e: self.switch_tab(self.tab_combo.current()))
+        self.tab_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Button(tab_frame, text="Open Tab", command=self.open_tab, width=10).pack(side=tk.LEFT, padx=5)
+        self.update_tab_choices()
+        
+        # Order list with increased row height; one row per order line, keyed by item label
+        self.order_tree = ttk.Treeview(summary_frame, columns=("Description", "Qty", "Price"), show="headings", height=15)
         self.order_tree.heading("Description", text="Description")
+        self.order_tree.heading("Qty", text="Qty")
         self.order_tree.heading("Price", text="Price")
+        self.order_tree.column("Qty", width=60, anchor=tk.CENTER, stretch=False)
         self.order_tree.pack(fill=tk.BOTH, expand=True, pady=10)
         
+        # Quantity controls for the selected line
+        quantity_frame = ttk.Frame(summary_frame)
+        quantity_frame.pack(fill=tk.X)
+        ttk.Button(quantity_frame, text="+1", command=lambda: self.change_quantity(1), width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Button(quantity_frame, text="-1", command=lambda: self.change_quantity(-1), width=8).pack(side=tk.LEFT, padx=5)
+        
         # Buttons frame
         buttons_frame = ttk.Frame(summary_frame)
         buttons_frame.pack(fill=tk.X, pady=10)
@@ -255,6 +402,7 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         # Total amount
         self.total_label = ttk.Label(summary_frame, text="Total: R0.00", style="Price.TLabel")
         self.total_label.pack(pady=20)
+        self.render_order()
         
         # Payment buttons frame (initially hidden)
         self.payment_frame = ttk.Frame(summary_frame)
@@ -348,14 +496,50 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         self.calculate_button.pack(pady=10)
     
     def show_level(self, items, level_name=None):
-        # Clear current view
-        for widget in self.scrollable_frame.winfo_children():
-            widget.pack_forget()
+        """Show a menu level, building its widgets only the first time."""
+        if self.showing_search:
+            self.clear_search()
+        
+        path = tuple(name for name, _ in self.navigation_history)
+        level_frame = self.level_frames.get(path)
+        if level_frame is None:
+            level_frame = self.build_level(items, level_name)
+            self.level_frames[path] = level_frame
+        
+        # Swap the visible level as a unit
+        if self.current_level_frame is not level_frame:
+            if self.current_level_frame is not None:
+                self.current_level_frame.pack_forget()
+            level_frame.pack(fill=tk.X)
+            self.current_level_frame = level_frame
+        self.show_level_images(level_frame)
+        self.canvas.yview_moveto(0)
+    
+    def show_level_images(self, level_frame):
+        """Put thumbnails on the buttons of the visible level only."""
+        if self.thumbnails is None:
+            return
+        for button, source in level_frame.thumbnail_buttons:
+            image = self.thumbnails.get(source, on_ready=lambda source, frame=level_frame: self.on_thumbnail_ready(frame))
+            if image is not None:
+                button.configure(image=image, compound=tk.LEFT)
+    
+    def on_thumbnail_ready(self, level_frame):
+        if level_frame is self.current_level_frame and not self.showing_search:
+            self.show_level_images(level_frame)
+    
+    def build_level(self, items, level_name=None):
+        """Create the frame holding one menu level's buttons."""
+        level_frame = ttk.Frame(self.scrollable_frame)
+        # (button, image path) pairs that get a thumbnail when the level is shown
+        level_frame.thumbnail_buttons = []
+        # Item path -> button, so a menu update can re-price buttons in place
+        level_frame.item_buttons = {}
         
         # Add back button if not at root level
         if self.navigation_history:
             back_button = ttk.Button(
-                self.scrollable_frame,
+                level_frame,
                 text="← Back",
                 command=self.go_back,
                 width=30
@@ -365,7 +549,7 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         # Add level title if provided
         if level_name:
             title_label = ttk.Label(
-                self.scrollable_frame,
+                level_frame,
                 text=level_name,
                 font=('Arial', 16, 'bold')
             )
@@ -377,18 +561,106 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
                 if isinstance(subitems, dict):
                     if "price" in subitems:
                         # It's a size/price item
-                        self.create_drink_button(self.scrollable_frame, name, subitems)
+                        self.create_drink_button(level_frame, name, subitems)
                     else:
                         # It's a category or description
                         btn = ttk.Button(
-                            self.scrollable_frame,
+                            level_frame,
                             text=name,
-                            command=lambda n=name, i=subitems: self.navigate_to(n, i),
+                            command=lambda n=name: self.navigate_to(n),
                             width=30
                         )
                         btn.pack(fill=tk.X, pady=5, padx=5)
+                        image = self.menu_index.image_for(name)
+                        if image:
+                            level_frame.thumbnail_buttons.append((btn, image))
+        
+        return level_frame
+    
+    def update_search_results(self):
+        """Show the items matching the search box; called on every keystroke."""
+        query = self.search_var.get()
+        if not query.strip():
+            if self.showing_search:
+                self.search_results_frame.pack_forget()
+                self.showing_search = False
+                if self.current_level_frame is not None:
+                    self.current_level_frame.pack(fill=tk.X)
+            return
+        
+        if not self.showing_search:
+            if self.current_level_frame is not None:
+                self.current_level_frame.pack_forget()
+            self.search_results_frame.pack(fill=tk.X)
+            self.showing_search = True
+        
+        results = self.menu_search.search(query, MAX_SEARCH_RESULTS)
+        if results:
+            self.search_status.pack_forget()
+        else:
+            self.search_status.pack(fill=tk.X, pady=10, padx=5)
+        for position, button in enumerate(self.search_buttons):
+            if position < len(results):
+                item = results[position]
+                button.configure(
+                    text=f"{item.description} {item.size} - R{item.price}",
+                    command=lambda item=item: self.add_to_order(item)
+                )
+                button.pack(fill=tk.X, pady=5, padx=5)
+            else:
+                button.pack_forget()
+        self.canvas.yview_moveto(0)
+    
+    def canonical_label(self, label):
+        """Return the current menu label for a logged item name, or None."""
+        item = self.menu_index.lookup_label(label)
+        return item.label if item else None
     
-    def navigate_to(self, name, items):
+    def update_quick_keys(self):
+        """Point the quick-key buttons at the current top sellers."""
+        labels = tuple(self.sales_ranker.top(
+            self.quick_keys_config['count'],
+            accept=lambda label: label in self.menu_index.by_label
+        ))
+        if labels == self.quick_key_labels:
+            return
+        self.quick_key_labels = labels
+        for position, button in enumerate(self.quick_key_buttons):
+            if position < len(labels):
+                item = self.menu_index.by_label[labels[position]]
+                button.configure(
+                    text=f"{item.description} {item.size}\nR{item.price}",
+                    command=lambda item=item: self.add_to_order(item),
+                    state=tk.NORMAL
+                )
+            else:
+                button.configure(text="", command="", state=tk.DISABLED)
+    
+    def clear_search(self):
+        self.search_var.set("")
+    
+    def clear_level_cache(self):
+        """Destroy cached level widgets so they are rebuilt from the new menu."""
+        for level_frame in self.level_frames.values():
+            level_frame.destroy()
+        self.level_frames = {}
+        self.current_level_frame = None
+    
+    def items_at(self, path):
+        """Return the menu_data level at path, or None if the menu no longer has it."""
+        items = self.menu_data
+        for name in path:
+            items = items.get(name)
+            if not isinstance(items, dict) or "price" in items:
+                return None
+        return items
+    
+    def navigate_to(self, name):
+        # Resolve the level from the current menu, which may have changed since the button was made
+        path = tuple(level_name for level_name, _ in self.navigation_history) + (name,)
+        items = self.items_at(path)
+        if items is None:
+            return
         # Add current level to history
         self.navigation_history.append((name, items))
         # Show the new level
@@ -408,11 +680,12 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
     
     def create_drink_button(self, parent, size, details):
         """Create a button for a drink with size and price."""
-        if "price" not in details:
+        # Look the item up by its path instead of rebuilding its name on every click
+        path = tuple(level_name for level_name, _ in self.navigation_history) + (size,)
+        item = self.menu_index.get(path)
+        if item is None:
             return
         
-        price = details["price"]
-        
         button_frame = ttk.Frame(parent)
         button_frame.pack(fill=tk.X, pady=5, padx=5)
         
@@ -424,74 +697,145 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         content_frame = ttk.Frame(button_frame)
         content_frame.pack(fill=tk.X, expand=True)
         
-        # Get the full path for this item
-        path = []
-        for level_name, _ in self.navigation_history:
-            path.append(level_name)
-        path.append(size)
-        full_name = " > ".join(path)
-        
         # Create button with text
         button = ttk.Button(
             content_frame,
-            text=f"{size} - R{price}",
-            command=lambda: self.add_to_order(full_name, details),
+            text=f"{size} - R{item.price}",
+            command=lambda: self.add_to_order(item),
             width=button_width
         )
         button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        parent.item_buttons[path] = button
+        if item.image:
+            parent.thumbnail_buttons.append((button, item.image))
     
-    def add_to_order(self, name, details):
-        # Get price
-        price = details.get('price', details.get('single_price'))
-        
-        if price is None:
-            messagebox.showerror("Error", "Could not determine price for selected item")
-            return
-        
-        # Build full menu path
-        menu_path = []
-        current_level = self.menu_data
-        for level_name, _ in self.navigation_history:
-            menu_path.append(level_name)
-        menu_path.append(name)
-        full_path = " > ".join(menu_path)
+    def add_to_order(self, item):
+        """Add a MenuItem from the menu index to the current order."""
+        self.engine.add(item)
+        self.render_order_line(item.label)
         
-        # Add to order tree
-        self.order_tree.insert("", "end", values=(full_path, f"R{price}"))
+        # Update status
+        self.status_var.set(f"Added {item.label} to order")
+    
+    def render_order_line(self, label):
+        """Bring one order_tree row and the total in line with the order model."""
+        line = self.order.get(label)
+        if line is None:
+            if self.order_tree.exists(label):
+                self.order_tree.delete(label)
+        elif self.order_tree.exists(label):
+            self.order_tree.item(label, values=(label, line.quantity, f"R{line.total}"))
+        else:
+            self.order_tree.insert("", "end", iid=label, values=(label, line.quantity, f"R{line.total}"))
         
         # Update total amount
-        self.total_amount += Decimal(str(price))
-        self.total_label.config(text=f"Total: R{self.total_amount}")
+        self.update_total()
+    
+    def render_order(self):
+        """Redraw order_tree and the total for the current tab."""
+        self.order = self.tabs.order
+        self.order_tree.delete(*self.order_tree.get_children())
+        for line in self.order:
+            self.order_tree.insert("", "end", iid=line.item.label, values=(line.item.label, line.quantity, f"R{line.total}"))
+        self.update_total()
+    
+    def update_total(self):
+        """Show the amount due for the current order, after any promotions running now."""
+        promotions = self.engine.price_promotions()
+        self.total_amount = self.order.total - promotions.discount
+        if promotions.discount:
+            self.total_label.config(text=f"Total: R{self.total_amount} (promotions -R{promotions.discount})")
+        else:
+            self.total_label.config(text=f"Total: R{self.total_amount}")
+    
+    def update_tab_choices(self):
+        """List the walk-in order and open tabs in the tab picker."""
+        self.tab_names = [WALK_IN] + self.tabs.names()
+        self.tab_combo.configure(values=["Walk-in"] + self.tabs.names())
+        self.tab_combo.current(self.tab_names.index(self.tabs.current))
+    
+    def switch_tab(self, position):
+        if position < 0:
+            return
+        # Any payment in progress on the order being left is abandoned
+        self.engine.cancel_payment()
+        success, message = self.tabs.switch(self.tab_names[position])
+        if success:
+            # Leave any payment in progress for the previous order
+            self.payment_frame.pack_forget()
+            self.cash_frame.pack_forget()
+            self.render_order()
+        self.update_tab_choices()
+        self.status_var.set(message)
+    
+    def recover_payments(self):
+        """Finish or re-offer payments that were in progress when the till stopped."""
+        warnings = self.engine.recover_payments()
+        self.render_order()
+        self.update_tab_choices()
+        if self.tabs.payments.get(self.tabs.current):
+            # Reopen checkout where the interrupted payment left off
+            self.show_payment_buttons()
+            self.status_var.set("Restored an order that was being paid; choose the payment method")
+        if warnings:
+            messagebox.showwarning("Recovered Orders", "\n\n".join(warnings))
+    
+    def open_tab(self):
+        """Open a named tab, carrying over anything already rung up on the walk-in order."""
+        name = simpledialog.askstring("Open Tab", "Name for the new tab:", parent=self.root)
+        if name is None:
+            return
+        if self.tabs.current != WALK_IN:
+            # Any payment in progress on the order being left is abandoned
+            self.engine.cancel_payment()
+            self.tabs.switch(WALK_IN)
+        success, message = self.tabs.open(name)
+        if not success:
+            messagebox.showerror("Error", message)
+            return
+        # The walk-in order moved onto the tab without its payment
+        self.payment_frame.pack_forget()
+        self.cash_frame.pack_forget()
+        self.render_order()
+        self.update_tab_choices()
+        self.status_var.set(message)
+    
+    def change_quantity(self, delta):
+        """Add or remove one unit of the selected line (or the last line)."""
+        selection = self.order_tree.selection()
+        rows = self.order_tree.get_children()
+        if not selection and not rows:
+            messagebox.showwarning("Warning", "Your order is empty")
+            return
+        label = selection[0] if selection else rows[-1]
+        line = self.order.get(label)
+        if line is None:
+            return
         
-        # Update status
-        self.status_var.set(f"Added {full_path} to order")
+        if delta > 0:
+            self.engine.add(line.item, delta)
+        else:
+            self.engine.remove(label, -delta)
+        self.render_order_line(label)
+        if self.order_tree.exists(label):
+            self.order_tree.selection_set(label)
     
     def undo_last_item(self):
-        if not self.order_tree.get_children():
+        label = self.engine.undo_last()
+        if label is None:
             messagebox.showwarning("Warning", "No items to undo")
             return
         
-        # Get the last item
-        last_item = self.order_tree.get_children()[-1]
-        values = self.order_tree.item(last_item)['values']
-        
-        # Subtract the price from the running total
-        price = Decimal(values[1].replace('R', ''))
-        self.total_amount -= price
-        
-        # Remove the item
-        self.order_tree.delete(last_item)
-        
-        # Update the total label
-        self.total_label.config(text=f"Total: R{self.total_amount}")
+        self.render_order_line(label)
         
         # Update status
         self.status_var.set("Last item removed from order")
     
     def show_payment_buttons(self):
-        if not self.order_tree.get_children():
+        if not self.order:
             messagebox.showwarning("Warning", "Your order is empty")
             return
+        self.engine.start_payment('checkout')
         
         # Hide cash frame if visible
         self.cash_frame.pack_forget()
@@ -508,10 +852,13 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
             self.show_cash_payment()
     
     def show_cash_payment(self):
+        self.engine.start_payment('cash')
+        
         # Hide payment buttons
         self.payment_frame.pack_forget()
         
-        # Update total amount label
+        # Update total amount label; a happy hour may have started or ended since the last item
+        self.update_total()
         self.cash_total_label.config(text=f"Total Amount: R{self.total_amount}")
         
         # Reset cash payment interface
@@ -527,7 +874,7 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
     
     def calculate_change(self):
         try:
-            amount_received = Decimal(self.amount_entry.get())
+            amount_received = Money.parse(self.amount_entry.get())
             if amount_received < self.total_amount:
                 messagebox.showerror("Error", "Amount received is less than total amount")
                 return
@@ -541,10 +888,12 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
                 command=lambda: self.complete_transaction("cash", self.amount_entry.get())
             )
             
-        except (ValueError, InvalidOperation):
+        except ValueError:
             messagebox.showerror("Error", "Please enter a valid amount")
     
     def show_wyvern_payment(self):
+        self.engine.start_payment('wyvern')
+        
         # Hide payment buttons
         self.payment_frame.pack_forget()
         
@@ -555,7 +904,7 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         # Instructions label
         ttk.Label(
             self.wyvern_frame,
-            text="Please enter your Wyvern Card ID",
+            text="Please tap or enter your Wyvern Card ID" if self.nfc_reader else "Please enter your Wyvern Card ID",
             font=('Arial', 16, 'bold')
         ).pack(pady=20)
         
@@ -600,6 +949,7 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         
         # Clear any existing text
         self.card_id_entry.delete(0, tk.END)
+        self.awaiting_card = True
 
     def show_check_balance_dialog(self):
         """Show dialog to check Wyvern card balance."""
@@ -610,11 +960,12 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         # Center the dialog
         dialog.transient(self.root)
         dialog.grab_set()
+        self.balance_dialog = dialog
         
         # Create form
         ttk.Label(
             dialog,
-            text="Enter Wyvern Card ID:",
+            text="Tap or enter Wyvern Card ID:" if self.nfc_reader else "Enter Wyvern Card ID:",
             font=('Arial', 16)
         ).pack(pady=20)
         
@@ -641,6 +992,7 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         
         # Make dialog modal
         self.root.wait_window(dialog)
+        self.balance_dialog = None
 
     def check_balance(self, card_id, dialog=None):
         """Check the balance for a Wyvern card."""
@@ -671,28 +1023,30 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
             print(f"Error checking balance: {str(e)}")
             messagebox.showerror("Error", f"Failed to check balance: {str(e)}")
 
-    def read_wyvern_card(self):
+    def handle_card_taps(self):
+        """Use card taps from the reader for the payment or balance check on screen."""
+        for event in self.nfc_reader.get_events():
+            if self.balance_dialog is not None:
+                self.check_balance(event.tag, self.balance_dialog)
+            elif self.awaiting_card:
+                self.read_wyvern_card(event.tag)
+            else:
+                self.status_var.set(f"Card {event.tag} read; choose Pay with Wyvern Card or Check Balance first")
+    
+    def read_wyvern_card(self, card_id=None):
+        # One card per payment, however many taps or Returns arrive
+        if not self.awaiting_card:
+            return
+        self.awaiting_card = False
         try:
-            # Get card ID from entry field
-            card_id = self.card_id_entry.get().strip()
+            # Get card ID from the reader, or else the entry field
+            if card_id is None:
+                card_id = self.card_id_entry.get().strip()
             print(f"Received card ID: {card_id}")
             
-            if not card_id:
-                raise ValueError("Please enter a card ID")
-            
-            # Get user information
-            user = self.user_management.get_user_by_rfid(card_id)
-            if not user:
-                raise ValueError("Card not registered")
-            
-            # Calculate discounted amount
-            original_amount = self.total_amount
-            discount_amount = original_amount * (user['discount_rate'] / 100)
-            discounted_amount = original_amount - discount_amount
-            
-            # Check if user has sufficient balance
-            if user['balance'] < discounted_amount:
-                raise ValueError(f"Insufficient balance. Current balance: R{user['balance']}")
+            # Look up the card and price the order for it
+            quote = self.engine.quote_wyvern(card_id)
+            user = quote.user
             
             # Update UI with user info and balance
             self.card_id_var.set(
@@ -704,88 +1058,73 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
             
             # Update transaction summary
             self.transaction_summary_var.set(
-                f"Original Amount: R{original_amount}\n"
-                f"Discount: R{discount_amount}\n"
-                f"Amount After Discount: R{discounted_amount}\n"
-                f"Balance After Transaction: R{user['balance'] - discounted_amount}"
+                f"Original Amount: R{quote.total}\n"
+                f"Discount: R{quote.discount}\n"
+                f"Amount After Discount: R{quote.amount_due}\n"
+                f"Balance After Transaction: R{user['balance'] - quote.amount_due}"
             )
             
-            print(f"Processing payment of R{discounted_amount} for user {user['id']}")
-            
-            # Create order summary
-            order_items = []
-            for item in self.order_tree.get_children():
-                values = self.order_tree.item(item)['values']
-                order_items.append(f"{values[0]} - {values[1]}")
-            order_summary = "\n".join(order_items)
+            print(f"Processing payment of R{quote.amount_due} for user {user['id']}")
             
             # Process payment
-            success, message = self.user_management.update_balance(
-                int(user['id']),  # Ensure ID is integer
-                float(-discounted_amount),  # Convert Decimal to float for database
-                "purchase",
-                f"Purchase at drinks ordering system\n"
-                f"Original Amount: R{original_amount}\n"
-                f"Discount Rate: {user['discount_rate']}%\n"
-                f"Discount Amount: R{discount_amount}\n"
-                f"Amount After Discount: R{discounted_amount}",
-                card_id,  # Pass the card ID
-                order_summary  # Pass the order summary
-            )
-            
-            if not success:
-                raise ValueError(message)
-            
-            self.complete_transaction("wyvern", card_id)
+            receipt = self.engine.pay_wyvern(card_id, quote)
             
         except Exception as e:
             print(f"Error processing payment: {str(e)}")
             messagebox.showerror("Error", f"Failed to process payment: {str(e)}")
             self.reset_interface()
+            return
+        
+        self.show_receipt(receipt)
 
     def complete_transaction(self, payment_method, amount_received=None):
-        # Get user information for Wyvern card payments
-        user = None
-        discount_amount = None
-        if payment_method == "wyvern" and amount_received:
-            user = self.user_management.get_user_by_rfid(amount_received)
-            if user:
-                discount_amount = float(self.total_amount * (user['discount_rate'] / 100))
-
-        # Log transaction to file
-        self.log_transaction(
-            payment_method=payment_method,
-            total_amount=float(self.total_amount),
-            items=self.order_tree.get_children(),
-            card_id=amount_received if payment_method == "wyvern" else None,
-            discount_amount=discount_amount
-        )
-        
+        try:
+            if payment_method == "cash":
+                receipt = self.engine.pay_cash(amount_received)
+            else:
+                receipt = self.engine.pay_card()
+        except (PaymentError, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.show_receipt(receipt)
+    
+    def show_receipt(self, receipt):
         # Show success message
         message = f"Transaction completed successfully!\n\n"
-        message += f"Payment Method: {payment_method.title()}\n"
-        message += f"Total Amount: R{self.total_amount}\n"
-        if payment_method == "cash":
-            message += f"Amount Received: R{amount_received}\n"
-            message += f"Change: R{Decimal(amount_received) - self.total_amount}\n"
-        elif payment_method == "wyvern" and user:
-            message += f"Card ID: {amount_received}\n"
-            message += f"Discount Rate: {user['discount_rate']}%\n"
-            message += f"Discount Amount: R{discount_amount}\n"
-            message += f"Amount After Discount: R{(float(self.total_amount) - discount_amount)}\n"
+        message += f"Payment Method: {receipt.method.title()}\n"
+        message += f"Total Amount: R{receipt.total}\n"
+        for promotion in receipt.promotions:
+            message += f"{promotion.name}: -R{promotion.discount}\n"
+        if receipt.method == "cash":
+            if receipt.discount:
+                message += f"Amount Due: R{receipt.total - receipt.discount}\n"
+            message += f"Amount Received: R{receipt.amount_received}\n"
+            message += f"Change: R{receipt.change}\n"
+        elif receipt.method == "wyvern" and receipt.user:
+            message += f"Card ID: {receipt.card_id}\n"
+            message += f"Discount Rate: {receipt.user['discount_rate']}%\n"
+            message += f"Discount Amount: R{receipt.discount}\n"
+            message += f"Amount After Discount: R{receipt.total - receipt.discount}\n"
+        elif receipt.discount:
+            message += f"Amount Charged: R{receipt.total - receipt.discount}\n"
         
         messagebox.showinfo("Success", message)
         
-        # Reset the interface
-        self.reset_interface()
+        # The engine has closed the paid order; show the walk-in order as it was left
+        self.update_quick_keys()
+        self.reset_interface(clear_order=False)
     
-    def reset_interface(self):
-        # Clear order
-        self.order_tree.delete(*self.order_tree.get_children())
-        self.total_amount = Decimal('0.00')
-        self.total_label.config(text="Total: R0.00")
+    def reset_interface(self, clear_order=True):
+        # Clear the walk-in order; open tabs are only closed once paid
+        if clear_order and self.tabs.current == WALK_IN:
+            self.tabs.clear()
+        else:
+            self.engine.cancel_payment()
+        self.render_order()
+        self.update_tab_choices()
         
         # Hide payment frames
+        self.awaiting_card = False
         self.payment_frame.pack_forget()
         self.cash_frame.pack_forget()
         if hasattr(self, 'wyvern_frame'):
@@ -803,232 +1142,160 @@ BEER:,TAFEL LAGER,340ML BOTTLE,25"""
         # Show main content
         self.main_frame.pack(fill=tk.BOTH, expand=True)
     
-    def log_transaction(self, payment_method, total_amount, items, card_id=None, discount_amount=None):
-        """Log transaction details to a flat file."""
-        try:
-            # Create transactions directory if it doesn't exist
-            if not os.path.exists('transactions'):
-                os.makedirs('transactions')
-            
-            # Generate log filename using current date
-            date_str = datetime.now().strftime("%Y-%m-%d")
-            log_file = os.path.join('transactions', f'transactions_{date_str}.log')
-            
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Format payment method to include card ID if it's a Wyvern card
-            if payment_method == "wyvern" and card_id:
-                payment_method = f"wyvern_card_{card_id}"
-            
-            # Create log entry
-            log_entry = [
-                f"Timestamp: {timestamp}",
-                f"Payment Method: {payment_method}",
-                f"Total Amount: R{total_amount:.2f}"
-            ]
-            
-            # Add discount if applicable
-            if discount_amount:
-                log_entry.append(f"Discount Amount: R{discount_amount:.2f}")
-                log_entry.append(f"Amount After Discount: R{(total_amount - discount_amount):.2f}")
-            
-            # Add items with full menu path
-            log_entry.append("\nItems:")
-            for item in items:
-                values = self.order_tree.item(item)['values']
-                item_name = values[0]
-                item_price = values[1]
-                # Get the full menu path for this item
-                menu_path = self.get_menu_path(item_name)
-                log_entry.append(f"- {menu_path} - {item_price}")
-            
-            # Write to log file
-            with open(log_file, "a") as f:
-                f.write("\n".join(log_entry) + "\n" + "="*80 + "\n")
-            
-        except Exception as e:
-            print(f"Error logging transaction: {str(e)}")
-
-    def get_menu_path(self, item_name):
-        """Get the full menu path for an item."""
-        def search_menu(menu, target, current_path=None):
-            if current_path is None:
-                current_path = []
-            
-            if isinstance(menu, dict):
-                for key, value in menu.items():
-                    if key == target:
-                        return current_path + [key]
-                    if isinstance(value, (dict, list)):
-                        result = search_menu(value, target, current_path + [key])
-                        if result:
-                            return result
-            elif isinstance(menu, list):
-                for item in menu:
-                    if isinstance(item, (dict, list)):
-                        result = search_menu(item, target, current_path)
-                        if result:
-                            return result
-            return None
-        
-        path = search_menu(self.menu_data, item_name)
-        if path:
-            return " > ".join(path)
-        return item_name
-
-    def download_latest_menu(self):
-        """Downloads the latest menu file from Google Drive."""
-        try:
-            print("Attempting to download latest menu...")
-            creds = self.get_credentials()
-            if not creds:
-                print("Failed to get credentials")
-                return False
-            
-            print("Building Drive service...")
-            service = build('drive', 'v3', credentials=creds)
-            
-            print("Searching for menu file...")
-            results = service.files().list(
-                q="name='bar_menu.csv'",
-                spaces='drive',
-                fields='files(id, name, modifiedTime)'
-            ).execute()
-            
-            items = results.get('files', [])
-            
-            if not items:
-                print("No menu file found in Google Drive")
-                return False
-            
-            print(f"Found {len(items)} menu files")
-            # Get the most recently modified file
-            latest_file = max(items, key=lambda x: x['modifiedTime'])
-            print(f"Latest file: {latest_file['name']} (modified: {latest_file['modifiedTime']})")
-            
-            # Check if we already have this version
-            if os.path.exists('bar_menu.csv'):
-                local_mtime = os.path.getmtime('bar_menu.csv')
-                drive_mtime = datetime.strptime(latest_file['modifiedTime'], '%Y-%m-%dT%H:%M:%S.%fZ').timestamp()
-                print(f"Local file time: {local_mtime}, Drive file time: {drive_mtime}")
-                
-                # Force download if timestamps are within 5 minutes of each other
-                # or if local file is newer (which shouldn't happen)
-                time_diff = abs(local_mtime - drive_mtime)
-                if time_diff < 300 or local_mtime > drive_mtime:
-                    print("Forcing download due to timestamp discrepancy")
-                else:
-                    print("Local file is up to date")
-                    return False  # Local file is up to date
-            
-            print("Downloading new menu file...")
-            # Download the file
-            request = service.files().get_media(fileId=latest_file['id'])
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                print(f"Download progress: {int(status.progress() * 100)}%")
-            
-            print("Saving menu file...")
-            # Save the file
-            with open('bar_menu.csv', 'wb') as f:
-                f.write(fh.getvalue())
-            
-            print("Menu download completed successfully")
-            return True
-            
-        except Exception as e:
-            print(f"Error downloading menu: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return False
-
-    def get_credentials(self):
-        """Gets valid user credentials from storage."""
-        try:
-            print("Getting credentials...")
-            creds = None
-            if os.path.exists('token.pickle'):
-                print("Loading existing token...")
-                with open('token.pickle', 'rb') as token:
-                    creds = pickle.load(token)
-            
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    print("Refreshing expired token...")
-                    creds.refresh(Request())
-                else:
-                    print("No valid credentials found, starting OAuth flow...")
-                    if not os.path.exists('credentials.json'):
-                        print("Downloading credentials file...")
-                        if not download_credentials_file():
-                            print("Failed to download credentials file")
-                            return None
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        'credentials.json', SCOPES)
-                    creds = flow.run_local_server(port=0)
-                print("Saving new token...")
-                with open('token.pickle', 'wb') as token:
-                    pickle.dump(creds, token)
-            
-            print("Credentials obtained successfully")
-            return creds
-        except Exception as e:
-            print(f"Error getting credentials: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
-
     def load_menu_data(self):
-        """Loads menu data from CSV file."""
+        """Loads the menu through its compiled artifact."""
         try:
             print("Reading menu file...")
-            self.menu_data = {}
-            
-            with open('bar_menu.csv', 'r') as file:
-                for line in file:
-                    # Skip empty lines
-                    if not line.strip():
-                        continue
-                    
-                    # Parse CSV line
-                    parts = line.strip().split(',')
-                    if len(parts) >= 4:
-                        category = parts[0].replace(':', '')  # Remove colon from category
-                        description = parts[1]
-                        size = parts[2]
-                        price = parts[3]
-                        
-                        # Create category if it doesn't exist
-                        if category not in self.menu_data:
-                            self.menu_data[category] = {}
-                        
-                        # Create description if it doesn't exist
-                        if description not in self.menu_data[category]:
-                            self.menu_data[category][description] = {}
-                        
-                        # Add size and price
-                        self.menu_data[category][description][size] = {"price": price}
-            
-            print(f"Menu loaded successfully (categories: {len(self.menu_data)})")
-                
-            # If we're in the main content area, refresh the view
-            if hasattr(self, 'scrollable_frame'):
-                print("Refreshing menu view...")
-                self.show_level(self.menu_data)
-                
+            self.menu_config = load_menu_config()
+            # Only recompiled when the menu file has changed since the last run
+            menu = load_compiled_menu(self.menu_config['menu_file'], self.menu_config['cache_dir'])
+            for problem in menu.problems:
+                print(f"Menu warning: {problem}")
+            self.apply_menu(menu.menu_data, menu.index)
         except Exception as e:
             print(f"Error loading menu: {str(e)}")
             import traceback
             traceback.print_exc()
+            if hasattr(self, 'menu_index'):
+                # Keep selling from the menu already on screen
+                self.status_var.set("Menu reload failed, keeping current menu")
+                return
             messagebox.showerror("Error", f"Failed to load menu: {str(e)}")
             self.root.destroy()
 
+    def apply_menu(self, menu_data, menu_index):
+        """Swap in a parsed menu; called on the Tk thread."""
+        old_index = getattr(self, 'menu_index', None)
+        self.menu_data = menu_data
+        self.menu_index = menu_index
+        self.menu_search = MenuSearch(menu_index)
+        if hasattr(self, 'engine'):
+            self.engine.set_menu(menu_index)
+        print(f"Menu loaded successfully (categories: {len(self.menu_data)}, items: {len(self.menu_index)})")
+        
+        # If we're in the main content area, patch the view in place
+        if hasattr(self, 'scrollable_frame') and old_index is not None:
+            self.patch_menu_view(diff_menu_indexes(old_index, menu_index))
+    
+    def patch_menu_view(self, diff):
+        """Update the on-screen menu for a new menu without leaving the current level or order."""
+        old_path = tuple(name for name, _ in self.navigation_history)
+        
+        # Levels whose entries changed are dropped and rebuilt the next time they are shown
+        for path in list(self.level_frames):
+            if path in diff.changed_levels:
+                level_frame = self.level_frames.pop(path)
+                if level_frame is self.current_level_frame:
+                    self.current_level_frame = None
+                level_frame.destroy()
+        
+        # Re-price the buttons of items that changed in levels that are still built
+        for path in diff.changed:
+            level_frame = self.level_frames.get(path[:-1])
+            button = level_frame.item_buttons.get(path) if level_frame else None
+            if button is not None:
+                item = self.menu_index.items[path]
+                button.configure(text=f"{path[-1]} - R{item.price}", command=lambda item=item: self.add_to_order(item))
+        
+        # Stay on the current level, or the deepest one that still exists
+        navigation_history = []
+        for name, _ in self.navigation_history:
+            items = self.items_at(tuple(level_name for level_name, _ in navigation_history) + (name,))
+            if items is None:
+                break
+            navigation_history.append((name, items))
+        self.navigation_history = navigation_history
+        path = tuple(name for name, _ in navigation_history)
+        if self.current_level_frame is None or path != old_path:
+            level_name = navigation_history[-1][0] if navigation_history else None
+            if self.showing_search:
+                # Built behind the search results and shown once the search is cleared
+                if self.current_level_frame is not None:
+                    self.current_level_frame.pack_forget()
+                level_frame = self.level_frames.get(path) or self.build_level(self.items_at(path), level_name)
+                self.level_frames[path] = self.current_level_frame = level_frame
+            else:
+                self.show_level(self.items_at(path), level_name)
+        if self.showing_search:
+            self.update_search_results()
+        
+        self.quick_key_labels = ()
+        self.update_quick_keys()
+        self.reprice_open_order(diff)
+    
+    def reprice_open_order(self, diff):
+        """Apply the configured re-price policy to the order being rung up."""
+        orders = list(self.tabs.orders.values())
+        changed = [label for label in (" > ".join(path) for path in diff.changed) if any(order.get(label) for order in orders)]
+        removed = [label for label in (" > ".join(path) for path in diff.removed) if any(order.get(label) for order in orders)]
+        if not changed and not removed:
+            self.status_var.set("Menu updated")
+            return
+        
+        if self.menu_config['reprice_open_orders'] == 'update':
+            changes = []
+            for order in self.tabs.orders.values():
+                changes.extend(order.reprice(self.menu_index))
+            # Journal the new prices for open tabs
+            self.tabs.compact()
+            self.render_order()
+            message = f"Menu updated: {len(changes)} order line(s) re-priced"
+        else:
+            message = "Menu updated: open order kept at the prices it was rung up at"
+        if removed:
+            message += f"; {len(removed)} order item(s) no longer on the menu"
+        self.status_var.set(message)
+
+    def start_menu_updates(self):
+        """Follow the menu server, or poll Google Drive if this till is the designated node or standalone."""
+        config = load_distribution_config()
+        self.menu_server = None
+        self.menu_sync = None
+        self.menu_refresher = None
+        if config['role'] == 'client':
+            self.menu_sync = MenuSyncClient(self.root, self.apply_menu, self.menu_data, config)
+            self.menu_sync.start()
+            return
+
+        on_drive_menu = self.apply_menu
+        if config['role'] == 'server':
+            try:
+                self.menu_server = MenuServer(self.root, self.apply_menu, config)
+                self.menu_server.start(self.menu_data)
+                # Drive downloads become versions the other tills fetch from here
+                on_drive_menu = self.menu_server.publish_download
+            except OSError as e:
+                # Usually the port is taken; the other tills would otherwise wait on a server that is not there
+                message = f"Menu server NOT running: cannot listen on port {config['port']} ({e})"
+                print(message)
+                self.root.after(0, lambda: messagebox.showerror("Menu distribution", message))
+                self.menu_server = None
+        self.menu_refresher = MenuRefresher(self.root, on_drive_menu, connectivity=self.connectivity)
+        self.menu_refresher.start()
+
+    def close(self):
+        """Flush pending transaction log entries and close the till."""
+        for updater in (self.menu_refresher, self.menu_sync, self.menu_server):
+            if updater:
+                updater.stop()
+        if self.nfc_reader:
+            self.nfc_reader.stop()
+        # Let a backup step or a peer exchange finish rather than cutting it off
+        if self.database_backup:
+            self.database_backup.stop()
+        if self.ledger_replicator:
+            self.ledger_replicator.stop()
+        self.connectivity.stop()
+        self.transaction_logger.stop()
+        self.tabs.close()
+        self.root.destroy()
+
 def main():
+    timer = StartupTimer(timing_requested())
+    timer.mark("imports")
     root = tk.Tk()
-    app = DrinksOrderingSystem(root)
+    timer.mark("tk")
+    app = DrinksOrderingSystem(root, timer)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+import os
+import json
+import logging
+import threading
+import configparser
+
+
+def load_journal_config(config_file='settings.cfg'):
+    """Load journal settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'directory': config.get('Journal', 'directory', fallback='journal'),
+        # always: fsync every record; interval: at most every fsync_interval seconds; never: leave it to the OS
+        'fsync': config.get('Journal', 'fsync', fallback='interval'),
+        'fsync_interval': config.getfloat('Journal', 'fsync_interval', fallback=0.2)
+    }
+
+
+class Journal:
+    """Append-only file of JSON records, one per line.
+
+    append() writes and flushes straight away, so a record survives the
+    till process dying; fsync, which is what protects it from a power cut,
+    is batched according to the fsync policy. replay() stops at the first
+    damaged line (a write cut off mid-record) and trims it, and rewrite()
+    atomically replaces the journal with a compacted set of records.
+    """
+
+    def __init__(self, path, fsync='interval', fsync_interval=0.2):
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.file = None
+        self.sync_timer = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            # Several journals can share a directory and open at once
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.file is None:
+                self.open()
+            self.file.write(line)
+            self.file.flush()
+            if self.fsync == 'always':
+                os.fsync(self.file.fileno())
+            elif self.fsync == 'interval' and self.sync_timer is None:
+                self.sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+    def sync(self):
+        with self.lock:
+            self.sync_timer = None
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+
+    def replay(self):
+        """Return the journal's records in order."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        good_length = 0
+        with open(self.path, 'rb') as file:
+            for raw_line in file:
+                try:
+                    if not raw_line.endswith(b'\n'):
+                        raise ValueError("incomplete record")
+                    records.append(json.loads(raw_line))
+                except ValueError as e:
+                    self.logger.warning(f"Journal {self.path} ends with a damaged record ({e}); ignoring the rest")
+                    break
+                good_length += len(raw_line)
+        if good_length < os.path.getsize(self.path):
+            # Later appends must not follow the damaged tail
+            with open(self.path, 'r+b') as file:
+                file.truncate(good_length)
+        return records
+
+    def rewrite(self, records):
+        """Atomically replace the journal with records."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                for record in records:
+                    file.write(json.dumps(record, separators=(',', ':')) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+
+    def close(self):
+        with self.lock:
+            if self.sync_timer is not None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+            if self.file is not None:
+                self.file.flush()
+                if self.fsync != 'never':
+                    os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
@@ -5,6 +5,16 @@ import json
 from datetime import datetime
 import configparser
 import os
+from connectivity import ConnectivityManager
+
+# Open kitchen orders, newest first; also timed by load_test.py
+KITCHEN_ORDERS_QUERY = '''
+    SELECT id, timestamp, items, status
+    FROM transactions
+    WHERE LOWER(items) LIKE '%kitchen%'
+    AND status IN ('pending', 'accepted')
+    ORDER BY timestamp DESC
+'''
 
 class KitchenDisplay:
     def __init__(self):
@@ -15,6 +25,11 @@ class KitchenDisplay:
         # Load configuration
         self.config = self.load_config()
         
+        # Track the MySQL server so a dead link fails fast instead of timing out
+        self.connectivity = ConnectivityManager(services=['mysql'])
+        self.connectivity.subscribe(self.on_connectivity_change)
+        self.connectivity.start()
+        
         # Create main frame
         self.main_frame = ttk.Frame(self.root, padding="10")
         self.main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -73,8 +88,16 @@ class KitchenDisplay:
             'mysql_password': config.get('MySQL', 'password')
         }
     
+    def on_connectivity_change(self, service, is_up):
+        """Reload orders as soon as the server is reachable again."""
+        if service == 'mysql' and is_up:
+            self.root.after(0, self.refresh_orders)
+    
     def get_mysql_connection(self):
         """Create and return a MySQL connection."""
+        if not self.connectivity.is_up('mysql'):
+            messagebox.showerror("Database Error", "MySQL server is unreachable; orders will reload when it returns")
+            return None
         try:
             connection = mysql.connector.connect(
                 host=self.config['mysql_host'],
@@ -84,6 +107,7 @@ class KitchenDisplay:
             )
             return connection
         except mysql.connector.Error as err:
+            self.connectivity.report_failure('mysql')
             messagebox.showerror("Database Error", f"Error connecting to MySQL: {err}")
             return None
     
@@ -124,13 +148,7 @@ class KitchenDisplay:
             print(f"Total orders found: {len(all_orders)}")
             
             # Now fetch kitchen orders - search in the entire items JSON
-            cursor.execute('''
-                SELECT id, timestamp, items, status
-                FROM transactions
-                WHERE LOWER(items) LIKE '%kitchen%'
-                AND status IN ('pending', 'accepted')
-                ORDER BY timestamp DESC
-            ''')
+            cursor.execute(KITCHEN_ORDERS_QUERY)
             
             self.orders = cursor.fetchall()
             print(f"Kitchen orders found: {len(self.orders)}")
@@ -175,6 +193,8 @@ class KitchenDisplay:
         for item in kitchen_items:
             # Show both name and description if available
             item_text = item['name']
+            if item.get('quantity', 1) > 1:
+                item_text = f"{item['quantity']} x {item_text}"
             if 'description' in item and item['description']:
                 item_text += f" - {item['description']}"
             ttk.Label(items_frame, 
@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import argparse
+import configparser
+from datetime import datetime
+from ledger_sync import MEMBER_EVENTS
+
+# Archived ledger rows keep their original id plus the running balance at
+# the time they were archived, so history views never have to re-sum them.
+ARCHIVE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS archive.transactions (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        amount INTEGER,
+        type TEXT,
+        description TEXT,
+        payment_method TEXT,
+        timestamp TIMESTAMP,
+        balance_after INTEGER
+    )
+'''
+
+# Pages released per incremental vacuum step
+VACUUM_STEP_PAGES = 500
+
+
+def load_archive_config(config_file='settings.cfg'):
+    """Load archive settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'archive_dir': config.get('Archive', 'directory', fallback='archive'),
+        'horizon_days': config.getint('Archive', 'horizon_days', fallback=90),
+        'peer_expiry_days': config.getint('Archive', 'peer_expiry_days', fallback=30)
+    }
+
+
+def archive_path(archive_dir, month):
+    """Return the archive database path for a 'YYYY-MM' month."""
+    return os.path.join(archive_dir, f'ledger_{month}.db')
+
+
+def archived_months(archive_dir):
+    """Return the archived months on disk, newest first."""
+    if not os.path.exists(archive_dir):
+        return []
+    months = []
+    for file_name in os.listdir(archive_dir):
+        if file_name.startswith('ledger_') and file_name.endswith('.db'):
+            months.append(file_name[len('ledger_'):-len('.db')])
+    return sorted(months, reverse=True)
+
+
+class LedgerArchiver:
+    """Moves old ledger rows out of users.db into monthly archive databases.
+
+    The hot database keeps one balance checkpoint per user (the sum of every
+    archived amount) so running balances stay correct without the archives.
+    Replicated balance events past the horizon that every peer already holds
+    are compacted into per-member totals in compacted_balances; their
+    descriptions live on in the archived ledger rows. Member and tag events
+    are never compacted.
+    """
+
+    def __init__(self, db_name='users.db', archive_dir=None, horizon_days=None, peer_expiry_days=None):
+        config = load_archive_config()
+        self.db_name = db_name
+        self.archive_dir = archive_dir or config['archive_dir']
+        self.horizon_days = horizon_days if horizon_days is not None else config['horizon_days']
+        self.peer_expiry_days = peer_expiry_days if peer_expiry_days is not None else config['peer_expiry_days']
+
+    def run(self):
+        """Archive rows older than the horizon, then compact the hot database."""
+        if not os.path.exists(self.archive_dir):
+            os.makedirs(self.archive_dir)
+
+        conn = sqlite3.connect(self.db_name)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT datetime('now', ?)", (f'-{self.horizon_days} days',))
+            cutoff = cursor.fetchone()[0]
+
+            cursor.execute('''
+                SELECT DISTINCT strftime('%Y-%m', timestamp)
+                FROM transactions
+                WHERE timestamp < ?
+                ORDER BY 1
+            ''', (cutoff,))
+            months = [row[0] for row in cursor.fetchall()]
+
+            archived = 0
+            for month in months:
+                archived += self.archive_month(conn, month, cutoff)
+
+            cursor.execute("UPDATE balance_checkpoints SET as_of = ?", (cutoff,))
+            conn.commit()
+
+            compacted = self.compact_events(conn, cutoff)
+
+            self.compact(conn)
+            print(f"Archived {archived} ledger rows from {len(months)} months and compacted {compacted} events (cutoff {cutoff})")
+            return True, f"Archived {archived} ledger rows, compacted {compacted} events"
+        except Exception as e:
+            conn.rollback()
+            print(f"Error archiving ledger: {str(e)}")
+            return False, f"Error archiving ledger: {str(e)}"
+        finally:
+            conn.close()
+
+    def archive_month(self, conn, month, cutoff):
+        """Move one month of rows older than cutoff into its archive database."""
+        cursor = conn.cursor()
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive_path(self.archive_dir, month),))
+        try:
+            cursor.execute(ARCHIVE_TABLE)
+            cursor.execute("BEGIN TRANSACTION")
+
+            cursor.execute('''
+                SELECT id, user_id, amount, type, description, payment_method, timestamp
+                FROM transactions
+                WHERE strftime('%Y-%m', timestamp) = ? AND timestamp < ?
+                ORDER BY user_id, timestamp, id
+            ''', (month, cutoff))
+            rows = cursor.fetchall()
+
+            # Running balances continue from each user's existing checkpoint
+            cursor.execute("SELECT user_id, balance FROM balance_checkpoints")
+            checkpoints = dict(cursor.fetchall())
+
+            archived_rows = []
+            for row in rows:
+                user_id, amount = row[1], row[2] or 0
+                checkpoints[user_id] = checkpoints.get(user_id, 0) + amount
+                archived_rows.append(row + (checkpoints[user_id],))
+
+            cursor.executemany('''
+                INSERT OR REPLACE INTO archive.transactions
+                (id, user_id, amount, type, description, payment_method, timestamp, balance_after)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', archived_rows)
+
+            cursor.executemany('''
+                INSERT INTO balance_checkpoints (user_id, balance, as_of)
+                VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET balance = excluded.balance
+            ''', [(user_id, balance, cutoff) for user_id, balance in checkpoints.items()])
+
+            cursor.executemany("DELETE FROM transactions WHERE id = ?", [(row[0],) for row in rows])
+
+            conn.commit()
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("DETACH DATABASE archive")
+
+    def compact_events(self, conn, cutoff):
+        """Fold each origin's oldest balance events into compacted_balances and delete them.
+
+        Only an unbroken run after the origin's compaction floor is compacted,
+        and only as far as every peer that acked within peer_expiry_days holds
+        it and it is older than cutoff. Nothing is compacted until some peer
+        has acked. A peer that never held the compacted events (a new one, or
+        one whose ack expired) is sent their totals as a snapshot by
+        ledger_sync.py. Returns the number of events removed.
+        """
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT peer, origin, seq FROM peer_acks
+            WHERE updated_at >= datetime('now', ?)
+        ''', (f'-{self.peer_expiry_days} days',))
+        acks = {(peer, origin): seq for peer, origin, seq in cursor.fetchall()}
+        peers = {peer for peer, _ in acks}
+        if not peers:
+            return 0
+        cursor.execute("SELECT origin, compacted_seq FROM ledger_state")
+        compacted_seqs = dict(cursor.fetchall())
+        placeholders = ', '.join('?' for _ in MEMBER_EVENTS)
+
+        compacted = 0
+        cursor.execute("SELECT DISTINCT origin FROM ledger_events")
+        for (origin,) in cursor.fetchall():
+            floor = compacted_seqs.get(origin) or 0
+            limits = [acks.get((peer, origin), 0) for peer in peers]
+
+            # Events still waiting for their member, or too recent, stay
+            cursor.execute('''
+                SELECT MIN(seq) - 1 FROM ledger_events
+                WHERE origin = ? AND seq > ? AND (created_at >= ? OR user_id IS NULL)
+            ''', (origin, floor, cutoff))
+            limits.append(cursor.fetchone()[0])
+
+            # The run held here must start right after the floor
+            cursor.execute("SELECT MIN(seq) FROM ledger_events WHERE origin = ? AND seq > ?", (origin, floor))
+            if cursor.fetchone()[0] != floor + 1:
+                continue
+            cursor.execute('''
+                SELECT MIN(seq) FROM ledger_events e
+                WHERE origin = ? AND seq > ? AND NOT EXISTS (
+                    SELECT 1 FROM ledger_events n WHERE n.origin = e.origin AND n.seq = e.seq + 1)
+            ''', (origin, floor))
+            limits.append(cursor.fetchone()[0])
+
+            through = min(limit for limit in limits if limit is not None)
+            if through <= floor:
+                continue
+
+            cursor.execute("BEGIN TRANSACTION")
+            cursor.execute(f'''
+                INSERT INTO compacted_balances (origin, member_uid, amount)
+                SELECT origin, member_uid, SUM(amount) FROM ledger_events
+                WHERE origin = ? AND seq <= ? AND type NOT IN ({placeholders})
+                GROUP BY member_uid
+                ON CONFLICT(origin, member_uid) DO UPDATE SET amount = amount + excluded.amount
+            ''', (origin, through) + MEMBER_EVENTS)
+            cursor.execute(f'''
+                DELETE FROM ledger_events
+                WHERE origin = ? AND seq <= ? AND type NOT IN ({placeholders})
+            ''', (origin, through) + MEMBER_EVENTS)
+            compacted += cursor.rowcount
+            cursor.execute('''
+                INSERT INTO ledger_state (origin, compacted_seq)
+                VALUES (?, ?)
+                ON CONFLICT(origin) DO UPDATE SET compacted_seq = excluded.compacted_seq
+            ''', (origin, through))
+            conn.commit()
+        return compacted
+
+    def compact(self, conn):
+        """Release freed pages and refresh planner statistics."""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            # A full VACUUM would lock out the till for the whole rewrite
+            print("users.db does not release freed pages; run 'python ledger_archive.py --convert' while the till is closed")
+        else:
+            cursor.execute("PRAGMA freelist_count")
+            free_pages = cursor.fetchone()[0]
+            while free_pages > 0:
+                cursor.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+                cursor.fetchall()
+                free_pages -= VACUUM_STEP_PAGES
+        cursor.execute("ANALYZE")
+        conn.commit()
+
+
+def convert_to_incremental_vacuum(db_name='users.db'):
+    """Switch a database created before incremental auto-vacuum over to it.
+
+    This rewrites the whole file with VACUUM and holds an exclusive lock
+    while it does, so only run it with the till and wallet service stopped.
+    Databases created since are incremental from the start.
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            return True, f"{db_name} already uses incremental auto-vacuum"
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+        return True, f"Converted {db_name} to incremental auto-vacuum"
+    except sqlite3.Error as e:
+        return False, f"Error converting {db_name}: {str(e)}"
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old ledger rows out of users.db.")
+    parser.add_argument('--convert', action='store_true',
+                        help="one-time switch of an older users.db to incremental auto-vacuum; stop the till first")
+    args = parser.parse_args()
+
+    started = datetime.now()
+    if args.convert:
+        print(convert_to_incremental_vacuum()[1])
+    else:
+        LedgerArchiver().run()
+    print(f"Ledger maintenance finished in {(datetime.now() - started).total_seconds():.1f}s")
@@ -0,0 +1,244 @@
+import json
+import socket
+import hashlib
+import logging
+import threading
+import configparser
+import socketserver
+from wallet_service import send_frame, recv_frame, load_network_config, server_handshake, client_handshake, is_loopback
+
+# Events per frame when catching a peer up
+BATCH_SIZE = 500
+
+# Event types that change members and their tags rather than balances
+MEMBER_EVENTS = ('member', 'member_update', 'tag_add', 'tag_remove')
+
+
+def load_replication_config(config_file='settings.cfg'):
+    """Load ledger replication settings, falling back to replication off."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    peers = config.get('Replication', 'peers', fallback='')
+    return {
+        'origin': config.get('POS', 'id', fallback=socket.gethostname()),
+        'enabled': config.getboolean('Replication', 'enabled', fallback=False),
+        'port': config.getint('Replication', 'port', fallback=8766),
+        'peers': [peer.strip() for peer in peers.split(',') if peer.strip()],
+        'interval': config.getint('Replication', 'interval', fallback=10),
+        'timeout': config.getfloat('Replication', 'timeout', fallback=3.0)
+    }
+
+
+def merge_ranges(origin_ranges):
+    """Sort [first_seq, last_seq] ranges and join the ones that overlap or touch."""
+    merged = []
+    for first_seq, last_seq in sorted(origin_ranges):
+        if merged and first_seq <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last_seq)
+        else:
+            merged.append([first_seq, last_seq])
+    return merged
+
+
+def ranges_digest(ranges):
+    """Short digest of an event range summary; equal digests mean nothing to send."""
+    encoded = json.dumps(ranges, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class LedgerPeerHandler(socketserver.StreamRequestHandler):
+    """Answers digest, push and pull requests from another terminal."""
+
+    def handle(self):
+        user_management = self.server.user_management
+        # Only terminals that know the [Network] secret may read or add events
+        if not server_handshake(self.request, self.rfile, self.client_address, self.server.network):
+            self.server.logger.warning(f"Rejected unauthenticated ledger peer {self.client_address}")
+            return
+        while True:
+            try:
+                request = recv_frame(self.rfile)
+            except (ConnectionError, ValueError) as e:
+                self.server.logger.warning(f"Dropping ledger peer {self.client_address}: {e}")
+                return
+            if request is None:
+                return
+
+            operation = request.get('op')
+            try:
+                if operation == 'hello':
+                    ranges = user_management.get_event_ranges()
+                    digest = ranges_digest(ranges)
+                    reply = {'digest': digest, 'origin': user_management.origin}
+                    if digest != request.get('digest'):
+                        reply['ranges'] = ranges
+                elif operation == 'push':
+                    reply = {'applied': user_management.apply_events(request['events'])}
+                elif operation == 'snapshot':
+                    reply = {'adopted': user_management.apply_snapshots(request['snapshots'])}
+                elif operation == 'pull':
+                    # What the peer holds tells the archiver which events it may compact
+                    if request.get('origin'):
+                        user_management.record_peer_ranges(request['origin'], request['ranges'])
+                    events = user_management.get_missing_events(request['ranges'], BATCH_SIZE)
+                    reply = {'events': events, 'more': len(events) == BATCH_SIZE}
+                    if not reply['more']:
+                        # Balances compacted away here reach the peer as totals
+                        reply['snapshots'] = user_management.get_snapshots(request['ranges'])
+                else:
+                    reply = {'error': f"Unknown operation: {operation}"}
+            except Exception as e:
+                self.server.logger.error(f"Error handling ledger {operation}: {e}")
+                reply = {'error': str(e)}
+            send_frame(self.request, reply)
+
+
+class LedgerPeerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, user_management, host='127.0.0.1', port=8766, network=None):
+        super().__init__((host, port), LedgerPeerHandler)
+        self.user_management = user_management
+        self.network = network or load_network_config()
+        self.logger = logging.getLogger(__name__)
+
+
+class LedgerReplicator:
+    """Keeps this terminal's ledger events converged with its peers.
+
+    Every new member, tag change, debit and top-up is an immutable event
+    with a unique origin:seq id that names the member by its uid, so
+    terminals keep taking taps while offline and simply exchange whatever
+    the other side is missing once the link is back. A sync opens
+    with a digest of the held ranges; if both digests match nothing else is
+    sent, otherwise only events outside the peer's ranges go over the wire.
+    Balance events that were compacted away (see ledger_archive.py) reach a
+    peer that never held them as per-member totals instead.
+    """
+
+    def __init__(self, user_management, config=None, network=None):
+        self.user_management = user_management
+        self.config = config or load_replication_config()
+        self.network = network or load_network_config()
+        self.logger = logging.getLogger(__name__)
+        self.stop_event = threading.Event()
+        self.server = None
+        self.sync_thread = None
+
+    def start(self):
+        """Serve peers and sync with them in background threads. Raises OSError if the port is taken."""
+        bind = self.network['bind']
+        if not self.network['secret'] and not is_loopback(bind):
+            self.logger.warning("No [Network] secret set: peers on other machines will be refused")
+        self.server = LedgerPeerServer(self.user_management, bind, self.config['port'], self.network)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.sync_thread = threading.Thread(target=self.run_sync_loop, daemon=True)
+        self.sync_thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop serving and wait for an exchange in progress to finish."""
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.sync_thread:
+            self.sync_thread.join(timeout)
+
+    def run_sync_loop(self):
+        self.logger.info(f"Starting ledger replication as {self.config['origin']}")
+        while not self.stop_event.is_set():
+            for peer in self.config['peers']:
+                try:
+                    self.sync_with(peer)
+                except OSError as e:
+                    # Peer offline; events stay queued in ledger_events until it returns
+                    self.logger.debug(f"Ledger peer {peer} unavailable: {e}")
+                except Exception as e:
+                    self.logger.error(f"Error syncing ledger with {peer}: {e}")
+            self.stop_event.wait(self.config['interval'])
+
+    def sync_with(self, peer):
+        """Exchange missing events with one peer. Returns (sent, received)."""
+        host, _, port = peer.partition(':')
+        address = (host, int(port or self.config['port']))
+        sent = received = 0
+
+        with socket.create_connection(address, timeout=self.config['timeout']) as sock:
+            sock_file = sock.makefile('rb')
+            client_handshake(sock, sock_file, self.network['secret'])
+            local_ranges = self.user_management.get_event_ranges()
+
+            reply = self._request(sock, sock_file, {'op': 'hello', 'digest': ranges_digest(local_ranges)})
+            # Acks are kept under the peer's [POS] id, whichever side starts the sync
+            peer_origin = reply.get('origin')
+            if 'ranges' not in reply:
+                if peer_origin:
+                    self.user_management.record_peer_ranges(peer_origin, local_ranges)
+                return sent, received
+            peer_ranges = reply['ranges']
+
+            # Push what the peer is missing
+            while True:
+                events = self.user_management.get_missing_events(peer_ranges, BATCH_SIZE)
+                if not events:
+                    break
+                self._request(sock, sock_file, {'op': 'push', 'events': events})
+                sent += len(events)
+                for event in events:
+                    self._add_to_ranges(peer_ranges, event[1], event[2])
+                if len(events) < BATCH_SIZE:
+                    break
+
+            # Balances compacted away here go over as per-member totals
+            snapshots = self.user_management.get_snapshots(peer_ranges)
+            if snapshots:
+                self._request(sock, sock_file, {'op': 'snapshot', 'snapshots': snapshots})
+                for snapshot in snapshots:
+                    origin = snapshot['origin']
+                    peer_ranges[origin] = merge_ranges(peer_ranges.get(origin, []) + [[1, snapshot['through']]])
+            if peer_origin:
+                self.user_management.record_peer_ranges(peer_origin, peer_ranges)
+
+            # Pull what we are missing
+            while True:
+                reply = self._request(sock, sock_file, {'op': 'pull', 'ranges': local_ranges, 'origin': self.config['origin']})
+                if reply['events']:
+                    received += self.user_management.apply_events(reply['events'])
+                    local_ranges = self.user_management.get_event_ranges()
+                if not reply['more']:
+                    self.user_management.apply_snapshots(reply.get('snapshots', []))
+                    break
+
+        if sent or received:
+            self.logger.info(f"Ledger sync with {peer}: sent {sent}, received {received} events")
+        return sent, received
+
+    def _request(self, sock, sock_file, message):
+        send_frame(sock, message)
+        reply = recv_frame(sock_file)
+        if reply is None:
+            raise ConnectionError("Ledger peer closed the connection")
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    def _add_to_ranges(self, ranges, origin, seq):
+        """Record that the peer now holds origin:seq."""
+        origin_ranges = ranges.setdefault(origin, [])
+        if origin_ranges and origin_ranges[-1][1] + 1 == seq:
+            origin_ranges[-1][1] = seq
+        else:
+            origin_ranges.append([seq, seq])
+
+
+if __name__ == "__main__":
+    from user_management import UserManagement
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    replicator = LedgerReplicator(UserManagement(local=True))
+    replicator.start()
+    try:
+        replicator.stop_event.wait()
+    except KeyboardInterrupt:
+        replicator.stop()
@@ -0,0 +1,304 @@
+"""Load generator and replay harness for the till pipeline.
+
+Runs PosEngine tills against a scratch copy of the data (never the real
+users.db) and reports throughput and latency percentiles per stage. With
+more than one till, Wyvern debits go through a wallet service on this
+machine, as they do when several tills share one users.db:
+
+    python load_test.py --tills 4 --orders 2000
+    python load_test.py --tills 4 --wallet local
+    python load_test.py --replay transactions --speed 60
+    python load_test.py --mysql --sync-every 100
+
+With --mysql, TransactionSync uploads the generated logs to the server in
+settings.cfg [MySQL] and the kitchen display's query is timed against it;
+point it at a local or test server, not the live one.
+"""
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from tabs import TabManager
+from journal import Journal
+from pos_engine import PosEngine
+from order_model import parse_order_line
+from user_management import UserManagement
+from wallet_service import WalletServer, WalletClient
+from menu_compiler import load_compiled_menu
+from menu_refresher import load_menu_config
+from transaction_logger import TransactionLogger, ENTRY_SEPARATOR, load_log_config
+
+# Prefix of the RFID tags given to generated members
+MEMBER_TAG_PREFIX = 'LOADTEST-'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[position]
+
+
+class StageTimer:
+    """Collects per-stage latencies and event counts from any number of threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.notes = {}
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def time(self, stage, function, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def report(self, elapsed):
+        print(f"\n{'stage':<18}{'count':>8}{'per sec':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, samples in self.samples.items():
+            samples = sorted(samples)
+            print(
+                f"{stage:<18}{len(samples):>8}{len(samples) / elapsed:>10.1f}"
+                f"{percentile(samples, 0.50) * 1000:>10.2f}{percentile(samples, 0.95) * 1000:>10.2f}"
+                f"{percentile(samples, 0.99) * 1000:>10.2f}{samples[-1] * 1000:>10.2f}"
+            )
+        for stage, note in self.notes.items():
+            print(f"{stage:<18}{note}")
+
+
+def prepare_workdir(workdir, users_db=None):
+    """Copy settings and the menu into workdir and make it the current directory."""
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    shutil.copy(os.path.join(REPO_DIR, 'settings.cfg'), workdir)
+    menu_file = load_menu_config(os.path.join(REPO_DIR, 'settings.cfg'))['menu_file']
+    shutil.copy(os.path.join(REPO_DIR, menu_file), workdir)
+    if users_db:
+        shutil.copy(users_db, os.path.join(workdir, 'users.db'))
+    os.chdir(workdir)
+    return menu_file
+
+
+def create_members(user_management, count, rng):
+    """Add count members with LOADTEST- tags and balances large enough for the run."""
+    tags = []
+    for number in range(count):
+        tag = f"{MEMBER_TAG_PREFIX}{number:05d}"
+        if not user_management.get_user_by_rfid(tag):
+            success, message = user_management.add_user(
+                f"Load Test {number}", "", f"loadtest{number}@example.com", tag,
+                rng.choice([0, 0, 5, 10]), 10 ** 9
+            )
+            if not success:
+                raise RuntimeError(message)
+        tags.append(tag)
+    return tags
+
+
+def generate_orders(menu_index, count, rng, wyvern_share):
+    """Yield (delay, lines, payment) for synthetic orders; popular items sell more."""
+    items = list(menu_index.items.values())
+    # Zipf-like popularity over a shuffled menu
+    rng.shuffle(items)
+    weights = [1.0 / (rank + 1) for rank in range(len(items))]
+    for _ in range(count):
+        lines = [(item.label, rng.choice([1, 1, 1, 2, 3])) for item in rng.choices(items, weights, k=rng.randint(1, 4))]
+        payment = 'wyvern' if rng.random() < wyvern_share else rng.choice(['cash', 'card'])
+        yield 0.0, lines, payment
+
+
+def replay_orders(directory):
+    """Yield (delay, lines, payment) for every sale in transactions_*.log, with the original gaps."""
+    previous = None
+    for file_name in sorted(os.listdir(directory)):
+        if not (file_name.startswith('transactions_') and file_name.endswith('.log')):
+            continue
+        with open(os.path.join(directory, file_name), 'r') as file:
+            blocks = file.read().split(ENTRY_SEPARATOR)
+        for block in blocks:
+            when = None
+            payment = None
+            lines = []
+            for line in block.strip().split('\n'):
+                if line.startswith('Timestamp:'):
+                    when = datetime.strptime(line.split(': ', 1)[1].strip(), "%Y-%m-%d %H:%M:%S")
+                elif line.startswith('Payment Method:'):
+                    method = line.split(': ', 1)[1].strip()
+                    payment = 'wyvern' if method.startswith('wyvern') else method
+                elif line.startswith('- '):
+                    parsed = parse_order_line(line[2:])
+                    if parsed:
+                        lines.append((parsed[0], parsed[1]))
+            if when is None or not lines:
+                continue
+            delay = max((when - previous).total_seconds(), 0.0) if previous else 0.0
+            previous = when
+            yield delay, lines, payment
+
+
+def run_till(engine, orders, timer, tags, rng, speed, errors):
+    """Ring up and pay for orders on one till."""
+    for delay, lines, payment in orders:
+        if speed > 0 and delay:
+            time.sleep(delay / speed)
+        timer.count('sales')
+        started = time.perf_counter()
+        try:
+            for label, quantity in lines:
+                added = time.perf_counter()
+                try:
+                    engine.add(label, quantity)
+                except ValueError:
+                    # Replayed item no longer on the menu; a failed lookup is not an order sample
+                    timer.count('skipped lines')
+                    continue
+                timer.record('order', time.perf_counter() - added)
+            if not engine.order:
+                timer.count('skipped sales')
+                continue
+            if payment == 'wyvern' and tags:
+                timer.time('checkout wyvern', engine.pay_wyvern, rng.choice(tags))
+            elif payment == 'card':
+                timer.time('checkout card', engine.pay_card)
+            else:
+                timer.time('checkout cash', engine.pay_cash, engine.total)
+        except Exception as e:
+            errors.append(str(e))
+            engine.tabs.clear()
+            continue
+        timer.record('sale end-to-end', time.perf_counter() - started)
+
+
+def run_sync_stage(timer, stop_event, every_seconds):
+    """Upload the growing transaction logs to MySQL and time the kitchen query, until stopped."""
+    try:
+        from transaction_sync import TransactionSync
+        from kitchen import KITCHEN_ORDERS_QUERY
+    except ImportError as e:
+        timer.notes['sync'] = f"skipped: {e}"
+        return
+    sync = TransactionSync()
+    while True:
+        stopping = stop_event.wait(every_seconds)
+        timer.time('mysql sync', sync.upload_transactions)
+        connection = sync.get_mysql_connection()
+        if connection is not None:
+            try:
+                cursor = connection.cursor()
+                timer.time('kitchen query', lambda: (cursor.execute(KITCHEN_ORDERS_QUERY), cursor.fetchall()))
+            except Exception as e:
+                timer.notes['kitchen query'] = f"failed: {e}"
+            finally:
+                connection.close()
+        if stopping:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the till pipeline with synthetic or replayed sales.")
+    parser.add_argument('--workdir', help="scratch directory (default: a new temporary directory)")
+    parser.add_argument('--users-db', help="start from a copy of this users.db instead of an empty one")
+    parser.add_argument('--members', type=int, default=200, help="synthetic members to create")
+    parser.add_argument('--tills', type=int, default=1, help="tills ringing up in parallel")
+    parser.add_argument('--orders', type=int, default=1000, help="synthetic orders per till")
+    parser.add_argument('--wallet', choices=['local', 'service'],
+                        help="debit cards in this process's users.db, or through a wallet service (default: service with more than one till)")
+    parser.add_argument('--wyvern-share', type=float, default=0.6, help="fraction of synthetic orders paid by Wyvern card")
+    parser.add_argument('--replay', help="replay transactions_*.log files from this directory instead")
+    parser.add_argument('--speed', type=float, default=0, help="replay at this multiple of real time (0: as fast as possible)")
+    parser.add_argument('--mysql', action='store_true', help="also run TransactionSync and the kitchen query")
+    parser.add_argument('--sync-every', type=float, default=5.0, help="seconds between MySQL syncs")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    replay_dir = os.path.abspath(args.replay) if args.replay else None
+    users_db = os.path.abspath(args.users_db) if args.users_db else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='wyvern-load-')
+    menu_file = prepare_workdir(workdir, users_db)
+    print(f"Working in {workdir}")
+
+    rng = random.Random(args.seed)
+    menu = load_compiled_menu(menu_file)
+    user_management = UserManagement(local=True)
+    setup_started = time.perf_counter()
+    tags = create_members(user_management, args.members, rng)
+    print(f"{len(tags)} members ready in {time.perf_counter() - setup_started:.1f}s")
+
+    wallet_server = None
+    if (args.wallet or ('service' if args.tills > 1 else 'local')) == 'service':
+        wallet_server = WalletServer(user_management, '127.0.0.1', 0)
+        threading.Thread(target=wallet_server.serve_forever, daemon=True).start()
+
+    logger = TransactionLogger(load_log_config())
+    logger.start()
+    timer = StageTimer()
+    errors = []
+
+    threads = []
+    for till in range(args.tills):
+        tabs = TabManager(Journal(os.path.join('journal', f'till{till}.journal')))
+        till_users = UserManagement(local=True)
+        if wallet_server is not None:
+            till_users.wallet = WalletClient(*wallet_server.server_address)
+        engine = PosEngine(menu.index, till_users, tabs, logger)
+        if replay_dir:
+            # Every till replays the whole set, as if each served the same night
+            orders = replay_orders(replay_dir)
+        else:
+            orders = generate_orders(menu.index, args.orders, random.Random(rng.random()), args.wyvern_share)
+        till_rng = random.Random(rng.random())
+        threads.append(threading.Thread(target=run_till, args=(engine, orders, timer, tags, till_rng, args.speed, errors)))
+
+    stop_event = threading.Event()
+    sync_thread = None
+    if args.mysql:
+        sync_thread = threading.Thread(target=run_sync_stage, args=(timer, stop_event, args.sync_every))
+        sync_thread.start()
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    timer.time('log flush', logger.stop)
+    elapsed = time.perf_counter() - started
+    stop_event.set()
+    if sync_thread:
+        sync_thread.join()
+    if wallet_server is not None:
+        wallet_server.shutdown()
+
+    sales = len(timer.samples['sale end-to-end'])
+    print(f"{sales} sales on {args.tills} till(s) in {elapsed:.2f}s ({sales / elapsed:.1f} sales/s)")
+    if timer.counts['skipped lines']:
+        print(
+            f"Skipped {timer.counts['skipped sales']} of {timer.counts['sales']} sales and "
+            f"{timer.counts['skipped lines']} order lines whose items are not on the menu"
+        )
+    if errors:
+        print(f"{len(errors)} failed sales, e.g. {errors[0]}")
+    timer.report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
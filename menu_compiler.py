@@ -0,0 +1,276 @@
+import os
+import csv
+import json
+import hashlib
+from collections import namedtuple
+from money import Money
+from menu_index import MenuIndex
+
+# Bump when the artifact layout changes so stale caches are recompiled
+ARTIFACT_FORMAT = 1
+
+CompiledMenu = namedtuple('CompiledMenu', ['menu_data', 'index', 'problems', 'digest'])
+
+
+class MenuError(ValueError):
+    pass
+
+
+def parse_price(value, where, problems):
+    """Parse a price into Money, recording a problem and returning None if it is invalid."""
+    try:
+        price = Money.from_rands(value)
+    except (ValueError, TypeError):
+        problems.append(f"{where}: invalid price {value!r}")
+        return None
+    if price < 0:
+        problems.append(f"{where}: negative price {value!r}")
+        return None
+    return price
+
+
+def add_item(menu_data, path, price, station, where, problems):
+    """Place one priced item in the nested menu_data tree."""
+    level = menu_data
+    for name in path[:-1]:
+        node = level.setdefault(name, {})
+        if "price" in node:
+            problems.append(f"{where}: {' > '.join(path)} is nested under a priced item")
+            return
+        level = node
+    if path[-1] in level:
+        problems.append(f"{where}: duplicate item {' > '.join(path)}")
+        return
+    leaf = {"price": price}
+    if station:
+        leaf["station"] = station
+    level[path[-1]] = leaf
+
+
+def parse_csv_menu(path):
+    """Read a category,description,size,price[,station] menu file with the csv module."""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        return parse_csv_lines(file)
+
+
+def parse_csv_lines(lines):
+    """Parse menu CSV lines (a file or pasted text split into lines) into (menu_data, problems)."""
+    menu_data = {}
+    problems = []
+    for line_number, row in enumerate(csv.reader(lines), 1):
+        if not any(cell.strip() for cell in row):
+            continue
+        where = f"line {line_number}"
+        if len(row) < 4:
+            problems.append(f"{where}: expected category,description,size,price")
+            continue
+        # Names are kept as written so labels in older transaction logs still match
+        category = row[0].replace(':', '')  # Categories are written as "BEER:"
+        description = row[1]
+        size = row[2]
+        if not category.strip() or not description.strip():
+            problems.append(f"{where}: missing category or description")
+            continue
+        price = parse_price(row[3].strip(), where, problems)
+        if price is None:
+            continue
+        station = row[4].strip().lower() if len(row) > 4 else ''
+        item_path = (category, description, size) if size.strip() else (category, description)
+        add_item(menu_data, item_path, price, station, where, problems)
+    return menu_data, problems
+
+
+def parse_json_menu(path):
+    """Read a nested JSON menu, accepting the editor's older single_price key."""
+    with open(path, 'r', encoding='utf-8') as file:
+        tree = json.load(file)
+    menu_data = {}
+    problems = []
+
+    def walk(node, item_path):
+        for name, details in node.items():
+            if not isinstance(details, dict):
+                problems.append(f"{' > '.join(item_path + (name,))}: expected an object")
+                continue
+            if "price" in details or "single_price" in details:
+                where = ' > '.join(item_path + (name,))
+                price = parse_price(details.get("price", details.get("single_price")), where, problems)
+                if price is not None:
+                    add_item(menu_data, item_path + (name,), price, details.get("station", ''), where, problems)
+            else:
+                walk(details, item_path + (name,))
+
+    walk(tree, ())
+    return menu_data, problems
+
+
+def compile_menu(path):
+    """Parse a .csv or .json menu source into (menu_data, problems)."""
+    if path.lower().endswith('.json'):
+        menu_data, problems = parse_json_menu(path)
+    else:
+        menu_data, problems = parse_csv_menu(path)
+    if not menu_data:
+        raise MenuError(f"{path} has no valid menu items" + (f" ({problems[0]})" if problems else ""))
+    return menu_data, problems
+
+
+def flatten(menu_data):
+    """Return [path, price_cents, station] rows in menu order."""
+    rows = []
+
+    def walk(level, item_path):
+        for name, details in level.items():
+            if "price" in details:
+                rows.append([list(item_path + (name,)), int(details["price"]), details.get("station", '')])
+            else:
+                walk(details, item_path + (name,))
+
+    walk(menu_data, ())
+    return rows
+
+
+def unflatten(rows):
+    menu_data = {}
+    for item_path, price_cents, station in rows:
+        level = menu_data
+        for name in item_path[:-1]:
+            level = level.setdefault(name, {})
+        leaf = {"price": Money(price_cents)}
+        if station:
+            leaf["station"] = station
+        level[item_path[-1]] = leaf
+    return menu_data
+
+
+def source_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def artifact_path(source, cache_dir):
+    return os.path.join(cache_dir, os.path.basename(source) + '.compiled.json')
+
+
+def load_compiled_menu(source, cache_dir='menu_cache'):
+    """Load a menu through its compiled artifact, recompiling only when the source changed.
+
+    The artifact records the source's mtime, size and sha256. A matching
+    mtime and size is trusted without reading the source; otherwise the
+    source is hashed and only recompiled if its content really changed.
+    """
+    stat = os.stat(source)
+    artifact_file = artifact_path(source, cache_dir)
+    artifact = None
+    try:
+        with open(artifact_file, 'r', encoding='utf-8') as file:
+            artifact = json.load(file)
+        if artifact.get('format') != ARTIFACT_FORMAT:
+            artifact = None
+    except (OSError, ValueError):
+        artifact = None
+
+    if artifact and artifact['mtime_ns'] == stat.st_mtime_ns and artifact['size'] == stat.st_size:
+        menu_data = unflatten(artifact['items'])
+        return CompiledMenu(menu_data, MenuIndex(menu_data), artifact['problems'], artifact['sha256'])
+
+    with open(source, 'rb') as file:
+        digest = source_digest(file.read())
+    if artifact and artifact['sha256'] == digest:
+        menu_data = unflatten(artifact['items'])
+        problems = artifact['problems']
+    else:
+        menu_data, problems = compile_menu(source)
+        artifact = {'format': ARTIFACT_FORMAT, 'sha256': digest, 'problems': problems, 'items': flatten(menu_data)}
+
+    artifact['mtime_ns'] = stat.st_mtime_ns
+    artifact['size'] = stat.st_size
+    write_artifact(artifact_file, artifact)
+    return CompiledMenu(menu_data, MenuIndex(menu_data), problems, digest)
+
+
+def save_compiled_menu(source, menu_data, problems, cache_dir='menu_cache'):
+    """Record menu_data, already compiled from source, as its artifact and return the CompiledMenu."""
+    stat = os.stat(source)
+    with open(source, 'rb') as file:
+        digest = source_digest(file.read())
+    artifact = {
+        'format': ARTIFACT_FORMAT, 'sha256': digest, 'problems': problems, 'items': flatten(menu_data),
+        'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size
+    }
+    write_artifact(artifact_path(source, cache_dir), artifact)
+    return CompiledMenu(menu_data, MenuIndex(menu_data), problems, digest)
+
+
+def write_artifact(artifact_file, artifact):
+    directory = os.path.dirname(artifact_file)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    temp_path = artifact_file + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(artifact, file, separators=(',', ':'))
+    os.replace(temp_path, artifact_file)
+
+
+def rands(price):
+    """A price as the editor writes it: whole rands as an int, otherwise a "12.50" string."""
+    price = Money.from_rands(price)
+    return int(price) // 100 if int(price) % 100 == 0 else str(price)
+
+
+def empty_categories(menu_data):
+    """Return the paths of categories with no items under them, as "A > B" strings."""
+    empty = []
+
+    def walk(level, item_path):
+        has_items = False
+        for name, details in level.items():
+            if "price" in details:
+                has_items = True
+            elif walk(details, item_path + (name,)):
+                has_items = True
+        if item_path and not has_items:
+            empty.append(' > '.join(item_path))
+        return has_items
+
+    walk(menu_data, ())
+    return empty
+
+
+def write_menu(path, menu_data):
+    """Write menu_data back to a .csv or .json source, replacing the file atomically.
+
+    Raises MenuError rather than silently dropping empty categories, which
+    neither the compiled menu nor a CSV source can hold.
+    """
+    empty = empty_categories(menu_data)
+    if empty:
+        raise MenuError(f"Add an item to, or delete, the empty categories before saving: {', '.join(empty)}")
+    temp_path = path + '.tmp'
+    if path.lower().endswith('.json'):
+        def export(level):
+            tree = {}
+            for name, details in level.items():
+                if "price" in details:
+                    leaf = {"price": rands(details["price"])}
+                    if details.get("station"):
+                        leaf["station"] = details["station"]
+                    tree[name] = leaf
+                else:
+                    tree[name] = export(details)
+            return tree
+
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(export(menu_data), file, indent=2)
+    else:
+        with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            for item_path, price_cents, station in flatten(menu_data):
+                if len(item_path) not in (2, 3):
+                    raise MenuError(f"{' > '.join(item_path)}: CSV menus only hold category > description > size")
+                category, description = item_path[0], item_path[1]
+                size = item_path[2] if len(item_path) == 3 else ''
+                row = [f"{category}:", description, size, rands(Money(price_cents))]
+                if station:
+                    row.append(station)
+                writer.writerow(row)
+    os.replace(temp_path, path)
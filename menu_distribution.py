@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import socket
+import difflib
+import hashlib
+import logging
+import threading
+import configparser
+import socketserver
+from menu_compiler import flatten, unflatten, write_menu, load_compiled_menu
+from wallet_service import send_frame, recv_frame, load_network_config, server_handshake, client_handshake
+
+
+def load_distribution_config(config_file='settings.cfg'):
+    """Load menu distribution settings; standalone tills keep polling Drive themselves."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'role': config.get('MenuDistribution', 'role', fallback='standalone'),
+        'host': config.get('MenuDistribution', 'host', fallback='127.0.0.1'),
+        'port': config.getint('MenuDistribution', 'port', fallback=8767),
+        'wait': config.getint('MenuDistribution', 'wait', fallback=30),
+        'timeout': config.getfloat('MenuDistribution', 'timeout', fallback=3.0),
+        'directory': config.get('MenuDistribution', 'directory', fallback='menu_versions'),
+        'keep_versions': config.getint('MenuDistribution', 'keep_versions', fallback=20),
+        'menu_file': config.get('Menu', 'file', fallback='bar_menu.csv'),
+        'cache_dir': config.get('Menu', 'cache_dir', fallback='menu_cache')
+    }
+
+
+def menu_version_hash(items):
+    """Content hash of a flattened menu, independent of its source file format."""
+    body = json.dumps(items, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def make_delta(old_items, new_items):
+    """Return [start, end, rows] edits that turn old_items into new_items."""
+    old_rows = [json.dumps(row) for row in old_items]
+    new_rows = [json.dumps(row) for row in new_items]
+    matcher = difflib.SequenceMatcher(None, old_rows, new_rows, autojunk=False)
+    return [
+        [i1, i2, new_items[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_delta(items, delta):
+    items = list(items)
+    # Apply from the end so earlier offsets stay valid
+    for start, end, rows in reversed(delta):
+        items[start:end] = rows
+    return items
+
+
+def install_menu(items, menu_file, cache_dir='menu_cache'):
+    """Write a received menu over the local menu file and return it compiled."""
+    write_menu(menu_file, unflatten(items))
+    return load_compiled_menu(menu_file, cache_dir)
+
+
+class MenuStore:
+    """Numbered, content-hashed menu versions kept on disk.
+
+    Publishing a menu identical to the head is a no-op. fetch() answers a
+    till with just the edits from the version it already has, or the full
+    menu if that version has been pruned, and can hold the request open
+    until a newer version is published.
+    """
+
+    def __init__(self, directory='menu_versions', keep_versions=20):
+        self.directory = directory
+        self.keep_versions = keep_versions
+        self.logger = logging.getLogger(__name__)
+        self.versions = []
+        self.changed = threading.Condition()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name), 'r', encoding='utf-8') as file:
+                    self.versions.append(json.load(file))
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Skipping unreadable menu version {file_name}: {e}")
+        self.versions.sort(key=lambda version: version['version'])
+
+    def head(self):
+        return self.versions[-1] if self.versions else None
+
+    def publish(self, items, source):
+        """Store items as a new version if they changed. Returns (version, changed)."""
+        sha256 = menu_version_hash(items)
+        with self.changed:
+            head = self.head()
+            if head and head['sha256'] == sha256:
+                return head, False
+            version = {
+                'version': head['version'] + 1 if head else 1,
+                'sha256': sha256,
+                'source': source,
+                'published': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'items': items
+            }
+            path = os.path.join(self.directory, f"v{version['version']:06d}.json")
+            with open(path + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(version, file, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+            self.versions.append(version)
+            self.prune()
+            self.changed.notify_all()
+        self.logger.info(f"Published menu version {version['version']} from {source} ({len(items)} items)")
+        return version, True
+
+    def prune(self):
+        while len(self.versions) > self.keep_versions:
+            old = self.versions.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, f"v{old['version']:06d}.json"))
+            except OSError:
+                pass
+
+    def fetch(self, since=None, wait=0):
+        """Return the head as a delta from the version hashed since, waiting up to wait seconds for a change."""
+        with self.changed:
+            head = self.head()
+            if head and head['sha256'] == since and wait > 0:
+                self.changed.wait_for(lambda: self.head()['sha256'] != since, timeout=wait)
+                head = self.head()
+        if head is None or head['sha256'] == since:
+            return {'unchanged': True}
+
+        reply = {'version': head['version'], 'sha256': head['sha256']}
+        base = next((version for version in self.versions if version['sha256'] == since), None)
+        if base is not None:
+            reply['delta'] = make_delta(base['items'], head['items'])
+        else:
+            reply['items'] = head['items']
+        return reply
+
+
+class MenuRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # Publishing changes every till's prices, so only tills with the [Network] secret are served
+        if not server_handshake(self.request, self.rfile, self.client_address, self.server.network):
+            self.server.logger.warning(f"Rejected unauthenticated menu client {self.client_address}")
+            return
+        while True:
+            try:
+                request = recv_frame(self.rfile)
+            except (ConnectionError, ValueError) as e:
+                self.server.logger.warning(f"Dropping menu client {self.client_address}: {e}")
+                return
+            if request is None:
+                return
+            send_frame(self.request, self.server.dispatch(request))
+
+
+class MenuServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Serves menu versions to the other tills from the designated node.
+
+    This node is the only one that polls Google Drive; a Drive download and
+    a MenuEditor save both become new versions here. Every published
+    version is also installed on this node's own till through on_menu_ready.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, root, on_menu_ready, config=None, network=None):
+        self.config = config or load_distribution_config()
+        self.network = network or load_network_config()
+        super().__init__((self.network['bind'], self.config['port']), MenuRequestHandler)
+        self.root = root
+        self.on_menu_ready = on_menu_ready
+        self.logger = logging.getLogger(__name__)
+        self.store = MenuStore(self.config['directory'], self.config['keep_versions'])
+        self.thread = None
+
+    def start(self, menu_data=None):
+        """Publish the local menu if it is newer and start serving in a background thread."""
+        if menu_data is not None:
+            self.store.publish(flatten(menu_data), 'local')
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def publish_download(self, menu_data, menu_index=None):
+        """MenuRefresher callback: publish a menu downloaded from Drive on this node."""
+        self.publish(flatten(menu_data), 'drive')
+
+    def publish(self, items, source):
+        version, changed = self.store.publish(items, source)
+        if changed and self.root is not None:
+            menu = install_menu(items, self.config['menu_file'], self.config['cache_dir'])
+            self.root.after(0, lambda: self.on_menu_ready(menu.menu_data, menu.index))
+        return version
+
+    def dispatch(self, request):
+        request_id = request.get('id')
+        operation = request.get('op')
+        try:
+            if operation == 'fetch':
+                wait = min(max(request.get('wait', 0), 0), self.config['wait'])
+                result = self.store.fetch(request.get('since'), wait)
+            elif operation == 'publish':
+                version = self.publish(request['items'], request.get('source', 'editor'))
+                result = {'version': version['version'], 'sha256': version['sha256']}
+            else:
+                return {'id': request_id, 'ok': False, 'error': f"Unknown operation: {operation}"}
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            self.logger.error(f"Error handling menu {operation}: {e}")
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+
+def menu_request(config, request, timeout, secret=None):
+    """Send one request to the menu server and return its result."""
+    if secret is None:
+        secret = load_network_config()['secret']
+    with socket.create_connection((config['host'], config['port']), timeout=timeout) as sock:
+        with sock.makefile('rb') as sock_file:
+            client_handshake(sock, sock_file, secret)
+            send_frame(sock, dict(request, id=1))
+            reply = recv_frame(sock_file)
+    if reply is None:
+        raise ConnectionError("Menu server closed the connection")
+    if not reply['ok']:
+        raise RuntimeError(reply['error'])
+    return reply['result']
+
+
+def publish_menu(menu_data, source='editor', config=None):
+    """Send an edited menu to the menu server. Returns (success, message)."""
+    config = config or load_distribution_config()
+    if config['role'] == 'standalone':
+        return False, "Menu distribution is not configured"
+    try:
+        result = menu_request(config, {'op': 'publish', 'items': flatten(menu_data), 'source': source}, config['timeout'])
+    except (OSError, ValueError, RuntimeError) as e:
+        return False, f"Could not reach menu server: {e}"
+    return True, f"Published menu version {result['version']}"
+
+
+class MenuSyncClient:
+    """Keeps a till's menu in step with the menu server.
+
+    Holds one long-poll request open at a time, so a published change
+    arrives within moments and an idle till costs one small request per
+    wait period. Only the edited rows travel; the result is checked against
+    the server's content hash and the full menu is requested on a mismatch.
+    """
+
+    def __init__(self, root, on_menu_ready, menu_data, config=None):
+        self.root = root
+        self.on_menu_ready = on_menu_ready
+        self.config = config or load_distribution_config()
+        self.secret = load_network_config()['secret']
+        self.logger = logging.getLogger(__name__)
+        self.items = flatten(menu_data)
+        self.sha256 = menu_version_hash(self.items)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run_sync_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_sync_loop(self):
+        delay = 1
+        while not self.stop_event.is_set():
+            try:
+                self.sync_once(self.config['wait'])
+                delay = 1
+            except (OSError, ValueError, RuntimeError) as e:
+                self.logger.warning(f"Menu server unavailable, retrying in {delay}s: {e}")
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, 60)
+
+    def sync_once(self, wait=0):
+        """Fetch and install the server's menu if it differs. Returns True if it did."""
+        timeout = wait + self.config['timeout']
+        result = menu_request(self.config, {'op': 'fetch', 'since': self.sha256, 'wait': wait}, timeout, self.secret)
+        if result.get('unchanged'):
+            return False
+
+        if 'delta' in result:
+            items = apply_delta(self.items, result['delta'])
+            if menu_version_hash(items) != result['sha256']:
+                self.logger.warning("Menu delta did not match the server's version; fetching the full menu")
+                result = menu_request(self.config, {'op': 'fetch', 'since': None}, timeout, self.secret)
+                items = result['items']
+        else:
+            items = result['items']
+
+        menu = install_menu(items, self.config['menu_file'], self.config['cache_dir'])
+        self.items = items
+        self.sha256 = result['sha256']
+        self.root.after(0, lambda: self.on_menu_ready(menu.menu_data, menu.index))
+        self.logger.info(f"Installed menu version {result['version']} ({len(items)} items)")
+        return True
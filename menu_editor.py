@@ -1,12 +1,18 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import json
-from decimal import Decimal
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import sys
+from money import Money
+from menu_compiler import MenuError, compile_menu, flatten, load_compiled_menu, parse_csv_lines, write_menu
+from menu_refresher import load_menu_config
+from menu_distribution import publish_menu
 
 class MenuEditor:
-    def __init__(self, root):
+    def __init__(self, root, menu_file=None):
         self.root = root
-        self.root.title("Drinks Menu Editor")
+        # Edit the till's own menu unless another .csv or .json file is given
+        self.menu_config = load_menu_config()
+        self.menu_file = menu_file or self.menu_config['menu_file']
+        self.root.title(f"Drinks Menu Editor - {self.menu_file}")
         self.root.geometry("1200x800")
         self.root.configure(bg="#f0f0f0")
         
@@ -46,18 +52,35 @@ class MenuEditor:
     
     def load_menu(self):
         try:
-            with open('drinks_menu.json', 'r') as file:
-                self.menu_data = json.load(file)
+            # Same compiled artifact the till loads, so both see identical prices
+            menu = load_compiled_menu(self.menu_file, self.menu_config['cache_dir'])
+            self.menu_data = menu.menu_data
+            if menu.problems:
+                messagebox.showwarning("Warning", "Some menu lines were skipped:\n" + "\n".join(menu.problems[:10]))
         except FileNotFoundError:
             self.menu_data = {}
             messagebox.showwarning("Warning", "Menu file not found. Starting with empty menu.")
+        except MenuError as e:
+            self.menu_data = {}
+            messagebox.showerror("Error", f"Failed to load menu: {str(e)}")
     
     def save_menu(self):
         try:
-            with open('drinks_menu.json', 'w') as file:
-                json.dump(self.menu_data, file, indent=2)
-            self.status_var.set("Menu saved successfully")
-            messagebox.showinfo("Success", "Menu saved successfully")
+            write_menu(self.menu_file, self.menu_data)
+            # Recompile now so the till's next start is a cache hit
+            load_compiled_menu(self.menu_file, self.menu_config['cache_dir'])
+            if self.menu_file != self.menu_config['menu_file']:
+                self.status_var.set("Menu saved successfully")
+                messagebox.showinfo("Success", "Menu saved successfully")
+                return
+            # Push the new version to the tills through the menu server
+            success, message = publish_menu(self.menu_data)
+            if success:
+                self.status_var.set(f"Menu saved. {message}")
+                messagebox.showinfo("Success", f"Menu saved successfully.\n{message}")
+            else:
+                self.status_var.set(f"Menu saved locally. {message}")
+                messagebox.showinfo("Success", f"Menu saved locally.\n{message}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save menu: {str(e)}")
     
@@ -72,6 +95,10 @@ class MenuEditor:
         self.tree.heading("Price", text="Price")
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 20))
         
+        # Tree node id <-> menu path, so edits touch single nodes
+        self.node_paths = {}
+        self.path_nodes = {}
+        
         # Create buttons frame
         buttons_frame = ttk.Frame(content_frame)
         buttons_frame.pack(side=tk.RIGHT, fill=tk.Y)
@@ -88,72 +115,120 @@ class MenuEditor:
         # Delete button
         ttk.Button(buttons_frame, text="Delete", command=self.delete_item).pack(fill=tk.X, pady=5)
         
+        # Bulk import button
+        ttk.Button(buttons_frame, text="Bulk Import", command=self.show_bulk_import).pack(fill=tk.X, pady=5)
+        
         # Populate tree
         self.populate_tree()
     
-    def populate_tree(self, parent="", items=None):
+    def populate_tree(self, parent="", items=None, path=()):
         if items is None:
             items = self.menu_data
         
         for name, details in items.items():
             if isinstance(details, dict):
-                if "price" in details or "single_price" in details:
+                if "price" in details:
                     # It's a drink item
-                    price = details.get("price", details.get("single_price", "N/A"))
-                    self.tree.insert(parent, "end", text=name, values=(f"R{price}",))
+                    self.insert_node(path + (name,), values=(f"R{details['price']}",))
                 else:
                     # It's a category
-                    item_id = self.tree.insert(parent, "end", text=name)
-                    self.populate_tree(item_id, details)
+                    item_id = self.insert_node(path + (name,))
+                    self.populate_tree(item_id, details, path + (name,))
     
-    def add_category(self):
+    def insert_node(self, path, values=()):
+        item_id = self.tree.insert(self.path_nodes.get(path[:-1], ""), "end", text=path[-1], values=values)
+        self.node_paths[item_id] = path
+        self.path_nodes[path] = item_id
+        return item_id
+    
+    def forget_nodes(self, item_id):
+        """Drop item_id and its descendants from the node maps."""
+        for child in self.tree.get_children(item_id):
+            self.forget_nodes(child)
+        del self.path_nodes[self.node_paths.pop(item_id)]
+    
+    def remap_nodes(self, item_id, path):
+        """Record a new path for item_id and its descendants after a rename."""
+        del self.path_nodes[self.node_paths[item_id]]
+        self.node_paths[item_id] = path
+        self.path_nodes[path] = item_id
+        for child in self.tree.get_children(item_id):
+            self.remap_nodes(child, path + (self.tree.item(child, 'text'),))
+    
+    def level_at(self, path):
+        current = self.menu_data
+        for p in path:
+            current = current[p]
+        return current
+    
+    def selected_category(self):
+        """Path of the selected category, or of the selected item's category."""
         selected = self.tree.selection()
-        parent = selected[0] if selected else ""
+        if not selected:
+            return None
+        path = self.get_path(selected[0])
+        if "price" in self.level_at(path):
+            path = path[:-1]
+        return path
+    
+    def add_category(self):
+        path = self.selected_category() or ()
         
         name = simpledialog.askstring("Add Category", "Enter category name:")
         if name:
-            if parent:
-                # Get the path to the parent
-                path = self.get_path(parent)
-                current = self.menu_data
-                for p in path[:-1]:
-                    current = current[p]
-                current[path[-1]][name] = {}
-            else:
-                self.menu_data[name] = {}
-            
-            # Refresh tree
-            self.refresh_tree()
+            current = self.level_at(path)
+            if name in current:
+                messagebox.showerror("Error", f"'{name}' already exists here")
+                return
+            current[name] = {}
+            self.tree.see(self.insert_node(path + (name,)))
             self.status_var.set(f"Category '{name}' added")
     
     def add_item(self):
-        selected = self.tree.selection()
-        if not selected:
+        path = self.selected_category()
+        if path is None:
             messagebox.showwarning("Warning", "Please select a category first")
             return
         
-        parent = selected[0]
         name = simpledialog.askstring("Add Item", "Enter item name:")
         if name:
             try:
-                price = int(simpledialog.askstring("Add Item", "Enter price:"))
+                price_text = simpledialog.askstring("Add Item", "Enter price:")
+                if price_text is None:
+                    return
+                price = Money.parse(price_text)
                 if price <= 0:
                     raise ValueError("Price must be positive")
                 
-                # Get the path to the parent
-                path = self.get_path(parent)
-                current = self.menu_data
-                for p in path:
-                    current = current[p]
-                
-                current[name] = {"price": price}
-                
-                # Refresh tree
-                self.refresh_tree()
+                self.set_item(path + (name,), price)
+                self.tree.see(self.path_nodes[path + (name,)])
                 self.status_var.set(f"Item '{name}' added")
             except ValueError as e:
                 messagebox.showerror("Error", str(e))
     
+    def set_item(self, path, price, station=''):
+        """Add or re-price the item at path, creating categories on the way."""
+        current = self.menu_data
+        for depth, name in enumerate(path[:-1], 1):
+            if name not in current:
+                current[name] = {}
+                self.insert_node(path[:depth])
+            current = current[name]
+            if "price" in current:
+                raise ValueError(f"{' > '.join(path[:depth])} is an item, not a category")
+        
+        details = current.get(path[-1])
+        if details is not None and "price" not in details:
+            raise ValueError(f"{' > '.join(path)} is a category, not an item")
+        if details is None:
+            details = current[path[-1]] = {}
+            self.insert_node(path, values=(f"R{price}",))
+        else:
+            self.tree.item(self.path_nodes[path], values=(f"R{price}",))
+        details["price"] = price
+        if station:
+            details["station"] = station
+    
     def edit_item(self):
         selected = self.tree.selection()
         if not selected:
@@ -166,25 +241,21 @@ class MenuEditor:
         
         # Get the path to the item
         path = self.get_path(item_id)
-        current = self.menu_data
-        for p in path[:-1]:
-            current = current[p]
+        current = self.level_at(path[:-1])
         
-        if "price" in current[path[-1]] or "single_price" in current[path[-1]]:
+        if "price" in current[path[-1]]:
             # It's a drink item
             try:
-                new_price = int(simpledialog.askstring("Edit Price", f"Enter new price for {name}:", 
-                                                       initialvalue=current[path[-1]].get("price", current[path[-1]].get("single_price"))))
+                price_text = simpledialog.askstring("Edit Price", f"Enter new price for {name}:", 
+                                                    initialvalue=str(current[path[-1]]["price"]))
+                if price_text is None:
+                    return
+                new_price = Money.parse(price_text)
                 if new_price <= 0:
                     raise ValueError("Price must be positive")
                 
-                if "price" in current[path[-1]]:
-                    current[path[-1]]["price"] = new_price
-                else:
-                    current[path[-1]]["single_price"] = new_price
-                
-                # Refresh tree
-                self.refresh_tree()
+                current[path[-1]]["price"] = new_price
+                self.tree.item(item_id, values=(f"R{new_price}",))
                 self.status_var.set(f"Price updated for '{name}'")
             except ValueError as e:
                 messagebox.showerror("Error", str(e))
@@ -192,9 +263,15 @@ class MenuEditor:
             # It's a category
             new_name = simpledialog.askstring("Rename Category", f"Enter new name for {name}:", initialvalue=name)
             if new_name and new_name != name:
-                current[new_name] = current.pop(path[-1])
-                # Refresh tree
-                self.refresh_tree()
+                if new_name in current:
+                    messagebox.showerror("Error", f"'{new_name}' already exists here")
+                    return
+                # Rename in place so the category keeps its position on the till
+                entries = list(current.items())
+                current.clear()
+                current.update((new_name if key == name else key, value) for key, value in entries)
+                self.tree.item(item_id, text=new_name)
+                self.remap_nodes(item_id, path[:-1] + (new_name,))
                 self.status_var.set(f"Category renamed to '{new_name}'")
     
     def delete_item(self):
@@ -210,35 +287,69 @@ class MenuEditor:
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{name}'?"):
             # Get the path to the item
             path = self.get_path(item_id)
-            current = self.menu_data
-            for p in path[:-1]:
-                current = current[p]
-            
-            del current[path[-1]]
+            del self.level_at(path[:-1])[path[-1]]
             
-            # Refresh tree
-            self.refresh_tree()
+            self.forget_nodes(item_id)
+            self.tree.delete(item_id)
             self.status_var.set(f"'{name}' deleted")
     
     def get_path(self, item_id):
-        path = []
-        while item_id:
-            item = self.tree.item(item_id)
-            path.insert(0, item['text'])
-            item_id = self.tree.parent(item_id)
-        return path
+        return self.node_paths[item_id]
     
-    def refresh_tree(self):
-        # Clear tree
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        # Repopulate
-        self.populate_tree()
+    def show_bulk_import(self):
+        """Paste or load many category,description,size,price lines at once."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Bulk Import")
+        dialog.geometry("700x500")
+        dialog.transient(self.root)
+        
+        ttk.Label(dialog, text="Paste lines as category,description,size,price (the menu CSV format):").pack(fill=tk.X, padx=10, pady=10)
+        text = tk.Text(dialog, font=('Arial', 12))
+        text.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        buttons_frame = ttk.Frame(dialog)
+        buttons_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        def import_text():
+            menu_data, problems = parse_csv_lines(text.get("1.0", tk.END).splitlines())
+            dialog.destroy()
+            self.import_items(menu_data, problems)
+        
+        def import_file():
+            path = filedialog.askopenfilename(parent=dialog, filetypes=[("Menu files", "*.csv *.json"), ("All files", "*.*")])
+            if not path:
+                return
+            try:
+                menu_data, problems = compile_menu(path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"Failed to read {path}: {str(e)}", parent=dialog)
+                return
+            dialog.destroy()
+            self.import_items(menu_data, problems)
+        
+        ttk.Button(buttons_frame, text="Import", command=import_text).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons_frame, text="From File...", command=import_file).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+    
+    def import_items(self, menu_data, problems):
+        """Merge imported items into the menu, adding or re-pricing each one."""
+        problems = list(problems)
+        imported = 0
+        for item_path, price_cents, station in flatten(menu_data):
+            try:
+                self.set_item(tuple(item_path), Money(price_cents), station)
+                imported += 1
+            except ValueError as e:
+                problems.append(str(e))
+        
+        self.status_var.set(f"Imported {imported} items" + (f", {len(problems)} skipped" if problems else ""))
+        if problems:
+            messagebox.showwarning("Warning", f"Imported {imported} items. Skipped:\n" + "\n".join(problems[:10]))
 
 def main():
     root = tk.Tk()
-    app = MenuEditor(root)
+    app = MenuEditor(root, sys.argv[1] if len(sys.argv) > 1 else None)
     root.mainloop()
 
 if __name__ == "__main__":
-    main() 
+    main()
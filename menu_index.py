@@ -0,0 +1,117 @@
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+# One orderable menu entry. path is the tuple of menu level names leading to
+# it, label is the same path joined for display and logging.
+MenuItem = namedtuple('MenuItem', ['path', 'label', 'category', 'description', 'size', 'price', 'station', 'image'])
+
+# What changed between two menu loads: item paths added, removed or changed
+# in place (price, station or image), and the levels whose list of entries
+# differs, including levels that no longer exist.
+MenuDiff = namedtuple('MenuDiff', ['added', 'removed', 'changed', 'changed_levels'])
+
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png')
+
+
+def find_images(image_dir='images'):
+    """Map lower-case image names (without extension) to their file paths."""
+    images = {}
+    if os.path.isdir(image_dir):
+        for file_name in os.listdir(image_dir):
+            name, extension = os.path.splitext(file_name)
+            if extension.lower() in IMAGE_EXTENSIONS:
+                images.setdefault(name.lower(), os.path.join(image_dir, file_name))
+    return images
+
+
+def station_for(category):
+    """Return where an item is prepared; kitchen categories go to the kitchen display."""
+    return 'kitchen' if 'KITCHEN' in category.upper() else 'bar'
+
+
+class MenuIndex:
+    """Flattened, read-only index over the nested menu_data tree.
+
+    Built once per menu load so checkout never walks the tree: items maps a
+    path tuple to its MenuItem, by_label maps the display label back to the
+    item, and children lists each level's entries in menu order.
+    """
+
+    def __init__(self, menu_data, image_dir='images'):
+        images = find_images(image_dir)
+        items = {}
+        children = {}
+
+        def walk(level, path):
+            names = []
+            for name, details in level.items():
+                if not isinstance(details, dict):
+                    continue
+                names.append(name)
+                item_path = path + (name,)
+                if "price" in details:
+                    items[item_path] = self._make_item(item_path, details, images)
+                else:
+                    walk(details, item_path)
+            children[path] = tuple(names)
+
+        walk(menu_data, ())
+
+        self.items = MappingProxyType(items)
+        self.children = MappingProxyType(children)
+        self.by_label = MappingProxyType({item.label: item for item in items.values()})
+        self.images = MappingProxyType(images)
+
+    def _make_item(self, path, details, images):
+        category = path[0]
+        description = path[1] if len(path) > 2 else path[-1]
+        size = path[-1] if len(path) > 2 else ''
+        image = images.get(description.lower())
+        return MenuItem(
+            path=path,
+            label=" > ".join(path),
+            category=category,
+            description=description,
+            size=size,
+            price=details["price"],
+            station=details.get("station") or station_for(category),
+            image=image
+        )
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, path):
+        """Return the MenuItem at path, or None."""
+        return self.items.get(tuple(path))
+
+    def image_for(self, name):
+        """Return the product image path for a menu entry name, or None."""
+        return self.images.get(name.lower())
+
+    def lookup_label(self, label):
+        """Return the MenuItem for a display label, or None.
+
+        Also accepts labels from older logs, where the menu path was written
+        twice (e.g. "KITCHEN > PIZZA > KITCHEN > PIZZA > MEAT").
+        """
+        item = self.by_label.get(label)
+        if item is None:
+            parts = label.split(" > ")
+            half = (len(parts) - 1) // 2
+            if half and parts[:half] == parts[half:2 * half]:
+                item = self.by_label.get(" > ".join(parts[half:]))
+        return item
+
+
+def diff_menu_indexes(old, new):
+    """Compare two MenuIndexes and return a MenuDiff."""
+    added = [path for path in new.items if path not in old.items]
+    removed = [path for path in old.items if path not in new.items]
+    changed = [path for path, item in new.items.items() if path in old.items and old.items[path] != item]
+    changed_levels = {
+        path for path in set(old.children) | set(new.children)
+        if old.children.get(path) != new.children.get(path)
+    }
+    return MenuDiff(added, removed, changed, changed_levels)
@@ -0,0 +1,195 @@
+import os
+import pickle
+import hashlib
+import logging
+import threading
+import configparser
+from menu_compiler import compile_menu, save_compiled_menu
+
+
+def load_menu_config(config_file='settings.cfg'):
+    """Load menu refresh settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'menu_file': config.get('Menu', 'file', fallback='bar_menu.csv'),
+        'drive_name': config.get('Menu', 'drive_name', fallback='bar_menu.csv'),
+        'refresh_interval': config.getint('Menu', 'refresh_interval', fallback=300),
+        'cache_dir': config.get('Menu', 'cache_dir', fallback='menu_cache'),
+        'reprice_open_orders': config.get('Menu', 'reprice_open_orders', fallback='keep')
+    }
+
+
+def file_md5(path):
+    """Return the hex md5 of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.md5()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cached_credentials(token_file='token.pickle'):
+    """Return stored Drive credentials, refreshing them if expired.
+
+    Never starts the interactive OAuth flow; that has to be done once at the
+    till (python google_drive_utils.py) before background refreshes can run.
+    """
+    if not os.path.exists(token_file):
+        return None
+    with open(token_file, 'rb') as token:
+        creds = pickle.load(token)
+    if creds and not creds.valid and creds.expired and creds.refresh_token:
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        with open(token_file, 'wb') as token:
+            pickle.dump(creds, token)
+    return creds if creds and creds.valid else None
+
+
+class MenuRefresher:
+    """Fetches a newer menu from Google Drive without touching the Tk thread.
+
+    The Drive file's md5Checksum is compared against the local copy so an
+    unchanged menu is never downloaded. A changed one is streamed to a temp
+    file, validated, compiled and indexed in the background, and only then renamed over
+    the local menu; the UI receives the finished (menu_data, MenuIndex) in a
+    single root.after() call. Any failure leaves the current menu in place.
+    """
+
+    def __init__(self, root, on_menu_ready, config=None, connectivity=None):
+        self.root = root
+        self.on_menu_ready = on_menu_ready
+        self.config = config or load_menu_config()
+        self.connectivity = connectivity
+        if connectivity:
+            # Check for a new menu as soon as Drive comes back
+            connectivity.subscribe(self.on_connectivity_change)
+        self.logger = logging.getLogger(__name__)
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start checking for menu updates in a background thread."""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run_refresh_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def on_connectivity_change(self, service, is_up):
+        if service == 'drive' and is_up:
+            self.request_refresh()
+
+    def request_refresh(self):
+        """Check Drive now instead of waiting for the next interval (safe from any thread)."""
+        self.wake_event.set()
+
+    def run_refresh_loop(self):
+        while not self.stop_event.is_set():
+            self.wake_event.wait(self.config['refresh_interval'])
+            self.wake_event.clear()
+            if self.stop_event.is_set():
+                break
+            try:
+                self.refresh_once()
+            except Exception as e:
+                self.logger.error(f"Error refreshing menu: {e}")
+
+    def drive_md5_file(self):
+        return os.path.join(self.config['cache_dir'], 'drive.md5')
+
+    def last_drive_md5(self):
+        """The md5 of the Drive menu last installed here.
+
+        Compared instead of the local file's md5, so a menu published from
+        MenuEditor since then is not overwritten by the older Drive copy.
+        """
+        try:
+            with open(self.drive_md5_file(), 'r') as file:
+                return file.read().strip()
+        except OSError:
+            return file_md5(self.config['menu_file'])
+
+    def save_drive_md5(self, md5):
+        if not md5:
+            return
+        if not os.path.exists(self.config['cache_dir']):
+            os.makedirs(self.config['cache_dir'])
+        with open(self.drive_md5_file(), 'w') as file:
+            file.write(md5)
+
+    def refresh_once(self):
+        """Download, parse and hand over the Drive menu if it changed. Returns True if it did."""
+        if self.connectivity and not self.connectivity.is_up('drive'):
+            self.logger.debug("Drive unreachable; skipping menu refresh")
+            return False
+
+        creds = load_cached_credentials()
+        if not creds:
+            self.logger.info("No stored Drive credentials; skipping menu refresh")
+            return False
+
+        from googleapiclient.discovery import build
+        from googleapiclient.http import MediaIoBaseDownload
+
+        try:
+            service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            results = service.files().list(
+                q=f"name='{self.config['drive_name']}' and trashed=false",
+                spaces='drive',
+                fields='files(id, name, modifiedTime, md5Checksum)'
+            ).execute()
+        except OSError:
+            if self.connectivity:
+                self.connectivity.report_failure('drive')
+            raise
+        files = results.get('files', [])
+        if not files:
+            self.logger.info("No menu file found in Google Drive")
+            return False
+
+        latest_file = max(files, key=lambda f: f['modifiedTime'])
+        menu_file = self.config['menu_file']
+        if latest_file.get('md5Checksum') == self.last_drive_md5():
+            self.logger.debug("Menu is up to date")
+            return False
+
+        self.logger.info(f"Downloading menu modified {latest_file['modifiedTime']}")
+        # Keep the extension, which tells compile_menu the format
+        temp_path = menu_file + '.download' + os.path.splitext(menu_file)[1]
+        try:
+            with open(temp_path, 'wb') as temp_file:
+                downloader = MediaIoBaseDownload(temp_file, service.files().get_media(fileId=latest_file['id']))
+                done = False
+                while not done:
+                    _, done = downloader.next_chunk()
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+
+            if latest_file.get('md5Checksum') not in (None, file_md5(temp_path)):
+                raise ValueError("Downloaded menu does not match its Drive checksum")
+
+            # Validate before replacing, so a broken upload never reaches the till
+            menu_data, problems = compile_menu(temp_path)
+            for problem in problems:
+                self.logger.warning(f"Downloaded menu: {problem}")
+
+            os.replace(temp_path, menu_file)
+            self.save_drive_md5(latest_file.get('md5Checksum'))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        # The menu was just compiled; store it as the artifact instead of parsing it again
+        menu = save_compiled_menu(menu_file, menu_data, problems, self.config['cache_dir'])
+        menu_index = menu.index
+        self.root.after(0, lambda: self.on_menu_ready(menu_data, menu_index))
+        self.logger.info(f"Menu updated ({len(menu_index)} items)")
+        return True
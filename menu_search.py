@@ -0,0 +1,76 @@
+import re
+from types import MappingProxyType
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def words_in(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class MenuSearch:
+    """Type-ahead search over a MenuIndex.
+
+    Every word of an item's category, description and size is indexed under
+    each of its prefixes, so "bru pin" finds BRUCE JACK PINOTAGE with two set
+    lookups and an intersection. Terms that start no word fall back to a
+    trigram index, which matches them anywhere inside a word.
+    """
+
+    def __init__(self, menu_index):
+        prefixes = {}
+        grams = {}
+        self.items = sorted(menu_index.items.values(), key=lambda item: item.label)
+
+        for position, item in enumerate(self.items):
+            for word in set(words_in(" ".join(item.path))):
+                for end in range(1, len(word) + 1):
+                    prefixes.setdefault(word[:end], set()).add(position)
+                for gram in trigrams(word):
+                    grams.setdefault(gram, set()).add(position)
+
+        self.prefixes = MappingProxyType({key: frozenset(value) for key, value in prefixes.items()})
+        self.trigrams = MappingProxyType({key: frozenset(value) for key, value in grams.items()})
+        # Rank items whose description starts with the first term ahead of the rest
+        self.description_words = [words_in(item.description) for item in self.items]
+        self.texts = [" ".join(words_in(" ".join(item.path))) for item in self.items]
+
+    def search(self, query, limit=15):
+        """Return up to limit MenuItems matching every term in query."""
+        terms = words_in(query)
+        if not terms:
+            return []
+
+        matches = None
+        for term in sorted(terms, key=len, reverse=True):
+            positions = self.match_term(term)
+            matches = positions if matches is None else matches & positions
+            if not matches:
+                return []
+
+        first = terms[0]
+        ranked = sorted(
+            matches,
+            key=lambda position: (not any(word.startswith(first) for word in self.description_words[position]), position)
+        )
+        return [self.items[position] for position in ranked[:limit]]
+
+    def match_term(self, term):
+        positions = self.prefixes.get(term)
+        if positions is not None:
+            return positions
+        if len(term) < 3:
+            return frozenset()
+        # Substring match: every trigram of the term has to occur in the item
+        result = None
+        for gram in trigrams(term):
+            positions = self.trigrams.get(gram, frozenset())
+            result = positions if result is None else result & positions
+            if not result:
+                return frozenset()
+        # Trigrams can come from different places in the item; confirm the substring
+        return frozenset(position for position in result if term in self.texts[position])
@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+
+class Money(int):
+    """An amount in Rand stored as a whole number of cents.
+
+    Money is an int subclass so it can be written straight into SQLite
+    INTEGER columns and compared with plain ints, while str() renders the
+    familiar two-decimal form used on the till, e.g. f"R{amount}" -> "R90.00".
+    """
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, value):
+        """Parse a Rand amount such as "R90.00", "25", "-12.5" or Decimal('35').
+
+        Strings are parsed without going through float, rounding half up at
+        the third decimal place. Money instances are returned unchanged. A
+        bare int is refused: Money(int) is cents, so use Money(cents) or
+        Money.from_rands() to say which unit it is in.
+        """
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, int):
+            raise TypeError(f"Ambiguous amount {value!r}: use Money(cents) or Money.from_rands(rands)")
+        if isinstance(value, (float, Decimal)):
+            value = format(Decimal(str(value)), 'f')
+
+        text = str(value).strip().replace(',', '')
+        if text.startswith('R'):
+            text = text[1:].strip()
+        negative = text.startswith('-')
+        if text[:1] in ('+', '-'):
+            text = text[1:]
+        whole, _, fraction = text.partition('.')
+        if not (whole + fraction).isdigit():
+            raise ValueError(f"Invalid amount: {value!r}")
+
+        fraction = (fraction + '000')[:3]
+        cents = int(whole or '0') * 100 + int(fraction[:2])
+        if fraction[2] >= '5':
+            cents += 1
+        return cls(-cents if negative else cents)
+
+    @classmethod
+    def from_rands(cls, value):
+        """Money for an amount in Rand, e.g. a menu price of 35 or "12.50"."""
+        if isinstance(value, int) and not isinstance(value, Money):
+            return cls(value * 100)
+        return cls.parse(value)
+
+    def percent(self, rate):
+        """Return rate percent of this amount, rounded half up to the cent."""
+        # Discount rates are stored with two decimals, so work in hundredths
+        # of a percent to stay in integer arithmetic.
+        hundredths = int(Money.from_rands(rate))
+        product = abs(int(self)) * hundredths
+        cents = (product + 5000) // 10000
+        return Money(-cents if self < 0 else cents)
+
+    def to_decimal(self):
+        """Return the amount in Rand as a Decimal, for display or export."""
+        return Decimal(int(self)).scaleb(-2)
+
+    def __str__(self):
+        sign = '-' if self < 0 else ''
+        whole, cents = divmod(abs(int(self)), 100)
+        return f"{sign}{whole}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money({int(self)})"
+
+    def __format__(self, spec):
+        if spec and spec[-1] in 'eEfFgG%':
+            return format(self.to_decimal(), spec)
+        return format(str(self), spec)
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return Money(int(self) + int(other))
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, int):
+            return Money(int(self) - int(other))
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, int):
+            return Money(int(other) - int(self))
+        return NotImplemented
+
+    def __mul__(self, quantity):
+        if isinstance(quantity, int) and not isinstance(quantity, Money):
+            return Money(int(self) * quantity)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __abs__(self):
+        return Money(abs(int(self)))
@@ -0,0 +1,254 @@
+import os
+import pty
+import sys
+import time
+import tty
+import queue
+import fcntl
+import select
+import struct
+import logging
+import termios
+import threading
+import configparser
+from collections import namedtuple
+
+# One card read. read_at is time.monotonic() when the reader delivered it,
+# so the till can tell how long a tap took to reach the screen.
+TagEvent = namedtuple('TagEvent', ['tag', 'device', 'read_at'])
+
+# struct input_event from <linux/input.h>: timeval, type, code, value
+INPUT_EVENT = struct.Struct('llHHi')
+EV_KEY = 0x01
+KEY_PRESSED = 1
+# _IOW('E', 0x90, int): take the device away from X so reads are not typed into widgets
+EVIOCGRAB = 0x40044590
+
+KEY_ENTER = 28
+KEY_KPENTER = 96
+SHIFT_KEYS = {42, 54}
+# Key codes a keyboard-wedge reader sends for a tag ID
+KEY_CHARACTERS = {
+    2: '1', 3: '2', 4: '3', 5: '4', 6: '5', 7: '6', 8: '7', 9: '8', 10: '9', 11: '0', 12: '-',
+    16: 'q', 17: 'w', 18: 'e', 19: 'r', 20: 't', 21: 'y', 22: 'u', 23: 'i', 24: 'o', 25: 'p',
+    30: 'a', 31: 's', 32: 'd', 33: 'f', 34: 'g', 35: 'h', 36: 'j', 37: 'k', 38: 'l',
+    44: 'z', 45: 'x', 46: 'c', 47: 'v', 48: 'b', 49: 'n', 50: 'm',
+    71: '7', 72: '8', 73: '9', 75: '4', 76: '5', 77: '6', 79: '1', 80: '2', 81: '3', 82: '0'
+}
+
+# Serial readers end a tag with CR/LF, or frame it in STX ... ETX
+SERIAL_START = b'\x02'
+SERIAL_TERMINATORS = b'\r\n\x03'
+
+
+def load_nfc_config(config_file='settings.cfg'):
+    """Load card reader settings, falling back to keyboard entry only."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        # Blank: no reader device; card IDs are typed (or wedged) into the entry box
+        'device': config.get('NFC', 'device', fallback=''),
+        # auto: evdev for /dev/input/..., serial for anything else
+        'type': config.get('NFC', 'type', fallback='auto'),
+        'baudrate': config.getint('NFC', 'baudrate', fallback=9600),
+        'debounce': config.getfloat('NFC', 'debounce', fallback=1.5),
+        'grab': config.getboolean('NFC', 'grab', fallback=True),
+        'retry_interval': config.getfloat('NFC', 'retry_interval', fallback=2.0)
+    }
+
+
+def device_type(config):
+    if config['type'] != 'auto':
+        return config['type']
+    return 'evdev' if config['device'].startswith('/dev/input/') else 'serial'
+
+
+class TagReader:
+    """Reads card taps straight from the reader device on a background thread.
+
+    A keyboard-wedge reader is opened as an evdev device and grabbed, so its
+    keystrokes never go through Tk focus handling; serial readers are read
+    as a raw tty. A card lying on the reader repeats its ID, so a tag read
+    again within debounce seconds of its last read is dropped. Taps go on
+    the events queue and notify() is called after each one; the till passes
+    a function that schedules the queue to be drained on the Tk thread.
+    If the device disappears it is reopened every retry_interval seconds.
+    """
+
+    def __init__(self, config=None, notify=None):
+        self.config = config or load_nfc_config()
+        self.device = self.config['device']
+        self.type = device_type(self.config)
+        self.notify = notify
+        self.events = queue.Queue()
+        self.last_read = {}
+        self.logger = logging.getLogger(__name__)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run_reader_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    def run_reader_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                fd = self.open_device()
+            except OSError as e:
+                self.logger.warning(f"Card reader {self.device} unavailable: {e}")
+                self.stop_event.wait(self.config['retry_interval'])
+                continue
+            self.logger.info(f"Reading cards from {self.device} ({self.type})")
+            try:
+                self.read_tags(fd)
+            except OSError as e:
+                self.logger.warning(f"Card reader {self.device} disconnected: {e}")
+            finally:
+                os.close(fd)
+
+    def open_device(self):
+        fd = os.open(self.device, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            if self.type == 'evdev':
+                if self.config['grab']:
+                    fcntl.ioctl(fd, EVIOCGRAB, 1)
+            else:
+                # TCSANOW: a tap already waiting in the tty must not be flushed
+                tty.setraw(fd, termios.TCSANOW)
+                attributes = termios.tcgetattr(fd)
+                speed = getattr(termios, f"B{self.config['baudrate']}")
+                attributes[4] = attributes[5] = speed
+                termios.tcsetattr(fd, termios.TCSANOW, attributes)
+        except (OSError, AttributeError, termios.error) as e:
+            os.close(fd)
+            raise OSError(f"cannot set up {self.type} device: {e}")
+        return fd
+
+    def read_tags(self, fd):
+        """Read from fd until stopped, delivering each complete tag."""
+        chunk_size = INPUT_EVENT.size * 64 if self.type == 'evdev' else 256
+        parse = self.parse_key_events if self.type == 'evdev' else self.parse_serial
+        pending = bytearray()
+        state = {'tag': [], 'shift': False}
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select([fd], [], [], 0.5)
+            if not readable:
+                continue
+            data = os.read(fd, chunk_size)
+            if not data:
+                raise OSError("end of file")
+            pending.extend(data)
+            for tag in parse(pending, state):
+                self.deliver(tag)
+
+    def parse_key_events(self, pending, state):
+        """Turn whole input_events in pending into tags; a tag ends with Enter."""
+        tags = []
+        whole = len(pending) - len(pending) % INPUT_EVENT.size
+        for _, _, event_type, code, value in INPUT_EVENT.iter_unpack(bytes(pending[:whole])):
+            if event_type != EV_KEY:
+                continue
+            if code in SHIFT_KEYS:
+                state['shift'] = value != 0
+            elif value != KEY_PRESSED:
+                continue
+            elif code in (KEY_ENTER, KEY_KPENTER):
+                if state['tag']:
+                    tags.append(''.join(state['tag']))
+                state['tag'] = []
+            elif code in KEY_CHARACTERS:
+                character = KEY_CHARACTERS[code]
+                state['tag'].append(character.upper() if state['shift'] else character)
+        del pending[:whole]
+        return tags
+
+    def parse_serial(self, pending, state):
+        """Split complete lines (or STX/ETX frames) off pending."""
+        tags = []
+        start = 0
+        for position, byte in enumerate(pending):
+            if byte in SERIAL_TERMINATORS:
+                tag = bytes(pending[start:position]).replace(SERIAL_START, b'').decode('ascii', 'replace').strip()
+                if tag:
+                    tags.append(tag)
+                start = position + 1
+        del pending[:start]
+        return tags
+
+    def deliver(self, tag):
+        now = time.monotonic()
+        last = self.last_read.get(tag)
+        self.last_read[tag] = now
+        if last is not None and now - last < self.config['debounce']:
+            return
+        self.events.put(TagEvent(tag, self.device, now))
+        if self.notify is not None:
+            self.notify()
+
+    def get_events(self):
+        """Return the taps waiting on the queue, oldest first."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class PtyCardReader:
+    """Stand-in serial card reader on a pseudo-terminal.
+
+    Point a TagReader (or [NFC] device) at path and call tap() to send a
+    card ID the way a serial reader does.
+    """
+
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+
+    def tap(self, tag, terminator='\r\n'):
+        os.write(self.master, (tag + terminator).encode('ascii'))
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def main():
+    """Print taps from the configured reader, or with --simulate tap IDs typed here into a pty reader."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if '--simulate' in sys.argv[1:]:
+        reader = PtyCardReader()
+        print(f"Simulated reader on {reader.path}; set [NFC] device to it. Type a card ID and Enter to tap it.")
+        try:
+            for line in sys.stdin:
+                if line.strip():
+                    reader.tap(line.strip())
+        finally:
+            reader.close()
+        return
+
+    config = load_nfc_config()
+    if len(sys.argv) > 1:
+        config['device'] = sys.argv[1]
+    if not config['device']:
+        print("No card reader configured; set [NFC] device or pass a device path")
+        return
+    reader = TagReader(config)
+    reader.start()
+    try:
+        while True:
+            event = reader.events.get()
+            print(f"{event.tag} from {event.device}")
+    except KeyboardInterrupt:
+        reader.stop()
+
+
+if __name__ == "__main__":
+    main()
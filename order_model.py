@@ -0,0 +1,125 @@
+import re
+from money import Money
+
+# Item line as written to the transaction log. The quantity is only written
+# when above one, so single items keep the original "- name - R25" format.
+ORDER_LINE_PATTERN = re.compile(r'^(?P<name>.+?)(?: x(?P<quantity>\d+))? - (?P<total>R?-?[\d.,]+)$')
+
+
+def format_order_line(label, quantity, total):
+    """Format one order line the way it is logged and stored with the ledger."""
+    if quantity == 1:
+        return f"{label} - R{total}"
+    return f"{label} x{quantity} - R{total}"
+
+
+def parse_order_line(text):
+    """Parse "name [xN] - Rtotal" into (name, quantity, total), or None."""
+    match = ORDER_LINE_PATTERN.match(text.strip())
+    if not match:
+        return None
+    quantity = int(match.group('quantity') or 1)
+    return match.group('name').strip(), quantity, Money.parse(match.group('total'))
+
+
+class OrderLine:
+    __slots__ = ('item', 'quantity')
+
+    def __init__(self, item, quantity=0):
+        self.item = item
+        self.quantity = quantity
+
+    @property
+    def total(self):
+        return self.item.price * self.quantity
+
+    def __str__(self):
+        return format_order_line(self.item.label, self.quantity, self.total)
+
+
+class Order:
+    """The order being rung up: one line per menu item with a quantity.
+
+    This is the source of truth for the till; the order Treeview only
+    renders it, and the transaction log, the ledger order summary and the
+    sync items are all produced from it.
+    """
+
+    def __init__(self):
+        self.lines = {}
+        # Labels in the order units were added, for undo
+        self.history = []
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    def get(self, label):
+        return self.lines.get(label)
+
+    def add(self, item, quantity=1):
+        """Add quantity units of a MenuItem and return its line."""
+        line = self.lines.get(item.label)
+        if line is None:
+            line = self.lines[item.label] = OrderLine(item)
+        line.quantity += quantity
+        self.history.extend([item.label] * quantity)
+        return line
+
+    def remove(self, label, quantity=1):
+        """Take quantity units off a line; returns the line, or None once it is gone."""
+        line = self.lines.get(label)
+        if line is None:
+            return None
+        line.quantity -= quantity
+        for _ in range(quantity):
+            # Drop the most recent history entries for this label
+            for position in range(len(self.history) - 1, -1, -1):
+                if self.history[position] == label:
+                    del self.history[position]
+                    break
+        if line.quantity <= 0:
+            del self.lines[label]
+            return None
+        return line
+
+    def undo_last(self):
+        """Remove the most recently added unit and return its label, or None."""
+        if not self.history:
+            return None
+        label = self.history[-1]
+        self.remove(label)
+        return label
+
+    def reprice(self, menu_index):
+        """Move open lines onto menu_index's items. Returns (label, old price, new price) for each price change.
+
+        Lines for items that are no longer on the menu keep their item and price.
+        """
+        changes = []
+        for label, line in self.lines.items():
+            item = menu_index.by_label.get(label)
+            if item is None:
+                continue
+            if item.price != line.item.price:
+                changes.append((label, line.item.price, item.price))
+            line.item = item
+        return changes
+
+    def clear(self):
+        self.lines = {}
+        self.history = []
+
+    @property
+    def total(self):
+        return sum((line.total for line in self.lines.values()), Money(0))
+
+    @property
+    def item_count(self):
+        return sum(line.quantity for line in self.lines.values())
+
+    def summary(self):
+        """Order lines as text, one per line, for the ledger."""
+        return "\n".join(str(line) for line in self.lines.values())
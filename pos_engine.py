@@ -0,0 +1,285 @@
+from datetime import datetime
+from collections import namedtuple
+from money import Money
+from tabs import TabManager, WALK_IN
+from promotions import AppliedPromotion, NO_PROMOTIONS
+from wallet_service import WalletOutcomeUnknown
+
+# A card holder's price for the current order, shown before the card is charged.
+# discount is the promotions plus the member's discount.
+WyvernQuote = namedtuple('WyvernQuote', ['card_id', 'user', 'total', 'discount', 'amount_due', 'promotions'])
+
+# A completed sale. order is the Order as it was paid; the engine has
+# already moved on to the next one. discount includes promotions, which
+# lists the AppliedPromotions.
+Receipt = namedtuple('Receipt', [
+    'method', 'total', 'discount', 'amount_received', 'change', 'card_id', 'user', 'tab', 'order', 'timestamp',
+    'promotions'
+])
+
+
+class PaymentError(ValueError):
+    pass
+
+
+class PosEngine:
+    """Order taking, pricing and payment for one till, with no UI.
+
+    DrinksOrderingSystem drives it from Tk, but it only needs a MenuIndex
+    and a UserManagement, so scripts and benchmarks can ring up and pay
+    for orders directly. Orders and payment progress go through a
+    TabManager (journaled); completed sales go to the transaction logger
+    and the quick-keys ranking when those are given. With a PromotionIndex,
+    promotions come off every order before any member discount.
+    """
+
+    def __init__(self, menu_index, user_management, tabs=None, transaction_logger=None, sales_ranker=None,
+                 promotions=None):
+        self.menu_index = menu_index
+        self.user_management = user_management
+        self.tabs = tabs or TabManager()
+        self.transaction_logger = transaction_logger
+        self.sales_ranker = sales_ranker
+        self.promotions = promotions
+
+    @property
+    def order(self):
+        return self.tabs.order
+
+    @property
+    def total(self):
+        return self.tabs.order.total
+
+    def set_menu(self, menu_index):
+        self.menu_index = menu_index
+
+    def set_promotions(self, promotions):
+        self.promotions = promotions
+
+    def price_promotions(self, now=None):
+        """Promotions that apply to the current order now, as a PromotionResult."""
+        if not self.promotions or not self.order:
+            return NO_PROMOTIONS
+        return self.promotions.apply(self.order, now)
+
+    def amount_due(self, now=None):
+        """The current order's total after promotions."""
+        return self.total - self.price_promotions(now).discount
+
+    def add(self, item, quantity=1):
+        """Add a MenuItem, or an item by its label, to the current order and return its line."""
+        if isinstance(item, str):
+            label = item
+            item = self.menu_index.lookup_label(label)
+            if item is None:
+                raise ValueError(f"Not on the menu: {label}")
+        return self.tabs.add(item, quantity)
+
+    def remove(self, label, quantity=1):
+        return self.tabs.remove(label, quantity)
+
+    def undo_last(self):
+        return self.tabs.undo_last()
+
+    def start_payment(self, method):
+        if not self.order:
+            raise PaymentError("Your order is empty")
+        self.tabs.set_payment('started', method=method)
+
+    def cancel_payment(self):
+        self.tabs.set_payment('cancelled')
+
+    def quote_wyvern(self, card_id):
+        """Look up a Wyvern card and price the current order for it."""
+        card_id = card_id.strip()
+        if not card_id:
+            raise PaymentError("Please enter a card ID")
+        if not self.order:
+            raise PaymentError("Your order is empty")
+
+        user = self.user_management.get_user_by_rfid(card_id)
+        if not user:
+            raise PaymentError("Card not registered")
+
+        total = self.total
+        promotions = self.price_promotions()
+        # The member's discount applies to the promotional price
+        discount = promotions.discount + (total - promotions.discount).percent(user['discount_rate'])
+        amount_due = total - discount
+        if user['balance'] < amount_due:
+            raise PaymentError(f"Insufficient balance. Current balance: R{user['balance']}")
+        return WyvernQuote(card_id, user, total, discount, amount_due, promotions.applied)
+
+    def pay_wyvern(self, card_id, quote=None):
+        """Debit a Wyvern card for the current order and complete the sale."""
+        quote = quote or self.quote_wyvern(card_id)
+        user = quote.user
+
+        # Journal the debit before and after, so a crash in between is flagged on restart
+        self.tabs.set_payment('charging', method='wyvern', card_id=quote.card_id, amount=int(quote.amount_due))
+        description = (
+            f"Purchase at drinks ordering system\n"
+            f"Original Amount: R{quote.total}\n"
+            f"Discount Rate: {user['discount_rate']}%\n"
+            f"Discount Amount: R{quote.discount}\n"
+            f"Amount After Discount: R{quote.amount_due}"
+        )
+        # The ledger keeps which promotions the discount includes
+        for promotion in quote.promotions:
+            description += f"\nPromotion: {promotion.name} ({promotion.label}): -R{promotion.discount}"
+        try:
+            success, message = self.user_management.update_balance(
+                int(user['id']),  # Ensure ID is integer
+                -quote.amount_due,
+                "purchase",
+                description,
+                quote.card_id,  # Pass the card ID
+                self.order.summary()  # Pass the order summary
+            )
+        except WalletOutcomeUnknown as e:
+            # The debit may have been made, so the 'charging' record stays
+            # and the card must be checked before it is charged again
+            raise PaymentError(
+                f"{e}. Check card {quote.card_id}'s transaction history before charging it again."
+            ) from e
+        except Exception:
+            self.tabs.set_payment('cancelled')
+            raise
+        if not success:
+            self.tabs.set_payment('cancelled')
+            raise PaymentError(message)
+        self.tabs.set_payment(
+            'charged', method='wyvern', card_id=quote.card_id, discount=int(quote.discount),
+            promotions=[[promotion.name, promotion.label, int(promotion.discount)] for promotion in quote.promotions]
+        )
+
+        return self.complete(
+            'wyvern', card_id=quote.card_id, discount=quote.discount, user=user, promotions=quote.promotions
+        )
+
+    def pay_cash(self, amount_received, now=None):
+        amount_received = Money.from_rands(amount_received)
+        if not self.order:
+            raise PaymentError("Your order is empty")
+        promotions = self.price_promotions(now)
+        if amount_received < self.total - promotions.discount:
+            raise PaymentError("Amount received is less than total amount")
+        return self.complete(
+            'cash', amount_received=amount_received, discount=promotions.discount or None,
+            promotions=promotions.applied, now=now
+        )
+
+    def pay_card(self, now=None):
+        if not self.order:
+            raise PaymentError("Your order is empty")
+        promotions = self.price_promotions(now)
+        return self.complete('card', discount=promotions.discount or None, promotions=promotions.applied, now=now)
+
+    def complete(self, method, card_id=None, discount=None, amount_received=None, user=None, now=None,
+                 promotions=()):
+        """Log the current order as paid, close it and return its Receipt."""
+        order = self.order
+        total = order.total
+        amount_due = total - (discount or 0)
+        receipt = Receipt(
+            method=method,
+            total=total,
+            discount=discount,
+            amount_received=amount_received,
+            change=amount_received - amount_due if amount_received is not None else None,
+            card_id=card_id,
+            user=user,
+            tab=self.tabs.current,
+            order=order,
+            timestamp=now or datetime.now(),
+            promotions=tuple(promotions)
+        )
+        # A debited card's 'charged' record is the only trace of the sale
+        # until the log entry is on disk, so it is kept until then
+        if not self.log_sale(receipt, durable=method == 'wyvern'):
+            raise PaymentError(
+                "The card was charged but the sale could not be written to the transaction log. "
+                "Restart the till to log it; do not charge the card again."
+            )
+        self.tabs.settle()
+        return receipt
+
+    def log_sale(self, receipt, durable=False):
+        """Log a receipt and count it in the sales ranking.
+
+        The entry is handed to the writer thread, and with durable this waits
+        until it is on disk. Returns False if a durable entry did not get there.
+        """
+        logged = True
+        if self.transaction_logger is not None:
+            payment_method = receipt.method
+            # Format payment method to include card ID if it's a Wyvern card
+            if payment_method == "wyvern" and receipt.card_id:
+                payment_method = f"wyvern_card_{receipt.card_id}"
+
+            log_entry = [
+                f"Timestamp: {receipt.timestamp.strftime('%Y-%m-%d %H:%M:%S')}",
+                f"Payment Method: {payment_method}",
+                f"Total Amount: R{receipt.total}"
+            ]
+            if receipt.tab != WALK_IN:
+                log_entry.append(f"Tab: {receipt.tab}")
+
+            # Add discount if applicable
+            if receipt.discount:
+                log_entry.append(f"Discount Amount: R{receipt.discount}")
+                log_entry.append(f"Amount After Discount: R{receipt.total - receipt.discount}")
+            for promotion in receipt.promotions:
+                log_entry.append(f"Promotion: {promotion.name} ({promotion.label}): -R{promotion.discount}")
+
+            # Add items with full menu path
+            log_entry.append("\nItems:")
+            for line in receipt.order:
+                log_entry.append(f"- {line}")
+
+            # Hand off to the writer thread; only card payments wait for the disk
+            if durable:
+                logged = self.transaction_logger.log_durably(receipt.timestamp.strftime("%Y-%m-%d"), "\n".join(log_entry))
+            else:
+                self.transaction_logger.log(receipt.timestamp.strftime("%Y-%m-%d"), "\n".join(log_entry))
+
+        if self.sales_ranker is not None:
+            for line in receipt.order:
+                self.sales_ranker.record(line.item.label, receipt.timestamp, line.quantity)
+        return logged
+
+    def recover_payments(self):
+        """Finish Wyvern payments a crash interrupted. Returns messages for the bartender."""
+        showing = self.tabs.current
+        messages = []
+        for name, payment in list(self.tabs.payments.items()):
+            order_name = f"tab '{name}'" if name != WALK_IN else "the walk-in order"
+            if payment['stage'] == 'charged':
+                # The card was debited but the sale was never logged; log it and close the order
+                self.tabs.switch(name)
+                try:
+                    self.complete(
+                        payment['method'],
+                        card_id=payment.get('card_id'),
+                        discount=Money(payment['discount']) if payment.get('discount') else None,
+                        promotions=[
+                            AppliedPromotion(name, label, Money(discount))
+                            for name, label, discount in payment.get('promotions', ())
+                        ]
+                    )
+                except PaymentError as e:
+                    messages.append(f"Could not complete the Wyvern payment for {order_name}: {e}")
+                    continue
+                if name == showing:
+                    showing = WALK_IN
+                messages.append(f"Completed the Wyvern payment for {order_name} that was interrupted")
+            elif payment['stage'] == 'charging':
+                self.tabs.switch(name)
+                self.tabs.set_payment('cancelled')
+                messages.append(
+                    f"A Wyvern payment of R{Money(payment['amount'])} for {order_name} was interrupted. "
+                    f"Check card {payment['card_id']}'s transaction history before charging it again."
+                )
+        if showing in self.tabs.orders:
+            self.tabs.switch(showing)
+        return messages
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import configparser
+from datetime import datetime, date, timedelta
+from collections import namedtuple
+from money import Money
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# One rule from the promotions file. match holds menu path prefixes (() is
+# the whole menu); start/end are minutes past midnight, None for all day.
+Promotion = namedtuple('Promotion', [
+    'name', 'kind', 'match', 'value', 'quantity', 'days', 'start', 'end', 'valid_from', 'valid_until'
+])
+
+# A promotion as applied to an order: label is the order line, or the lines
+# a bundle was made from
+AppliedPromotion = namedtuple('AppliedPromotion', ['name', 'label', 'discount'])
+
+# Everything taken off an order by promotions
+PromotionResult = namedtuple('PromotionResult', ['discount', 'applied'])
+
+NO_PROMOTIONS = PromotionResult(Money(0), ())
+
+KINDS = ('percent', 'amount', 'price', 'bundle')
+
+
+class PromotionError(ValueError):
+    pass
+
+
+def load_promotions_config(config_file='settings.cfg'):
+    """Load promotion settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'enabled': config.getboolean('Promotions', 'enabled', fallback=True),
+        'file': config.get('Promotions', 'file', fallback='promotions.json')
+    }
+
+
+def parse_time(text):
+    """Minutes past midnight for "HH:MM"."""
+    hours, _, minutes = str(text).partition(':')
+    value = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= value <= 24 * 60:
+        raise ValueError(f"Invalid time: {text}")
+    return value
+
+
+def parse_promotion(entry):
+    """Build a Promotion from one entry of the promotions file.
+
+    e.g. {"name": "Happy hour", "kind": "percent", "value": 20, "match": ["BEER"],
+          "days": ["fri", "sat"], "start": "17:00", "end": "19:00"}
+    """
+    name = entry.get('name') or 'Promotion'
+    try:
+        kind = entry['kind']
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        if kind == 'percent':
+            value = Money.from_rands(entry['value'])
+            if not 0 < value <= Money.from_rands(100):
+                raise ValueError("percent must be between 0 and 100")
+        else:
+            value = Money.from_rands(entry['value'])
+        quantity = int(entry.get('quantity', 1))
+        if kind == 'bundle' and quantity < 2:
+            raise ValueError("a bundle needs a quantity of at least 2")
+        match = entry.get('match') or ['*']
+        if isinstance(match, str):
+            match = [match]
+        match = tuple(() if prefix == '*' else tuple(part.strip() for part in prefix.split(' > ')) for prefix in match)
+        days = frozenset(DAYS.index(day.strip().lower()[:3]) for day in entry.get('days', ()))
+        start = parse_time(entry['start']) if entry.get('start') else None
+        end = parse_time(entry['end']) if entry.get('end') else None
+        if (start is None) != (end is None):
+            raise ValueError("start and end go together")
+        valid_from = date.fromisoformat(entry['from']) if entry.get('from') else None
+        valid_until = date.fromisoformat(entry['until']) if entry.get('until') else None
+    except (KeyError, ValueError) as e:
+        raise PromotionError(f"Promotion '{name}': {e}")
+    return Promotion(name, kind, match, value, quantity, days, start, end, valid_from, valid_until)
+
+
+def is_active(promotion, now):
+    """Whether a promotion applies at datetime now."""
+    minute = now.hour * 60 + now.minute
+    day = now.date()
+    if promotion.start is not None:
+        if promotion.start < promotion.end:
+            if not promotion.start <= minute < promotion.end:
+                return False
+        elif minute < promotion.end:
+            # Early hours of a window that runs past midnight belong to the day it started
+            day -= timedelta(days=1)
+        elif minute < promotion.start:
+            return False
+    if promotion.days and day.weekday() not in promotion.days:
+        return False
+    if promotion.valid_from and day < promotion.valid_from:
+        return False
+    if promotion.valid_until and day > promotion.valid_until:
+        return False
+    return True
+
+
+def line_discount(promotion, line):
+    """Amount a percent, amount or price promotion takes off one order line."""
+    price = line.item.price
+    if promotion.kind == 'percent':
+        discount = line.total.percent(promotion.value.to_decimal())
+    elif promotion.kind == 'amount':
+        discount = min(promotion.value, price) * line.quantity
+    else:
+        discount = max(price - promotion.value, 0) * line.quantity
+    return Money(discount)
+
+
+def beats(promotion, other):
+    """Whether promotion always takes off more than other, a rule of the same kind."""
+    if promotion.kind in ('price', 'bundle'):
+        return promotion.value < other.value
+    return promotion.value > other.value
+
+
+class PromotionIndex:
+    """Promotions compiled for fast checkout.
+
+    Rules are indexed by menu path prefix, so pricing an order looks up
+    each line's category, item and size paths and never scans the rule
+    list. The prefixes of the rules active at a given time are cached until
+    the next minute a rule starts or ends (or midnight), keeping only the
+    best rule of each kind per prefix (and per bundle size), so a big file
+    of rules costs nothing between those boundaries. Each line gets the single
+    best line promotion; lines without one can make up bundles, which are
+    filled with the dearest units first, in file order.
+    """
+
+    def __init__(self, promotions=()):
+        self.promotions = list(promotions)
+        self.position = {promotion: position for position, promotion in enumerate(self.promotions)}
+        boundaries = {0}
+        for promotion in self.promotions:
+            if promotion.start is not None:
+                boundaries.update((promotion.start % (24 * 60), promotion.end % (24 * 60)))
+        self.boundaries = sorted(boundaries)
+        self.active = {}
+        self.active_since = None
+        self.active_until = None
+
+    def __len__(self):
+        return len(self.promotions)
+
+    def active_at(self, now):
+        """Path prefix -> promotions active at now, in file order."""
+        if self.active_until is None or not self.active_since <= now < self.active_until:
+            best = {}
+            for promotion in self.promotions:
+                if is_active(promotion, now):
+                    # Bundles only compete with bundles of the same size over the same items
+                    kind = (promotion.kind, promotion.match, promotion.quantity) if promotion.kind == 'bundle' else promotion.kind
+                    for prefix in promotion.match:
+                        kinds = best.setdefault(prefix, {})
+                        if kind not in kinds or beats(promotion, kinds[kind]):
+                            kinds[kind] = promotion
+            active = {prefix: sorted(kinds.values(), key=self.position.get) for prefix, kinds in best.items()}
+            minute = now.hour * 60 + now.minute
+            position = bisect.bisect_right(self.boundaries, minute)
+            midnight = datetime(now.year, now.month, now.day, tzinfo=now.tzinfo)
+            if position < len(self.boundaries):
+                self.active_until = midnight + timedelta(minutes=self.boundaries[position])
+            else:
+                self.active_until = midnight + timedelta(days=1)
+            self.active_since = midnight + timedelta(minutes=self.boundaries[position - 1])
+            self.active = active
+        return self.active
+
+    def apply(self, order, now=None):
+        """Work out the promotions for an order at now. Returns a PromotionResult."""
+        active = self.active_at(now or datetime.now())
+        if not active:
+            return NO_PROMOTIONS
+        applied = []
+        bundle_lines = {}
+        for line in order:
+            path = line.item.path
+            best = None
+            best_discount = 0
+            for depth in range(len(path) + 1):
+                for promotion in active.get(path[:depth], ()):
+                    if promotion.kind == 'bundle':
+                        lines = bundle_lines.setdefault(promotion, [])
+                        # A rule matching both a category and an item in it still counts the line once
+                        if not lines or lines[-1] is not line:
+                            lines.append(line)
+                        continue
+                    discount = line_discount(promotion, line)
+                    if discount > best_discount:
+                        best, best_discount = promotion, discount
+            if best is not None:
+                applied.append(AppliedPromotion(best.name, line.item.label, best_discount))
+        if bundle_lines:
+            applied.extend(self.apply_bundles(bundle_lines, {promotion.label for promotion in applied}))
+        if not applied:
+            return NO_PROMOTIONS
+        discount = Money(min(sum(promotion.discount for promotion in applied), order.total))
+        return PromotionResult(discount, tuple(applied))
+
+    def apply_bundles(self, bundle_lines, discounted):
+        """Make bundles from lines that got no line promotion; each unit goes in one bundle at most."""
+        used = {}
+        applied = []
+        for promotion in sorted(bundle_lines, key=self.position.get):
+            lines = bundle_lines[promotion]
+            units = []
+            for line in sorted(lines, key=lambda line: -line.item.price):
+                if line.item.label in discounted:
+                    continue
+                free = line.quantity - used.get(line.item.label, 0)
+                units.extend([line] * free)
+            discount = 0
+            labels = []
+            for first in range(0, len(units) - promotion.quantity + 1, promotion.quantity):
+                bundle = units[first:first + promotion.quantity]
+                saving = sum(line.item.price for line in bundle) - promotion.value
+                if saving <= 0:
+                    # Units are dearest first, so no later bundle saves anything either
+                    break
+                discount += saving
+                for line in bundle:
+                    used[line.item.label] = used.get(line.item.label, 0) + 1
+                    if line.item.label not in labels:
+                        labels.append(line.item.label)
+            if discount > 0:
+                applied.append(AppliedPromotion(promotion.name, ", ".join(labels), Money(discount)))
+        return applied
+
+
+def load_promotions(path='promotions.json'):
+    """Compile the promotions file into a PromotionIndex; no file means no promotions."""
+    if not os.path.exists(path):
+        return PromotionIndex()
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            entries = json.load(file)
+        except ValueError as e:
+            raise PromotionError(f"{path}: {e}")
+    if isinstance(entries, dict):
+        entries = entries.get('promotions', [])
+    return PromotionIndex(parse_promotion(entry) for entry in entries)
+
+
+def benchmark(menu_index, rule_count, orders=2000, seed=1):
+    """Time PromotionIndex.apply with rule_count random rules against random orders from the menu."""
+    from order_model import Order
+    rng = random.Random(seed)
+    items = list(menu_index.items.values())
+    promotions = []
+    for number in range(rule_count):
+        item = rng.choice(items)
+        start = rng.randrange(0, 24 * 60, 30)
+        promotions.append(Promotion(
+            f"Rule {number}", rng.choice(KINDS), (item.path[:rng.randint(1, len(item.path))],),
+            Money(rng.randint(100, 2000)), rng.randint(2, 4), frozenset(rng.sample(range(7), rng.randint(1, 7))),
+            start, (start + rng.randrange(30, 600, 30)) % (24 * 60), None, None
+        ))
+    index = PromotionIndex(promotions)
+    sample_orders = []
+    for _ in range(orders):
+        order = Order()
+        for item in rng.sample(items, rng.randint(1, 8)):
+            order.add(item, rng.randint(1, 3))
+        sample_orders.append(order)
+
+    now = datetime.now()
+    started = time.perf_counter()
+    index.active_at(now)
+    compile_seconds = time.perf_counter() - started
+    timings = []
+    for order in sample_orders:
+        started = time.perf_counter()
+        index.apply(order, now)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return compile_seconds, timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def main():
+    """Check the promotions file and list what applies now, or benchmark with --benchmark."""
+    config = load_promotions_config()
+    if '--benchmark' in sys.argv[1:]:
+        from menu_compiler import load_compiled_menu
+        from menu_refresher import load_menu_config
+        menu_index = load_compiled_menu(load_menu_config()['menu_file']).index
+        print(f"{'rules':>8}{'active set ms':>16}{'p50 us':>10}{'p99 us':>10}")
+        for rule_count in (10, 1000, 10000, 100000):
+            compile_seconds, p50, p99 = benchmark(menu_index, rule_count)
+            print(f"{rule_count:>8}{compile_seconds * 1000:>16.2f}{p50 * 1e6:>10.1f}{p99 * 1e6:>10.1f}")
+        return
+
+    try:
+        index = load_promotions(config['file'])
+    except PromotionError as e:
+        print(f"Error in promotions: {e}")
+        sys.exit(1)
+    now = datetime.now()
+    active = {promotion.name for promotions in index.active_at(now).values() for promotion in promotions}
+    print(f"{len(index)} promotion(s) in {config['file']}")
+    for promotion in index.promotions:
+        print(f"  {'*' if promotion.name in active else ' '} {promotion.name} ({promotion.kind})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import math
+import heapq
+import configparser
+from datetime import datetime
+from order_model import parse_order_line
+
+
+def load_quick_keys_config(config_file='settings.cfg'):
+    """Load quick-key settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'count': config.getint('QuickKeys', 'count', fallback=8),
+        'half_life_minutes': config.getfloat('QuickKeys', 'half_life_minutes', fallback=90),
+        'seed_files': config.getint('QuickKeys', 'seed_files', fallback=7),
+        'directory': config.get('TransactionLog', 'directory', fallback='transactions')
+    }
+
+
+class SalesRanker:
+    """Ranks menu items by recent sales velocity with exponential time decay.
+
+    Rather than decaying every score as time passes, each sale adds
+    2 ** ((t - t0) / half_life), so newer sales weigh more and comparing the
+    stored sums gives the same order as comparing decayed scores. Sums are
+    kept as base-2 logarithms so they never overflow however long the till
+    runs. Recording a sale is one dict update and ranking never rescans
+    history.
+    """
+
+    def __init__(self, half_life_minutes=90):
+        self.half_life = half_life_minutes * 60
+        self.reference = None
+        self.scores = {}
+
+    def record(self, label, when=None, quantity=1):
+        """Count quantity sales of label at when (a datetime, default now)."""
+        timestamp = (when or datetime.now()).timestamp()
+        if self.reference is None:
+            self.reference = timestamp
+        value = (timestamp - self.reference) / self.half_life + math.log2(quantity)
+        current = self.scores.get(label)
+        if current is None:
+            self.scores[label] = value
+        else:
+            # log2(2 ** current + 2 ** value) without leaving log space
+            high, low = max(current, value), min(current, value)
+            self.scores[label] = high + math.log1p(math.pow(2.0, low - high)) / math.log(2.0)
+
+    def top(self, count, accept=None):
+        """Return the count best-selling labels, skipping any that accept() rejects."""
+        ranked = heapq.nlargest(count * 2, self.scores, key=self.scores.get)
+        if accept is not None:
+            ranked = [label for label in ranked if accept(label)]
+            if len(ranked) < count and len(self.scores) > len(ranked):
+                ranked = [label for label in sorted(self.scores, key=self.scores.get, reverse=True) if accept(label)]
+        return ranked[:count]
+
+    def seed_from_logs(self, directory='transactions', max_files=7, normalize=None):
+        """Replay item lines from the most recent daily transaction logs.
+
+        normalize maps a logged item name to the label to rank it under, or
+        None to skip it.
+        """
+        if not os.path.exists(directory):
+            return 0
+        log_files = sorted(
+            f for f in os.listdir(directory)
+            if f.startswith('transactions_') and f.endswith('.log')
+        )[-max_files:] if max_files > 0 else []
+
+        seeded = 0
+        for file_name in log_files:
+            when = None
+            with open(os.path.join(directory, file_name), 'r') as f:
+                for line in f:
+                    if line.startswith('Timestamp:'):
+                        try:
+                            when = datetime.strptime(line.split(': ', 1)[1].strip(), "%Y-%m-%d %H:%M:%S")
+                        except ValueError:
+                            when = None
+                    elif line.startswith('- ') and when:
+                        parsed = parse_order_line(line[2:])
+                        if not parsed:
+                            continue
+                        label, quantity, _ = parsed
+                        if normalize:
+                            label = normalize(label)
+                        if label:
+                            self.record(label, when, quantity)
+                            seeded += quantity
+        return seeded
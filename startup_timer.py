@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+
+# Set by the first import, which is as close to interpreter start as the till gets
+PROCESS_STARTED = time.perf_counter()
+
+
+def timing_requested(argv=None):
+    """True if --startup-timing was passed or WYVERN_STARTUP_TIMING is set."""
+    argv = sys.argv if argv is None else argv
+    return '--startup-timing' in argv or bool(os.environ.get('WYVERN_STARTUP_TIMING'))
+
+
+class StartupTimer:
+    """Records how long each startup phase takes and prints a breakdown.
+
+    Phases are marked in order; each one's time is measured from the
+    previous mark. For per-module import times, run the till under
+    python -X importtime.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phases = []
+        self.last = PROCESS_STARTED
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - PROCESS_STARTED))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("Startup timing:")
+        print(f"  {'phase':<24}{'self ms':>10}{'total ms':>10}")
+        for phase, duration, total in self.phases:
+            print(f"  {phase:<24}{duration * 1000:>10.1f}{total * 1000:>10.1f}")
@@ -0,0 +1,207 @@
+import os
+import time
+from money import Money
+from order_model import Order
+from menu_index import MenuItem, station_for
+from journal import Journal, load_journal_config
+
+# Name of the unnamed order rung up at the counter
+WALK_IN = ''
+
+# Journal records appended before settle() compacts the journal again
+COMPACT_AFTER = 500
+
+
+def item_from_record(label, price, menu_index=None):
+    """MenuItem for a journaled line, at the price it was rung up at."""
+    item = menu_index.lookup_label(label) if menu_index is not None else None
+    if item is None:
+        # No longer on the menu; keep selling it as it was
+        path = tuple(label.split(" > "))
+        item = MenuItem(
+            path=path,
+            label=label,
+            category=path[0],
+            description=path[1] if len(path) > 2 else path[-1],
+            size=path[-1] if len(path) > 2 else '',
+            price=Money(price),
+            station=station_for(path[0]),
+            image=None
+        )
+    if item.price != price:
+        item = item._replace(price=Money(price))
+    return item
+
+
+class TabManager:
+    """Open orders on the till: the walk-in order plus any named bar tabs.
+
+    All orders live in memory, so switching tabs is a dict lookup. Every
+    change to any order, which order is showing and how far its payment has
+    got are appended to a journal before the screen is updated. restore()
+    replays it on startup, so a crash or power cut loses nothing, and
+    compacts it to one snapshot of the open orders.
+    """
+
+    def __init__(self, journal=None):
+        if journal is None:
+            config = load_journal_config()
+            journal = Journal(os.path.join(config['directory'], 'tabs.journal'), config['fsync'], config['fsync_interval'])
+        self.journal = journal
+        self.orders = {WALK_IN: Order()}
+        self.opened = {}
+        # Tab name -> payment in progress: its stage, method and card details
+        self.payments = {}
+        self.current = WALK_IN
+        self.appended = 0
+
+    @property
+    def order(self):
+        return self.orders[self.current]
+
+    def names(self):
+        """Open tab names, oldest first."""
+        return [name for name in self.orders if name != WALK_IN]
+
+    def record(self, op, name, **fields):
+        self.journal.append(dict(fields, op=op, tab=name))
+        self.appended += 1
+
+    def restore(self, menu_index=None):
+        """Rebuild open orders from the journal and compact it. Returns the number of tabs restored."""
+        for record in self.journal.replay():
+            name = record.get('tab')
+            op = record.get('op')
+            if op == 'open':
+                self.orders.setdefault(name, Order())
+                self.opened.setdefault(name, record.get('at'))
+            elif name not in self.orders:
+                continue
+            elif op == 'add':
+                item = item_from_record(record['label'], record['price'], menu_index)
+                self.orders[name].add(item, record.get('quantity', 1))
+            elif op == 'remove':
+                self.orders[name].remove(record['label'], record.get('quantity', 1))
+            elif op == 'clear':
+                self.orders[name].clear()
+                self.payments.pop(name, None)
+            elif op == 'close' and name != WALK_IN:
+                del self.orders[name]
+                self.opened.pop(name, None)
+                self.payments.pop(name, None)
+            elif op == 'switch':
+                self.current = name
+            elif op == 'payment':
+                if record['stage'] == 'cancelled':
+                    self.payments.pop(name, None)
+                else:
+                    self.payments[name] = {key: value for key, value in record.items() if key not in ('op', 'tab')}
+        if self.current not in self.orders:
+            self.current = WALK_IN
+        self.compact()
+        return len(self.names())
+
+    def compact(self):
+        records = []
+        for name, order in self.orders.items():
+            if name != WALK_IN:
+                records.append({'op': 'open', 'tab': name, 'at': self.opened.get(name)})
+            for line in order:
+                records.append({
+                    'op': 'add', 'tab': name, 'label': line.item.label,
+                    'quantity': line.quantity, 'price': int(line.item.price)
+                })
+            if name in self.payments:
+                records.append(dict(self.payments[name], op='payment', tab=name))
+        records.append({'op': 'switch', 'tab': self.current})
+        self.journal.rewrite(records)
+        self.appended = 0
+
+    def open(self, name, take_walk_in=True):
+        """Open a tab and switch to it, moving the walk-in order onto it if asked.
+
+        Returns (success, message).
+        """
+        name = name.strip()
+        if not name:
+            return False, "Tab name is required"
+        if name in self.orders:
+            return False, f"Tab '{name}' is already open"
+        walk_in_payment = self.payments.get(WALK_IN) or {}
+        if take_walk_in and walk_in_payment.get('stage') in ('charging', 'charged'):
+            return False, "Finish paying for the walk-in order before moving it to a tab"
+        order = Order()
+        self.orders[name] = order
+        self.opened[name] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.record('open', name, at=self.opened[name])
+        if take_walk_in:
+            walk_in = self.orders[WALK_IN]
+            for line in walk_in:
+                order.add(line.item, line.quantity)
+                self.record('add', name, label=line.item.label, quantity=line.quantity, price=int(line.item.price))
+            walk_in.clear()
+            # The walk-in order's payment goes with it; replaying 'clear' drops it too
+            self.payments.pop(WALK_IN, None)
+            self.record('clear', WALK_IN)
+        self.current = name
+        self.record('switch', name)
+        return True, f"Tab '{name}' opened"
+
+    def switch(self, name):
+        if name not in self.orders:
+            return False, f"Tab '{name}' is not open"
+        self.current = name
+        self.record('switch', name)
+        return True, f"Switched to tab '{name}'" if name != WALK_IN else "Switched to walk-in order"
+
+    def add(self, item, quantity=1):
+        line = self.order.add(item, quantity)
+        self.record('add', self.current, label=item.label, quantity=quantity, price=int(line.item.price))
+        return line
+
+    def remove(self, label, quantity=1):
+        line = self.order.remove(label, quantity)
+        self.record('remove', self.current, label=label, quantity=quantity)
+        return line
+
+    def undo_last(self):
+        label = self.order.undo_last()
+        if label is not None:
+            self.record('remove', self.current, label=label, quantity=1)
+        return label
+
+    def set_payment(self, stage, **details):
+        """Journal how far payment of the current order has got.
+
+        stage is started (payment screen shown), charging (about to debit a
+        Wyvern card), charged (debited, not yet logged) or cancelled.
+        """
+        if stage == 'cancelled':
+            if self.payments.pop(self.current, None) is None:
+                return
+        else:
+            self.payments[self.current] = dict(details, stage=stage)
+        self.record('payment', self.current, stage=stage, **details)
+
+    def clear(self):
+        """Start the current order afresh; the old Order object is left as it was, e.g. for a receipt."""
+        self.orders[self.current] = Order()
+        self.payments.pop(self.current, None)
+        self.record('clear', self.current)
+
+    def settle(self):
+        """Close the current order once it has been paid and return to the walk-in order."""
+        if self.current == WALK_IN:
+            self.clear()
+        else:
+            self.record('close', self.current)
+            del self.orders[self.current]
+            self.opened.pop(self.current, None)
+            self.payments.pop(self.current, None)
+            self.current = WALK_IN
+            self.record('switch', WALK_IN)
+        if self.appended > COMPACT_AFTER:
+            self.compact()
+
+    def close(self):
+        self.journal.close()
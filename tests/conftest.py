@@ -0,0 +1,43 @@
+import os
+import sys
+import shutil
+import configparser
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture
+def make_till(tmp_path, monkeypatch):
+    """Return a function that sets up a till directory and its UserManagement.
+
+    Each till gets its own copy of settings.cfg (with [POS] id set to name and
+    any overrides given as {section: {option: value}}) and its own users.db.
+    The current directory is left in the last till created.
+    """
+    from user_management import UserManagement
+
+    def make(name, overrides=None, users_db=None):
+        directory = tmp_path / name
+        directory.mkdir()
+        config = configparser.ConfigParser()
+        config.read(os.path.join(REPO_DIR, 'settings.cfg'))
+        config.set('POS', 'id', name)
+        for section, options in (overrides or {}).items():
+            for option, value in options.items():
+                config.set(section, option, str(value))
+        with open(directory / 'settings.cfg', 'w') as file:
+            config.write(file)
+        if users_db:
+            shutil.copy(users_db, directory / 'users.db')
+
+        monkeypatch.chdir(directory)
+        user_management = UserManagement(local=True, defer_setup=True)
+        # Absolute paths, so tills in other directories can be used side by side
+        user_management.db_name = str(directory / 'users.db')
+        user_management.archive_dir = str(directory / 'archive')
+        user_management.ensure_database()
+        return user_management
+
+    return make
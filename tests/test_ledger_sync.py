@@ -0,0 +1,253 @@
+import sqlite3
+import threading
+import pytest
+from money import Money
+from ledger_archive import LedgerArchiver
+from ledger_sync import LedgerPeerServer, LedgerReplicator, load_replication_config
+from wallet_service import load_network_config
+
+SECRET = 'test-secret'
+
+
+def network(secret=SECRET):
+    return dict(load_network_config(), secret=secret)
+
+
+@pytest.fixture
+def serve():
+    """Return a function that serves a till's ledger on a free port and returns its peer address."""
+    servers = []
+
+    def start(user_management):
+        server = LedgerPeerServer(user_management, '127.0.0.1', 0, network())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def replicator(user_management, secret=SECRET):
+    config = dict(load_replication_config(), origin=user_management.origin, peers=[])
+    return LedgerReplicator(user_management, config, network(secret))
+
+
+def snapshot(user_management, tags):
+    """Member name, balance and tags for each tag, as this till sees them."""
+    result = {}
+    for tag in tags:
+        user = user_management.get_user_by_rfid(tag)
+        if user:
+            result[tag] = (user['name'], user['balance'], user_management.get_user_rfid_tags(user['id']))
+    return result
+
+
+def test_two_tills_converge(make_till, serve):
+    till_a = make_till('TILL-A')
+    till_b = make_till('TILL-B')
+    assert till_a.add_user('Ann', '', 'ann@example.com', 'ANN-1', 0, Money(5000))[0]
+    assert till_b.add_user('Bob', '', 'bob@example.com', 'BOB-1', 0, Money(2000))[0]
+    ann = till_a.get_user_by_rfid('ANN-1')
+    till_a.update_balance(ann['id'], Money(-1200), 'purchase', 'Beer')
+    till_a.add_rfid_tag(ann['id'], 'ANN-2')
+
+    peer_b = serve(till_b)
+    sent, received = replicator(till_a).sync_with(peer_b)
+    assert sent > 0 and received > 0
+
+    # Local ids differ between the tills; events follow the member
+    ann_on_b = till_b.get_user_by_rfid('ANN-2')
+    assert ann_on_b['id'] != ann['id']
+    till_b.update_balance(ann_on_b['id'], Money(-300), 'purchase', 'Wine')
+    till_b.remove_rfid_tag(ann_on_b['id'], 'ANN-1')
+    till_b.update_user(ann_on_b['id'], phone='0821234567')
+    bob = till_b.get_user_by_rfid('BOB-1')
+    till_b.update_balance(bob['id'], Money(-150), 'purchase', 'Coke')
+
+    replicator(till_a).sync_with(peer_b)
+    tags = ['ANN-1', 'ANN-2', 'BOB-1']
+    assert snapshot(till_a, tags) == snapshot(till_b, tags) == {
+        'ANN-2': ('Ann', Money(3500), ['ANN-2']),
+        'BOB-1': ('Bob', Money(1850), ['BOB-1']),
+    }
+    assert till_a.get_user_by_rfid('ANN-2')['phone'] == '0821234567'
+    assert till_a.get_event_ranges() == till_b.get_event_ranges()
+    # Nothing left to exchange
+    assert replicator(till_a).sync_with(peer_b) == (0, 0)
+
+
+def test_events_may_arrive_before_their_member(make_till):
+    till_a = make_till('TILL-A')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(1000))
+    ann = till_a.get_user_by_rfid('ANN-1')
+    till_a.update_balance(ann['id'], Money(-250), 'purchase', 'Beer')
+    events = till_a.get_missing_events({})
+
+    till_c = make_till('TILL-C')
+    assert till_c.apply_events(list(reversed(events))) == len(events)
+    assert till_c.get_user_by_rfid('ANN-1')['balance'] == Money(750)
+    # Applying them again changes nothing
+    assert till_c.apply_events(events) == 0
+    assert till_c.get_user_by_rfid('ANN-1')['balance'] == Money(750)
+
+
+def test_latest_member_update_wins_in_any_order(make_till):
+    till_a = make_till('TILL-A')
+    till_a.add_user('Ann', '', '', 'ANN-1')
+    ann = till_a.get_user_by_rfid('ANN-1')
+    till_a.update_user(ann['id'], name='Ann Smith')
+    till_a.update_user(ann['id'], email='ann@example.com')
+    events = till_a.get_missing_events({})
+
+    till_c = make_till('TILL-C')
+    till_c.apply_events([events[0], events[1], events[3], events[2]])
+    user = till_c.get_user_by_rfid('ANN-1')
+    assert (user['name'], user['email']) == ('Ann Smith', 'ann@example.com')
+
+
+def test_wrong_secret_is_refused(make_till, serve):
+    till_a = make_till('TILL-A')
+    till_b = make_till('TILL-B')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(1000))
+    peer_b = serve(till_b)
+    with pytest.raises(ConnectionError):
+        replicator(till_a, secret='wrong').sync_with(peer_b)
+    assert till_b.get_user_by_rfid('ANN-1') is None
+
+
+def test_event_ids_are_not_reused_after_clearing(make_till):
+    till_a = make_till('TILL-A')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(1000))
+    last_seq = till_a.get_event_ranges()['TILL-A'][-1][1]
+    assert till_a.clear_all_data()[0]
+    till_a.add_user('Bob', '', '', 'BOB-1')
+    assert till_a.get_event_ranges()['TILL-A'][0][0] == last_seq + 1
+
+
+def test_clearing_is_refused_while_replicating(make_till):
+    till_a = make_till('TILL-A', {'Replication': {'enabled': 'yes'}})
+    till_a.add_user('Ann', '', '', 'ANN-1')
+    success, _ = till_a.clear_all_data()
+    assert not success
+    assert till_a.get_user_by_rfid('ANN-1') is not None
+
+
+def test_deleting_a_user_is_refused_while_replicating(make_till):
+    till_a = make_till('TILL-A', {'Replication': {'enabled': 'yes'}})
+    till_a.add_user('Ann', '', '', 'ANN-1')
+    success, _ = till_a.delete_user(till_a.get_user_by_rfid('ANN-1')['id'])
+    assert not success
+    assert till_a.get_user_by_rfid('ANN-1') is not None
+
+
+def test_deleting_a_user_removes_their_tags_and_events(make_till):
+    till_a = make_till('TILL-A')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(1000))
+    till_a.add_user('Bob', '', '', 'BOB-1', 0, Money(500))
+    ann = till_a.get_user_by_rfid('ANN-1')
+    till_a.update_balance(ann['id'], Money(-250), 'purchase', 'Beer')
+    assert till_a.delete_user(ann['id']) == (True, "User deleted successfully")
+
+    conn = sqlite3.connect(till_a.db_name)
+    for table in ('rfid_tags', 'ledger_events', 'transactions'):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (ann['id'],)).fetchone()[0] == 0
+    conn.close()
+    assert till_a.get_user_by_rfid('BOB-1')['balance'] == Money(500)
+    assert till_a.delete_user(ann['id'])[0] is False
+
+
+def age_events(user_management):
+    conn = sqlite3.connect(user_management.db_name)
+    conn.execute("UPDATE ledger_events SET created_at = '2020-01-01 00:00:00'")
+    conn.commit()
+    conn.close()
+
+
+def held_events(user_management):
+    conn = sqlite3.connect(user_management.db_name)
+    rows = conn.execute("SELECT seq, type FROM ledger_events ORDER BY seq").fetchall()
+    conn.close()
+    return rows
+
+
+def test_compacted_events_stay_counted_as_held(make_till, serve):
+    till_a = make_till('TILL-A')
+    till_b = make_till('TILL-B')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(5000))
+    ann = till_a.get_user_by_rfid('ANN-1')
+    for _ in range(3):
+        till_a.update_balance(ann['id'], Money(-100), 'purchase', 'Beer')
+    peer_b = serve(till_b)
+    replicator(till_a).sync_with(peer_b)
+    # Not yet held by the peer, so it must survive compaction
+    till_a.update_balance(ann['id'], Money(-100), 'purchase', 'Wine')
+
+    age_events(till_a)
+    ranges = till_a.get_event_ranges()
+    assert LedgerArchiver(till_a.db_name, till_a.archive_dir, 90).run()[0]
+
+    # Member and tag events are kept; balance events are folded into totals
+    last_seq = ranges['TILL-A'][-1][1]
+    assert held_events(till_a) == [(1, 'member'), (2, 'tag_add'), (last_seq, 'purchase')]
+    assert till_a.get_event_ranges() == ranges
+    assert till_a.get_user_by_rfid('ANN-1')['balance'] == Money(4600)
+    assert till_a.rebuild_balances()[0]
+    assert till_a.get_user_by_rfid('ANN-1')['balance'] == Money(4600)
+
+    # The peer gets only the new event, and compacted ones are not taken back
+    assert replicator(till_a).sync_with(peer_b) == (1, 0)
+    assert till_a.apply_events(till_b.get_missing_events({})) == 0
+    assert till_b.get_user_by_rfid('ANN-1')['balance'] == Money(4600)
+
+
+def test_acks_are_kept_under_the_peer_id(make_till, serve):
+    till_a = make_till('TILL-A')
+    till_b = make_till('TILL-B')
+    till_a.add_user('Ann', '', '', 'ANN-1')
+    replicator(till_a).sync_with(serve(till_b))
+    for till, peer in ((till_a, 'TILL-B'), (till_b, 'TILL-A')):
+        conn = sqlite3.connect(till.db_name)
+        assert {row[0] for row in conn.execute("SELECT peer FROM peer_acks")} == {peer}
+        conn.close()
+
+
+def test_nothing_is_compacted_before_a_peer_acks(make_till):
+    till_a = make_till('TILL-A')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(5000))
+    age_events(till_a)
+    events = held_events(till_a)
+    assert LedgerArchiver(till_a.db_name, till_a.archive_dir, 90).run()[0]
+    assert held_events(till_a) == events
+
+
+def test_new_till_catches_up_from_compacted_events(make_till, serve):
+    till_a = make_till('TILL-A')
+    till_b = make_till('TILL-B')
+    till_a.add_user('Ann', '', '', 'ANN-1', 0, Money(5000))
+    ann = till_a.get_user_by_rfid('ANN-1')
+    till_a.update_balance(ann['id'], Money(-700), 'purchase', 'Beer')
+    till_a.add_rfid_tag(ann['id'], 'ANN-2')
+    till_a.update_user(ann['id'], phone='0821234567')
+    replicator(till_a).sync_with(serve(till_b))
+    age_events(till_a)
+    assert LedgerArchiver(till_a.db_name, till_a.archive_dir, 90).run()[0]
+
+    # A till added later pushes to A, which sends it the compacted totals
+    till_c = make_till('TILL-C')
+    till_c.add_user('Cid', '', '', 'CID-1', 0, Money(100))
+    replicator(till_c).sync_with(serve(till_a))
+    tags = ['ANN-1', 'ANN-2', 'CID-1']
+    assert snapshot(till_c, tags) == snapshot(till_a, tags)
+    assert till_c.get_user_by_rfid('ANN-2')['balance'] == Money(4300)
+    assert till_c.get_user_by_rfid('ANN-2')['phone'] == '0821234567'
+    assert till_c.get_event_ranges()['TILL-A'] == till_a.get_event_ranges()['TILL-A']
+    assert till_c.rebuild_balances()[0]
+    assert till_c.get_user_by_rfid('ANN-1')['balance'] == Money(4300)
+
+    # And A, syncing with a fresh till, pushes them
+    till_d = make_till('TILL-D')
+    replicator(till_a).sync_with(serve(till_d))
+    assert snapshot(till_d, tags) == snapshot(till_a, tags)
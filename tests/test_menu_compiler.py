@@ -0,0 +1,109 @@
+import os
+import json
+import pytest
+from money import Money
+from menu_compiler import MenuError, artifact_path, compile_menu, load_compiled_menu, parse_csv_lines, write_menu
+
+CSV_MENU = """BEER:,CASTLE LAGER,340ML,25
+BEER:,CASTLE LAGER,QUART,40.50
+KITCHEN:,CHIPS,,35,kitchen
+"""
+
+
+def test_parse_csv_lines():
+    menu_data, problems = parse_csv_lines(CSV_MENU.splitlines())
+    assert menu_data == {
+        'BEER': {'CASTLE LAGER': {'340ML': {'price': Money(2500)}, 'QUART': {'price': Money(4050)}}},
+        'KITCHEN': {'CHIPS': {'price': Money(3500), 'station': 'kitchen'}},
+    }
+    assert problems == []
+
+
+def test_bad_csv_lines_are_skipped_with_a_problem():
+    lines = [
+        "BEER:,LAGER,340ML,25",
+        "BEER:,LAGER,340ML,30",
+        "BEER:,STOUT,340ML,free",
+        "BEER:,CIDER,340ML,-5",
+        "BEER:,WINE",
+        ",,,",
+        ":,NAMELESS,,10",
+    ]
+    menu_data, problems = parse_csv_lines(lines)
+    assert menu_data == {'BEER': {'LAGER': {'340ML': {'price': Money(2500)}}}}
+    assert problems == [
+        "line 2: duplicate item BEER > LAGER > 340ML",
+        "line 3: invalid price 'free'",
+        "line 4: negative price '-5'",
+        "line 5: expected category,description,size,price",
+        "line 7: missing category or description",
+    ]
+
+
+def test_json_menu_accepts_the_older_single_price_key(tmp_path):
+    path = tmp_path / 'menu.json'
+    path.write_text(json.dumps({
+        'WINE': {'Red': {'Glass': {'price': 45}, 'Bottle': {'single_price': '160.00'}}},
+        'Broken': 'not an object',
+    }))
+    menu_data, problems = compile_menu(str(path))
+    assert menu_data == {'WINE': {'Red': {'Glass': {'price': Money(4500)}, 'Bottle': {'price': Money(16000)}}}}
+    assert problems == ["Broken: expected an object"]
+
+
+def test_menu_without_items_is_an_error(tmp_path):
+    path = tmp_path / 'menu.csv'
+    path.write_text("BEER:,LAGER,340ML,free\n")
+    with pytest.raises(MenuError, match='no valid menu items'):
+        compile_menu(str(path))
+
+
+def test_compiled_artifact_is_reused_until_the_source_changes(tmp_path):
+    source = tmp_path / 'menu.csv'
+    source.write_text(CSV_MENU)
+    cache_dir = str(tmp_path / 'cache')
+    first = load_compiled_menu(str(source), cache_dir)
+    assert len(first.index) == 3
+    assert os.path.exists(artifact_path(str(source), cache_dir))
+
+    # A matching mtime and size is trusted without reading the source
+    with open(artifact_path(str(source), cache_dir)) as file:
+        artifact = json.load(file)
+    artifact['items'][0][1] = 9900
+    with open(artifact_path(str(source), cache_dir), 'w') as file:
+        json.dump(artifact, file)
+    assert load_compiled_menu(str(source), cache_dir).index.get(('BEER', 'CASTLE LAGER', '340ML')).price == Money(9900)
+
+    # Changed content is recompiled
+    source.write_text(CSV_MENU.replace(',25', ',27'))
+    second = load_compiled_menu(str(source), cache_dir)
+    assert second.index.get(('BEER', 'CASTLE LAGER', '340ML')).price == Money(2700)
+    assert second.digest != first.digest
+
+
+@pytest.mark.parametrize('file_name', ['menu.csv', 'menu.json'])
+def test_write_menu_round_trips(tmp_path, file_name):
+    menu_data, _ = parse_csv_lines(CSV_MENU.splitlines())
+    path = str(tmp_path / file_name)
+    write_menu(path, menu_data)
+    assert compile_menu(path) == (menu_data, [])
+
+
+def test_csv_menus_only_hold_three_levels(tmp_path):
+    menu_data = {'A': {'B': {'C': {'D': {'price': Money(100)}}}}}
+    with pytest.raises(MenuError, match='CSV menus'):
+        write_menu(str(tmp_path / 'menu.csv'), menu_data)
+    assert not os.path.exists(tmp_path / 'menu.csv')
+
+
+@pytest.mark.parametrize('file_name', ['menu.csv', 'menu.json'])
+def test_saving_an_empty_category_is_refused(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+    menu_data = {'BEER': {'Lager': {'price': Money(3000)}}, 'WINE': {}}
+    with pytest.raises(MenuError, match='WINE'):
+        write_menu(path, menu_data)
+
+    # Once it has an item, it is saved
+    menu_data['WINE']['Red'] = {'price': Money(4500)}
+    write_menu(path, menu_data)
+    assert compile_menu(path) == (menu_data, [])
@@ -0,0 +1,69 @@
+from money import Money
+from menu_index import MenuIndex, diff_menu_indexes, station_for
+
+MENU = {
+    'BEER': {
+        'Lager': {'Pint': {'price': Money(3500)}, 'Half': {'price': Money(2000)}},
+        'Stout': {'price': Money(4000), 'station': 'cellar'},
+    },
+    'KITCHEN': {'Pizza': {'Meat': {'price': Money(9000)}}},
+}
+
+
+def test_items_by_path_and_label(tmp_path):
+    index = MenuIndex(MENU, image_dir=str(tmp_path))
+    assert len(index) == 4
+    pint = index.get(['BEER', 'Lager', 'Pint'])
+    assert pint.label == 'BEER > Lager > Pint'
+    assert (pint.category, pint.description, pint.size, pint.price) == ('BEER', 'Lager', 'Pint', Money(3500))
+    assert index.lookup_label('BEER > Lager > Pint') is pint
+    assert index.get(['BEER', 'Lager']) is None
+    assert index.lookup_label('BEER > Cider') is None
+
+
+def test_two_level_items_have_no_size(tmp_path):
+    stout = MenuIndex(MENU, image_dir=str(tmp_path)).get(('BEER', 'Stout'))
+    assert (stout.description, stout.size, stout.station) == ('Stout', '', 'cellar')
+
+
+def test_children_keep_menu_order(tmp_path):
+    index = MenuIndex(MENU, image_dir=str(tmp_path))
+    assert index.children[()] == ('BEER', 'KITCHEN')
+    assert index.children[('BEER', 'Lager')] == ('Pint', 'Half')
+
+
+def test_stations():
+    assert station_for('KITCHEN') == 'kitchen'
+    assert station_for('Kitchen specials') == 'kitchen'
+    assert station_for('BEER') == 'bar'
+
+
+def test_labels_from_older_logs_with_the_path_written_twice(tmp_path):
+    index = MenuIndex({'KITCHEN': {'PIZZA': {'MEAT': {'price': Money(9000)}}}}, image_dir=str(tmp_path))
+    assert index.lookup_label('KITCHEN > PIZZA > KITCHEN > PIZZA > MEAT').label == 'KITCHEN > PIZZA > MEAT'
+
+
+def test_images_are_matched_by_description(tmp_path):
+    (tmp_path / 'Lager.PNG').write_bytes(b'')
+    (tmp_path / 'notes.txt').write_bytes(b'')
+    index = MenuIndex(MENU, image_dir=str(tmp_path))
+    assert index.get(('BEER', 'Lager', 'Pint')).image == str(tmp_path / 'Lager.PNG')
+    assert index.get(('BEER', 'Stout')).image is None
+    assert index.image_for('LAGER') == str(tmp_path / 'Lager.PNG')
+    assert index.image_for('notes') is None
+
+
+def test_diff_between_menu_loads(tmp_path):
+    old = MenuIndex(MENU, image_dir=str(tmp_path))
+    new = MenuIndex({
+        'BEER': {
+            'Lager': {'Pint': {'price': Money(3700)}, 'Half': {'price': Money(2000)}},
+            'Cider': {'price': Money(3000)},
+        },
+    }, image_dir=str(tmp_path))
+    diff = diff_menu_indexes(old, new)
+    assert diff.added == [('BEER', 'Cider')]
+    assert sorted(diff.removed) == [('BEER', 'Stout'), ('KITCHEN', 'Pizza', 'Meat')]
+    assert diff.changed == [('BEER', 'Lager', 'Pint')]
+    assert diff.changed_levels == {(), ('BEER',), ('KITCHEN',), ('KITCHEN', 'Pizza')}
+    assert diff_menu_indexes(old, MenuIndex(MENU, image_dir=str(tmp_path))) == ([], [], [], set())
@@ -0,0 +1,52 @@
+from money import Money
+from menu_index import MenuIndex
+from menu_search import MenuSearch
+
+MENU = MenuIndex({
+    'WINE': {
+        'BRUCE JACK PINOTAGE': {'Glass': {'price': Money(4500)}, 'Bottle': {'price': Money(16000)}},
+        'JACK AND JILL SAUVIGNON': {'Glass': {'price': Money(5000)}},
+    },
+    'BEER': {'Castle Lager': {'price': Money(3000)}, 'Black Label': {'price': Money(3200)}},
+    'KITCHEN': {'Jacket Potato': {'price': Money(6000)}},
+}, image_dir='/nonexistent')
+
+
+def labels(items):
+    return [item.label for item in items]
+
+
+def test_word_prefixes_match_in_any_order():
+    search = MenuSearch(MENU)
+    assert labels(search.search('bru pin')) == ['WINE > BRUCE JACK PINOTAGE > Bottle', 'WINE > BRUCE JACK PINOTAGE > Glass']
+    assert labels(search.search('glass pin')) == ['WINE > BRUCE JACK PINOTAGE > Glass']
+
+
+def test_every_term_has_to_match():
+    search = MenuSearch(MENU)
+    assert search.search('castle stout') == []
+    assert search.search('') == []
+    assert search.search('  ,. ') == []
+
+
+def test_terms_inside_a_word_match_through_trigrams():
+    search = MenuSearch(MENU)
+    assert labels(search.search('ager')) == ['BEER > Castle Lager']
+    assert labels(search.search('otag')) == ['WINE > BRUCE JACK PINOTAGE > Bottle', 'WINE > BRUCE JACK PINOTAGE > Glass']
+    # Shorter terms only match the start of a word
+    assert search.search('ag') == []
+
+
+def test_description_matches_come_first():
+    search = MenuSearch(MENU)
+    # "b" starts Black Label and BRUCE JACK, but only the category of Castle Lager
+    assert labels(search.search('b')) == [
+        'BEER > Black Label',
+        'WINE > BRUCE JACK PINOTAGE > Bottle',
+        'WINE > BRUCE JACK PINOTAGE > Glass',
+        'BEER > Castle Lager',
+    ]
+
+
+def test_limit():
+    assert labels(MenuSearch(MENU).search('b', limit=2)) == ['BEER > Black Label', 'WINE > BRUCE JACK PINOTAGE > Bottle']
@@ -0,0 +1,136 @@
+import sqlite3
+import pytest
+from money import Money
+from user_management import SCHEMA_VERSION
+from ledger_archive import LedgerArchiver, convert_to_incremental_vacuum
+
+# users.db as created before balances moved to integer cents
+LEGACY_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        phone TEXT,
+        email TEXT,
+        balance DECIMAL(10,2) DEFAULT 0.00,
+        discount_rate DECIMAL(5,2) DEFAULT 0.00,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE rfid_tags (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        rfid TEXT UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        amount DECIMAL(10,2),
+        type TEXT,
+        description TEXT,
+        payment_method TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+'''
+
+# (name, REAL balance as the old code left it, expected cents, tags)
+LEGACY_USERS = [
+    ('Ann', 12.35, 1235, ['A-1', 'A-2']),
+    ('Ben', 0.1 + 0.2, 30, ['B-1']),
+    ('Cat', 19.99 * 3, 5997, ['C-1']),
+    ('Dan', -5.5, -550, ['D-1']),
+    ('Eve', None, 0, []),
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    for name, balance, _, tags in LEGACY_USERS:
+        cursor = conn.execute("INSERT INTO users (name, balance, discount_rate) VALUES (?, ?, 10.0)", (name, balance))
+        user_id = cursor.lastrowid
+        for tag in tags:
+            conn.execute("INSERT INTO rfid_tags (user_id, rfid) VALUES (?, ?)", (user_id, tag))
+        conn.execute('''
+            INSERT INTO transactions (user_id, amount, type, description, timestamp)
+            VALUES (?, ?, 'deposit', 'Top-up', '2025-05-01 18:00:00')
+        ''', (user_id, 0.7 + 0.1))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_balances_become_exact_cents(make_till, legacy_db):
+    user_management = make_till('POS1', users_db=legacy_db)
+    conn = sqlite3.connect(user_management.db_name)
+    rows = conn.execute("SELECT name, balance, typeof(balance) FROM users ORDER BY id").fetchall()
+    assert [(name, balance) for name, balance, _ in rows] == [(name, cents) for name, _, cents, _ in LEGACY_USERS]
+    assert {kind for _, _, kind in rows} == {'integer'}
+    amounts = conn.execute("SELECT DISTINCT amount, typeof(amount) FROM transactions").fetchall()
+    assert amounts == [(80, 'integer')]
+    conn.close()
+
+    user = user_management.get_user_by_rfid('A-2')
+    assert user['name'] == 'Ann'
+    assert user['balance'] == Money(1235)
+    assert isinstance(user['balance'], Money)
+
+
+def test_schema_is_current_with_indexes_and_member_uids(make_till, legacy_db):
+    user_management = make_till('POS1', users_db=legacy_db)
+    conn = sqlite3.connect(user_management.db_name)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_transactions_user_time', 'idx_users_member_uid', 'idx_ledger_events_member'} <= indexes
+    uids = dict(conn.execute("SELECT name, member_uid FROM users").fetchall())
+    conn.close()
+    # Named after the first tag, so copies of the same users.db agree
+    assert uids['Ann'] == 'tag:A-1'
+    assert uids['Dan'] == 'tag:D-1'
+    assert uids['Eve'] and not uids['Eve'].startswith('tag:')
+
+
+def test_migrated_balances_carry_on_as_ledger_events(make_till, legacy_db):
+    user_management = make_till('POS1', users_db=legacy_db)
+    ann = user_management.get_user_by_rfid('A-1')
+    assert user_management.update_balance(ann['id'], Money(-235), 'purchase', 'Beer') == (True, "Balance updated successfully")
+    assert user_management.get_user_by_rfid('A-1')['balance'] == Money(1000)
+
+    # The pre-migration balance is the baseline the events add to
+    assert user_management.rebuild_balances()[0]
+    assert user_management.get_user_by_rfid('A-1')['balance'] == Money(1000)
+    assert user_management.get_user_by_rfid('D-1')['balance'] == Money(-550)
+
+
+def test_migration_runs_once(make_till, legacy_db):
+    user_management = make_till('POS1', users_db=legacy_db)
+    user_management.initialize_database()
+    user_management.migrate_database()
+    conn = sqlite3.connect(user_management.db_name)
+    assert conn.execute("SELECT balance FROM users WHERE name = 'Ann'").fetchone()[0] == 1235
+    conn.close()
+
+
+def test_new_database_releases_pages_incrementally(make_till):
+    user_management = make_till('POS1')
+    conn = sqlite3.connect(user_management.db_name)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+
+
+def test_older_database_is_converted_offline(make_till, legacy_db):
+    user_management = make_till('POS1', users_db=legacy_db)
+    # Archiving never rewrites the live database
+    assert LedgerArchiver(user_management.db_name, user_management.archive_dir, 90).run()[0]
+    conn = sqlite3.connect(user_management.db_name)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    conn.close()
+
+    assert convert_to_incremental_vacuum(user_management.db_name)[0]
+    conn = sqlite3.connect(user_management.db_name)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+    assert user_management.get_user_by_rfid('A-1')['balance'] == Money(1235)
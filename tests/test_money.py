@@ -0,0 +1,82 @@
+from decimal import Decimal
+import pytest
+from money import Money
+
+
+@pytest.mark.parametrize('text, cents', [
+    ("R90.00", 9000),
+    ("25", 2500),
+    ("-12.5", -1250),
+    ("0.05", 5),
+    ("R1,250.00", 125000),
+    ("12.345", 1235),
+    ("12.344", 1234),
+    ("-0.005", -1),
+    (" 7.1 ", 710),
+])
+def test_parse_strings(text, cents):
+    assert Money.parse(text) == cents
+
+
+def test_parse_decimal_and_float_without_binary_drift():
+    assert Money.parse(Decimal('35')) == 3500
+    assert Money.parse(Decimal('19.99')) == 1999
+    assert Money.parse(0.1 + 0.2) == 30
+    assert Money.parse(19.99 * 3) == 5997
+
+
+def test_parse_refuses_bare_ints():
+    with pytest.raises(TypeError):
+        Money.parse(35)
+
+
+@pytest.mark.parametrize('text', ["", "R", "abc", "1.2.3", "--5"])
+def test_parse_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        Money.parse(text)
+
+
+def test_parse_returns_money_unchanged():
+    amount = Money(1234)
+    assert Money.parse(amount) is amount
+    assert Money.from_rands(amount) is amount
+
+
+def test_from_rands():
+    assert Money.from_rands(35) == 3500
+    assert Money.from_rands("12.50") == 1250
+    assert Money.from_rands(Decimal('0.99')) == 99
+
+
+def test_arithmetic_stays_money():
+    total = Money(1999) * 3 + Money(1) - 500
+    assert total == 5498
+    assert isinstance(total, Money)
+    assert isinstance(2 * Money(150), Money)
+    assert isinstance(10000 - Money(1), Money)
+    assert isinstance(-Money(5), Money)
+    assert abs(Money(-250)) == 250
+    assert sum([Money(100), Money(250)]) == 350
+
+
+def test_multiplying_two_amounts_is_refused():
+    with pytest.raises(TypeError):
+        Money(100) * Money(2)
+
+
+def test_percent_rounds_half_up_to_the_cent():
+    assert Money(999).percent(10) == 100
+    assert Money(-999).percent(10) == -100
+    assert Money(1000).percent(Decimal('12.5')) == 125
+    assert Money(1).percent(50) == 1
+    assert Money(5000).percent("0") == 0
+
+
+def test_display():
+    assert str(Money(9000)) == "90.00"
+    assert str(Money(-5)) == "-0.05"
+    assert f"R{Money(123456)}" == "R1234.56"
+    assert f"{Money(9000):>8}" == "   90.00"
+    assert f"{Money(1999):.1f}" == "20.0"
+    assert Money(1999).to_decimal() == Decimal('19.99')
+    assert repr(Money(7)) == "Money(7)"
@@ -0,0 +1,82 @@
+import time
+import pytest
+from nfc_reader import (
+    TagReader, PtyCardReader, load_nfc_config, INPUT_EVENT, EV_KEY, KEY_PRESSED, KEY_ENTER
+)
+
+
+def wait_for_events(reader, count, timeout=2.0):
+    """Collect taps from reader until count have arrived or timeout passes."""
+    events = []
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        events.extend(reader.get_events())
+        time.sleep(0.02)
+    return events
+
+
+@pytest.fixture
+def card_reader():
+    """A TagReader reading a pty stand-in reader, with a 0.3 second debounce."""
+    pty_reader = PtyCardReader()
+    config = load_nfc_config('/nonexistent')
+    config.update(device=pty_reader.path, debounce=0.3)
+    reader = TagReader(config)
+    reader.start()
+    yield pty_reader, reader
+    reader.stop()
+    pty_reader.close()
+
+
+def test_reads_taps_from_a_serial_reader(card_reader):
+    pty_reader, reader = card_reader
+    pty_reader.tap("04A1B2C3")
+    pty_reader.tap("04D4E5F6")
+    events = wait_for_events(reader, 2)
+    assert [event.tag for event in events] == ["04A1B2C3", "04D4E5F6"]
+    assert all(event.device == pty_reader.path for event in events)
+
+
+def test_card_left_on_the_reader_is_debounced(card_reader):
+    pty_reader, reader = card_reader
+    for _ in range(5):
+        pty_reader.tap("HELD")
+        time.sleep(0.05)
+    time.sleep(0.2)
+    assert [event.tag for event in reader.get_events()] == ["HELD"]
+
+    # A tap after the debounce period counts again
+    time.sleep(0.4)
+    pty_reader.tap("HELD")
+    assert [event.tag for event in wait_for_events(reader, 1)] == ["HELD"]
+
+
+def test_stx_etx_framed_tags(card_reader):
+    pty_reader, reader = card_reader
+    pty_reader.tap("\x02FRAMED\x03", terminator='')
+    pty_reader.tap("\x02NEXT\x03", terminator='')
+    assert [event.tag for event in wait_for_events(reader, 2)] == ["FRAMED", "NEXT"]
+
+
+def test_parse_serial_keeps_partial_tags():
+    reader = TagReader(load_nfc_config('/nonexistent'))
+    pending = bytearray(b"\x02AB")
+    assert reader.parse_serial(pending, {}) == []
+    pending.extend(b"C\x03\r\nDE")
+    assert reader.parse_serial(pending, {}) == ["ABC"]
+    assert pending == bytearray(b"DE")
+
+
+def test_parse_key_events_from_a_keyboard_wedge():
+    reader = TagReader(load_nfc_config('/nonexistent'))
+    state = {'tag': [], 'shift': False}
+
+    def key(code, value=KEY_PRESSED):
+        return INPUT_EVENT.pack(0, 0, EV_KEY, code, value)
+
+    # "a", shifted "b", "1", Enter; key releases are ignored
+    data = key(30) + key(30, 0) + key(42) + key(48) + key(42, 0) + key(2) + key(KEY_ENTER)
+    pending = bytearray(data + key(3)[:5])
+    assert reader.parse_key_events(pending, state) == ["aB1"]
+    # The incomplete event stays pending
+    assert len(pending) == 5
@@ -0,0 +1,64 @@
+import pytest
+from money import Money
+from menu_index import MenuIndex
+from order_model import Order, format_order_line, parse_order_line
+
+MENU = MenuIndex({'BEER': {'Lager': {'price': Money(3000)}, 'Stout': {'price': Money(3500)}}}, image_dir='/nonexistent')
+LAGER = MENU.lookup_label('BEER > Lager')
+STOUT = MENU.lookup_label('BEER > Stout')
+
+
+def test_lines_aggregate_by_item():
+    order = Order()
+    order.add(LAGER)
+    order.add(STOUT)
+    line = order.add(LAGER, 2)
+    assert line.quantity == 3
+    assert len(order) == 2
+    assert order.item_count == 4
+    assert order.total == Money(12500)
+    assert isinstance(order.total, Money)
+    assert order.summary() == "BEER > Lager x3 - R90.00\nBEER > Stout - R35.00"
+
+
+def test_remove_and_undo_take_off_the_latest_units():
+    order = Order()
+    order.add(LAGER)
+    order.add(STOUT)
+    order.add(LAGER)
+    assert order.undo_last() == 'BEER > Lager'
+    assert order.get('BEER > Lager').quantity == 1
+    assert order.remove('BEER > Lager') is None
+    assert order.get('BEER > Lager') is None
+    assert order.undo_last() == 'BEER > Stout'
+    assert order.undo_last() is None
+    assert order.remove('BEER > Cider') is None
+    assert not order
+
+
+def test_reprice_moves_lines_to_the_new_menu():
+    order = Order()
+    order.add(LAGER, 2)
+    gone = LAGER._replace(label='BEER > Old Ale', path=('BEER', 'Old Ale'))
+    order.add(gone)
+    new_menu = MenuIndex({'BEER': {'Lager': {'price': Money(3200)}}}, image_dir='/nonexistent')
+    assert order.reprice(new_menu) == [('BEER > Lager', Money(3000), Money(3200))]
+    assert order.total == Money(3200) * 2 + Money(3000)
+    # Items no longer on the menu keep their price
+    assert order.get('BEER > Old Ale').item is gone
+
+
+@pytest.mark.parametrize('label, quantity, total, text', [
+    ('BEER > Lager', 1, Money(3000), "BEER > Lager - R30.00"),
+    ('BEER > Lager', 3, Money(9000), "BEER > Lager x3 - R90.00"),
+    ('WINE > Rosé - Glass', 2, Money(9000), "WINE > Rosé - Glass x2 - R90.00"),
+])
+def test_order_lines_round_trip(label, quantity, total, text):
+    assert format_order_line(label, quantity, total) == text
+    assert parse_order_line(text) == (label, quantity, total)
+
+
+def test_parse_older_order_lines():
+    assert parse_order_line("BEER > Lager - R25") == ('BEER > Lager', 1, Money(2500))
+    assert parse_order_line("  BEER > Lager - 1,250.5 ") == ('BEER > Lager', 1, Money(125050))
+    assert parse_order_line("no price here") is None
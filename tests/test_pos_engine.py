@@ -0,0 +1,117 @@
+import os
+import pytest
+from money import Money
+from menu_index import MenuIndex
+from journal import Journal
+from tabs import TabManager, WALK_IN
+from pos_engine import PosEngine, PaymentError
+from transaction_logger import TransactionLogger
+
+MENU = MenuIndex({
+    'BEER': {'Lager': {'price': Money(3000)}, 'Stout': {'price': Money(3500)}},
+}, image_dir='/nonexistent')
+
+
+@pytest.fixture
+def till(make_till, tmp_path):
+    """A PosEngine over a till with one member, Ann (R100, 10% discount), and a running logger."""
+    user_management = make_till('POS1')
+    user_management.add_user('Ann', '', '', 'ANN-1', 10, Money(10000))
+    logger = TransactionLogger({
+        'directory': str(tmp_path / 'transactions'), 'fsync': 'interval', 'fsync_interval': 1.0,
+        'durable_timeout': 2.0
+    })
+    logger.start()
+    tabs = TabManager(Journal(str(tmp_path / 'tabs.journal'), fsync='never'))
+    yield PosEngine(MENU, user_management, tabs, logger)
+    logger.stop()
+
+
+def logged(engine):
+    """Text of every transaction log written so far."""
+    directory = engine.transaction_logger.config['directory']
+    engine.transaction_logger.stop()
+    engine.transaction_logger.start()
+    if not os.path.exists(directory):
+        return ''
+    return ''.join(open(os.path.join(directory, name)).read() for name in sorted(os.listdir(directory)))
+
+
+def test_cash_sale_gives_change_and_is_logged(till):
+    till.add('BEER > Lager', 2)
+    till.add('BEER > Stout')
+    receipt = till.pay_cash('100')
+    assert (receipt.total, receipt.amount_received, receipt.change) == (Money(9500), Money(10000), Money(500))
+    assert [str(line) for line in receipt.order] == ["BEER > Lager x2 - R60.00", "BEER > Stout - R35.00"]
+    assert not till.order
+    text = logged(till)
+    assert "Payment Method: cash" in text and "Total Amount: R95.00" in text
+    assert "- BEER > Lager x2 - R60.00" in text
+
+
+def test_cash_short_of_the_total_is_refused(till):
+    till.add('BEER > Lager')
+    with pytest.raises(PaymentError):
+        till.pay_cash('29.99')
+    assert till.order
+
+
+def test_empty_order_and_unknown_items_are_refused(till):
+    with pytest.raises(PaymentError):
+        till.pay_card()
+    with pytest.raises(ValueError):
+        till.add('BEER > Cider')
+
+
+def test_wyvern_sale_debits_the_card_with_the_member_discount(till):
+    till.add('BEER > Lager')
+    quote = till.quote_wyvern(' ANN-1 ')
+    assert (quote.total, quote.discount, quote.amount_due) == (Money(3000), Money(300), Money(2700))
+    receipt = till.pay_wyvern('ANN-1', quote)
+    assert receipt.method == 'wyvern'
+    assert till.user_management.get_user_by_rfid('ANN-1')['balance'] == Money(7300)
+    assert till.tabs.payments == {}
+    assert "Payment Method: wyvern_card_ANN-1" in logged(till)
+
+
+def test_wyvern_quote_checks_the_card(till):
+    till.add('BEER > Lager', 4)
+    with pytest.raises(PaymentError, match='not registered'):
+        till.quote_wyvern('NOBODY')
+    with pytest.raises(PaymentError, match='Insufficient balance'):
+        till.quote_wyvern('ANN-1')
+
+
+def test_wyvern_sale_stays_charged_until_it_is_logged(till):
+    till.transaction_logger.stop()
+    till.transaction_logger.config['durable_timeout'] = 0.1
+    till.add('BEER > Lager')
+    with pytest.raises(PaymentError, match='do not charge the card again'):
+        till.pay_wyvern('ANN-1')
+    assert till.tabs.payments[WALK_IN]['stage'] == 'charged'
+    assert till.user_management.get_user_by_rfid('ANN-1')['balance'] == Money(7300)
+
+
+def test_charged_payment_is_logged_on_recovery(till):
+    till.add('BEER > Lager')
+    till.tabs.set_payment('charged', method='wyvern', card_id='ANN-1', discount=300, promotions=[])
+    messages = till.recover_payments()
+    assert messages == ["Completed the Wyvern payment for the walk-in order that was interrupted"]
+    assert not till.order and till.tabs.payments == {}
+    text = logged(till)
+    assert "Payment Method: wyvern_card_ANN-1" in text and "Discount Amount: R3.00" in text
+
+
+def test_interrupted_charge_is_flagged_on_recovery(till):
+    till.tabs.open('Sam')
+    till.add('BEER > Stout')
+    till.tabs.set_payment('charging', method='wyvern', card_id='ANN-1', amount=3150)
+    till.tabs.switch(WALK_IN)
+    messages = till.recover_payments()
+    assert messages == [
+        "A Wyvern payment of R31.50 for tab 'Sam' was interrupted. "
+        "Check card ANN-1's transaction history before charging it again."
+    ]
+    assert till.tabs.payments == {}
+    assert till.tabs.orders['Sam']
+    assert till.tabs.current == WALK_IN
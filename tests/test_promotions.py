@@ -0,0 +1,147 @@
+import json
+from datetime import datetime, date
+import pytest
+from money import Money
+from menu_index import MenuIndex
+from order_model import Order
+from promotions import PromotionIndex, PromotionError, parse_promotion, is_active, load_promotions
+
+MENU = MenuIndex({
+    'BEER': {'Lager': {'price': Money(3000)}, 'Stout': {'price': Money(3500)}},
+    'KITCHEN': {'Chips': {'Small': {'price': Money(2500)}, 'Large': {'price': Money(4000)}}},
+}, image_dir='/nonexistent')
+
+LAGER, STOUT, SMALL_CHIPS, LARGE_CHIPS = (MENU.lookup_label(label) for label in (
+    'BEER > Lager', 'BEER > Stout', 'KITCHEN > Chips > Small', 'KITCHEN > Chips > Large'
+))
+
+# A Friday evening
+FRIDAY = datetime(2025, 6, 6, 18, 0)
+
+
+def make_order(*items):
+    order = Order()
+    for item, quantity in items:
+        order.add(item, quantity)
+    return order
+
+
+def index(*entries):
+    return PromotionIndex(parse_promotion(entry) for entry in entries)
+
+
+@pytest.mark.parametrize('entry', [
+    {'name': 'No kind', 'value': 10},
+    {'kind': 'free', 'value': 10},
+    {'kind': 'percent', 'value': 120},
+    {'kind': 'bundle', 'value': 50, 'quantity': 1},
+    {'kind': 'amount', 'value': 5, 'start': '17:00'},
+    {'kind': 'amount', 'value': 5, 'days': ['someday']},
+    {'kind': 'amount', 'value': 5, 'from': 'June'},
+])
+def test_invalid_promotions_are_refused(entry):
+    with pytest.raises(PromotionError):
+        parse_promotion(entry)
+
+
+def test_parse_promotion():
+    promotion = parse_promotion({
+        'name': 'Happy hour', 'kind': 'percent', 'value': 20, 'match': 'BEER > Lager',
+        'days': ['Friday', 'sat'], 'start': '17:00', 'end': '19:30'
+    })
+    assert promotion.match == (('BEER', 'Lager'),)
+    assert promotion.value == Money.from_rands(20)
+    assert promotion.days == {4, 5}
+    assert (promotion.start, promotion.end) == (17 * 60, 19 * 60 + 30)
+    assert parse_promotion({'kind': 'amount', 'value': 5}).match == ((),)
+
+
+def test_time_and_date_windows():
+    happy_hour = parse_promotion({'kind': 'amount', 'value': 5, 'days': ['fri'], 'start': '17:00', 'end': '19:00'})
+    assert FRIDAY.weekday() == 4
+    assert is_active(happy_hour, FRIDAY)
+    assert not is_active(happy_hour, FRIDAY.replace(hour=19))
+    assert not is_active(happy_hour, FRIDAY.replace(day=7))
+
+    # A window past midnight belongs to the day it started
+    late = parse_promotion({'kind': 'amount', 'value': 5, 'days': ['fri'], 'start': '22:00', 'end': '02:00'})
+    assert is_active(late, FRIDAY.replace(hour=23))
+    assert is_active(late, datetime(2025, 6, 7, 1, 30))
+    assert not is_active(late, datetime(2025, 6, 6, 1, 30))
+    assert not is_active(late, FRIDAY)
+
+    june = parse_promotion({'kind': 'amount', 'value': 5, 'from': '2025-06-01', 'until': '2025-06-30'})
+    assert is_active(june, FRIDAY)
+    assert not is_active(june, datetime(2025, 7, 1, 12, 0))
+
+
+def test_each_line_gets_its_best_promotion():
+    promotions = index(
+        {'name': 'Beer 10%', 'kind': 'percent', 'value': 10, 'match': ['BEER']},
+        {'name': 'Lager R20', 'kind': 'price', 'value': 20, 'match': ['BEER > Lager']},
+        {'name': 'R5 off', 'kind': 'amount', 'value': 5},
+    )
+    result = promotions.apply(make_order((LAGER, 2), (STOUT, 1), (SMALL_CHIPS, 1)), FRIDAY)
+    assert [(applied.name, applied.label, applied.discount) for applied in result.applied] == [
+        ('Lager R20', 'BEER > Lager', Money(2000)),
+        ('R5 off', 'BEER > Stout', Money(500)),
+        ('R5 off', 'KITCHEN > Chips > Small', Money(500)),
+    ]
+    assert result.discount == Money(3000)
+
+
+def test_inactive_promotions_take_nothing_off():
+    promotions = index({'kind': 'percent', 'value': 50, 'days': ['sat']})
+    result = promotions.apply(make_order((LAGER, 1)), FRIDAY)
+    assert result.discount == Money(0)
+    assert result.applied == ()
+
+
+def test_active_rules_change_at_boundaries():
+    promotions = index({'name': 'Happy hour', 'kind': 'amount', 'value': 10, 'start': '17:00', 'end': '19:00'})
+    order = make_order((LAGER, 1))
+    assert promotions.apply(order, FRIDAY.replace(hour=16, minute=59)).discount == Money(0)
+    assert promotions.apply(order, FRIDAY).discount == Money(1000)
+    assert promotions.apply(order, FRIDAY.replace(hour=18, minute=59)).discount == Money(1000)
+    assert promotions.apply(order, FRIDAY.replace(hour=19)).discount == Money(0)
+
+
+def test_bundles_use_the_dearest_undiscounted_units():
+    promotions = index(
+        {'name': 'Any 3 for R80', 'kind': 'bundle', 'value': 80, 'quantity': 3},
+        {'name': 'Small chips R20', 'kind': 'price', 'value': 20, 'match': ['KITCHEN > Chips > Small']},
+    )
+    order = make_order((LAGER, 2), (STOUT, 2), (SMALL_CHIPS, 1))
+    result = promotions.apply(order, FRIDAY)
+    # Chips have a line promotion; Stout, Stout, Lager make the bundle and one Lager is left over
+    assert [(applied.name, applied.label, applied.discount) for applied in result.applied] == [
+        ('Small chips R20', 'KITCHEN > Chips > Small', Money(500)),
+        ('Any 3 for R80', 'BEER > Stout, BEER > Lager', Money(2000)),
+    ]
+    assert result.discount == Money(2500)
+
+
+def test_bundle_that_saves_nothing_is_not_made():
+    promotions = index({'kind': 'bundle', 'value': 60, 'quantity': 2, 'match': ['BEER']})
+    assert promotions.apply(make_order((LAGER, 2)), FRIDAY) == promotions.apply(Order(), FRIDAY)
+
+
+def test_discount_never_exceeds_the_order_total():
+    promotions = index({'kind': 'bundle', 'value': 10, 'quantity': 2}, {'kind': 'amount', 'value': 100, 'match': ['BEER']})
+    order = make_order((LAGER, 1), (STOUT, 1))
+    assert promotions.apply(order, FRIDAY).discount == order.total
+
+
+def test_load_promotions(tmp_path):
+    assert len(load_promotions(str(tmp_path / 'missing.json'))) == 0
+
+    path = tmp_path / 'promotions.json'
+    path.write_text(json.dumps({'promotions': [
+        {'name': 'Chips R5 off', 'kind': 'amount', 'value': 5, 'match': ['KITCHEN'], 'until': date(2025, 12, 31).isoformat()}
+    ]}))
+    promotions = load_promotions(str(path))
+    assert promotions.apply(make_order((LARGE_CHIPS, 2)), FRIDAY).discount == Money(1000)
+
+    path.write_text('[{"kind": "amount",')
+    with pytest.raises(PromotionError):
+        load_promotions(str(path))
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from quick_keys import SalesRanker
+
+NOW = datetime(2026, 5, 1, 20, 0, 0)
+
+
+def test_recent_sales_outrank_older_ones():
+    ranker = SalesRanker(half_life_minutes=60)
+    # Four lagers two hours ago are worth one now; three stouts now beat them
+    ranker.record('Lager', NOW - timedelta(hours=2), quantity=4)
+    ranker.record('Stout', NOW)
+    ranker.record('Stout', NOW, quantity=2)
+    ranker.record('Cider', NOW - timedelta(hours=1))
+    assert ranker.top(3) == ['Stout', 'Lager', 'Cider']
+    assert ranker.top(1) == ['Stout']
+
+
+def test_scores_stay_finite_over_a_long_run():
+    ranker = SalesRanker(half_life_minutes=1)
+    start = NOW - timedelta(days=365)
+    ranker.record('Lager', start)
+    for day in range(0, 365, 7):
+        ranker.record('Stout', start + timedelta(days=day))
+    ranker.record('Lager', NOW, quantity=2)
+    assert ranker.top(2) == ['Lager', 'Stout']
+
+
+def test_rejected_labels_are_skipped():
+    ranker = SalesRanker()
+    for position, label in enumerate(['A', 'B', 'C', 'D', 'E']):
+        ranker.record(label, NOW + timedelta(minutes=position))
+    assert ranker.top(2, accept=lambda label: label in ('A', 'B')) == ['B', 'A']
+    assert ranker.top(5, accept=lambda label: False) == []
+
+
+def test_seed_from_logs(tmp_path):
+    (tmp_path / 'transactions_2026-04-30.log').write_text(
+        "Timestamp: 2026-04-30 21:00:00\n"
+        "Payment Method: cash\n"
+        "Total Amount: R95.00\n"
+        "\nItems:\n"
+        "- BEER > Lager x2 - R60.00\n"
+        "- BEER > Stout - R35.00\n"
+        + "=" * 80 + "\n"
+        "Timestamp: not a time\n"
+        "- BEER > Cider - R30.00\n"
+    )
+    (tmp_path / 'notes.txt').write_text("- BEER > Lager - R30.00\n")
+    ranker = SalesRanker()
+    seeded = ranker.seed_from_logs(str(tmp_path), normalize=lambda label: label if label != 'BEER > Stout' else None)
+    assert seeded == 2
+    assert ranker.top(5) == ['BEER > Lager']
+    assert SalesRanker().seed_from_logs(str(tmp_path / 'missing')) == 0
@@ -0,0 +1,35 @@
+import time
+import pytest
+from startup_timer import StartupTimer, timing_requested
+
+
+def test_timing_is_requested_by_flag_or_environment(monkeypatch):
+    monkeypatch.delenv('WYVERN_STARTUP_TIMING', raising=False)
+    assert timing_requested(['drinks_ordering.py', '--startup-timing'])
+    assert not timing_requested(['drinks_ordering.py'])
+    monkeypatch.setenv('WYVERN_STARTUP_TIMING', '1')
+    assert timing_requested(['drinks_ordering.py'])
+
+
+def test_phases_are_timed_from_the_previous_mark(capsys):
+    timer = StartupTimer(enabled=True)
+    timer.mark('imports')
+    time.sleep(0.02)
+    timer.mark('database')
+    (first, first_ms, first_total), (second, second_ms, second_total) = timer.phases
+    assert (first, second) == ('imports', 'database')
+    assert second_ms >= 0.02
+    assert second_total == pytest.approx(first_total + second_ms)
+
+    timer.report()
+    output = capsys.readouterr().out.splitlines()
+    assert output[0] == "Startup timing:"
+    assert output[2].split()[0] == 'imports' and output[3].split()[0] == 'database'
+
+
+def test_disabled_timer_records_and_prints_nothing(capsys):
+    timer = StartupTimer()
+    timer.mark('imports')
+    timer.report()
+    assert timer.phases == []
+    assert capsys.readouterr().out == ''
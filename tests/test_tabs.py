@@ -0,0 +1,171 @@
+import pytest
+from money import Money
+from menu_index import MenuIndex
+from journal import Journal
+from tabs import TabManager, WALK_IN
+
+MENU = MenuIndex({
+    'BEER': {'Lager': {'price': Money(3000)}, 'Stout': {'price': Money(3500)}},
+    'KITCHEN': {'Chips': {'Small': {'price': Money(2500)}}},
+}, image_dir='/nonexistent')
+
+LAGER, STOUT, CHIPS = (MENU.lookup_label(label) for label in ('BEER > Lager', 'BEER > Stout', 'KITCHEN > Chips > Small'))
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'tabs.journal')
+
+
+def make_tabs(journal_path):
+    return TabManager(Journal(journal_path, fsync='never'))
+
+
+def restored(journal_path, tabs=None):
+    """A fresh TabManager restored from the journal, as after a restart."""
+    if tabs is not None:
+        tabs.close()
+    new_tabs = make_tabs(journal_path)
+    new_tabs.restore(MENU)
+    return new_tabs
+
+
+def state(tabs):
+    """Every open order's lines, payments and the current order."""
+    orders = {name: [(line.item.label, line.quantity, line.item.price) for line in order] for name, order in tabs.orders.items()}
+    return orders, tabs.payments, tabs.current
+
+
+def test_opening_a_tab_takes_the_walk_in_order_without_its_payment(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.add(LAGER, 2)
+    tabs.set_payment('started', method='cash')
+    assert tabs.open('Sam') == (True, "Tab 'Sam' opened")
+
+    assert tabs.current == 'Sam'
+    assert [(line.item.label, line.quantity) for line in tabs.order] == [('BEER > Lager', 2)]
+    assert not tabs.orders[WALK_IN]
+    assert tabs.payments == {}
+    assert state(restored(journal_path, tabs)) == state(tabs)
+
+
+def test_walk_in_order_being_charged_stays_put(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.add(LAGER)
+    tabs.set_payment('charging', method='wyvern', card_id='ANN-1', amount=3000)
+    success, _ = tabs.open('Sam')
+    assert not success
+    assert tabs.names() == []
+    assert tabs.payments[WALK_IN]['stage'] == 'charging'
+
+
+def test_tabs_survive_a_restart(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.open('Sam')
+    tabs.add(LAGER, 2)
+    tabs.add(CHIPS)
+    tabs.remove('BEER > Lager')
+    tabs.open('Kim', take_walk_in=False)
+    tabs.add(STOUT)
+    assert tabs.switch('Sam') == (True, "Switched to tab 'Sam'")
+    assert tabs.switch('Nobody')[0] is False
+
+    restored_tabs = restored(journal_path, tabs)
+    assert state(restored_tabs) == state(tabs)
+    assert restored_tabs.names() == ['Sam', 'Kim']
+    assert restored_tabs.opened == tabs.opened
+
+
+def test_settling_a_tab_closes_it(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.open('Sam')
+    tabs.add(LAGER)
+    tabs.settle()
+    assert tabs.names() == []
+    assert tabs.current == WALK_IN
+    assert state(restored(journal_path, tabs)) == state(tabs)
+
+
+def test_lines_keep_the_price_they_were_rung_up_at(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.open('Sam')
+    tabs.add(LAGER)
+    tabs.add(LAGER._replace(label='BEER > Old Ale', path=('BEER', 'Old Ale'), price=Money(2800)))
+    tabs.close()
+
+    cheaper = MenuIndex({'BEER': {'Lager': {'price': Money(2500)}}}, image_dir='/nonexistent')
+    restored_tabs = make_tabs(journal_path)
+    restored_tabs.restore(cheaper)
+    assert [(line.item.label, line.item.price) for line in restored_tabs.orders['Sam']] == [
+        ('BEER > Lager', Money(3000)),
+        ('BEER > Old Ale', Money(2800)),
+    ]
+
+
+def test_restore_compacts_the_journal(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.open('Sam')
+    for _ in range(20):
+        tabs.add(LAGER)
+        tabs.undo_last()
+    tabs.add(STOUT)
+    restored_tabs = restored(journal_path, tabs)
+    with open(journal_path) as file:
+        assert len(file.readlines()) == 3  # open, add, switch
+    assert state(restored(journal_path, restored_tabs)) == state(tabs)
+
+
+def test_damaged_journal_tail_is_dropped(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.open('Sam')
+    tabs.add(LAGER)
+    tabs.close()
+    with open(journal_path, 'a') as file:
+        file.write('{"op":"add","tab":"Sam","lab')
+
+    restored_tabs = make_tabs(journal_path)
+    restored_tabs.restore(MENU)
+    assert [line.item.label for line in restored_tabs.orders['Sam']] == ['BEER > Lager']
+    restored_tabs.add(STOUT)
+    assert state(restored(journal_path, restored_tabs))[0]['Sam'] == [
+        ('BEER > Lager', 1, Money(3000)), ('BEER > Stout', 1, Money(3500))
+    ]
+
+
+def test_walk_in_order_and_its_payment_survive_a_restart(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.add(LAGER, 3)
+    tabs.undo_last()
+    tabs.add(CHIPS)
+    tabs.set_payment('charged', method='wyvern', card_id='ANN-1', discount=0, promotions=[])
+    restored_tabs = restored(journal_path, tabs)
+    assert state(restored_tabs) == state(tabs)
+    assert restored_tabs.payments[WALK_IN]['stage'] == 'charged'
+    assert restored_tabs.current == WALK_IN
+
+
+def test_cancelled_and_cleared_payments_are_not_restored(journal_path):
+    tabs = make_tabs(journal_path)
+    tabs.open('Sam')
+    tabs.add(LAGER)
+    tabs.set_payment('started', method='cash')
+    tabs.set_payment('cancelled')
+    tabs.switch(WALK_IN)
+    tabs.add(STOUT)
+    tabs.set_payment('started', method='card')
+    tabs.clear()
+    restored_tabs = restored(journal_path, tabs)
+    assert restored_tabs.payments == {}
+    assert state(restored_tabs) == state(tabs)
+
+
+def test_journal_is_compacted_as_orders_are_settled(journal_path, monkeypatch):
+    monkeypatch.setattr('tabs.COMPACT_AFTER', 10)
+    tabs = make_tabs(journal_path)
+    for _ in range(6):
+        tabs.add(LAGER)
+        tabs.add(STOUT)
+        tabs.settle()
+    with open(journal_path) as file:
+        assert len(file.readlines()) < 10
+    assert state(restored(journal_path, tabs)) == state(tabs)
@@ -0,0 +1,88 @@
+import socket
+import threading
+import time
+import pytest
+from money import Money
+from wallet_service import (
+    WalletServer, WalletClient, WalletOutcomeUnknown, load_network_config, server_handshake, recv_frame
+)
+
+SECRET = 'test-secret'
+
+
+@pytest.fixture
+def wallet(make_till):
+    """A wallet server over a fresh till with one member, Ann, and a client for it."""
+    user_management = make_till('SERVER')
+    user_management.add_user('Ann', '', '', 'ANN-1', 0, Money(5000))
+    server = WalletServer(user_management, '127.0.0.1', 0, dict(load_network_config(), secret=SECRET))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = WalletClient(*server.server_address, secret=SECRET)
+    yield server, client
+    server.shutdown()
+    server.server_close()
+
+
+def test_reads_and_writes_go_through_the_server(wallet):
+    server, client = wallet
+    ann = client.call('get_user_by_rfid', 'ANN-1')
+    assert ann['balance'] == Money(5000)
+    assert client.call('update_balance', ann['id'], -250, 'purchase', 'Beer') == [True, "Balance updated successfully"]
+    assert server.user_management.get_user_by_rfid('ANN-1')['balance'] == Money(4750)
+
+
+def test_connection_closed_by_the_server_is_not_reused(wallet):
+    server, client = wallet
+    ann = client.call('get_user_by_rfid', 'ANN-1')
+
+    # As after a server restart: the pooled connection's other end is gone
+    listener = socket.create_server(('127.0.0.1', 0))
+    stale = socket.create_connection(listener.getsockname())
+    listener.accept()[0].close()
+    listener.close()
+    client.pool.put_nowait((stale, stale.makefile('rb')))
+    time.sleep(0.05)
+
+    assert client.call('update_balance', ann['id'], -100, 'purchase', 'Beer')[0]
+    assert server.user_management.get_user_by_rfid('ANN-1')['balance'] == Money(4900)
+
+
+def test_resent_write_is_made_once(wallet):
+    server, _ = wallet
+    ann = server.user_management.get_user_by_rfid('ANN-1')
+    request = {'id': 1, 'op': 'update_balance', 'args': [ann['id'], -300, 'purchase', 'Beer'], 'key': 'abc'}
+    first = server.dispatch(request)
+    second = server.dispatch(dict(request, id=2))
+    assert first['ok'] and second['ok'] and second['id'] == 2
+    assert server.user_management.get_user_by_rfid('ANN-1')['balance'] == Money(4700)
+
+
+def test_write_without_a_reply_has_an_unknown_outcome():
+    # A server that takes each write and drops the connection without replying
+    listener = socket.create_server(('127.0.0.1', 0))
+    network = dict(load_network_config(), secret=SECRET)
+
+    def swallow_requests():
+        for _ in range(2):
+            conn, address = listener.accept()
+            sock_file = conn.makefile('rb')
+            if server_handshake(conn, sock_file, address, network):
+                recv_frame(sock_file)
+            sock_file.close()
+            conn.close()
+
+    threading.Thread(target=swallow_requests, daemon=True).start()
+    client = WalletClient(*listener.getsockname(), secret=SECRET)
+    with pytest.raises(WalletOutcomeUnknown):
+        client.call('update_balance', 1, -100, 'purchase', 'Beer')
+    listener.close()
+
+
+def test_write_to_an_unreachable_server_is_not_unknown():
+    listener = socket.create_server(('127.0.0.1', 0))
+    address = listener.getsockname()
+    listener.close()
+    client = WalletClient(*address, secret=SECRET)
+    with pytest.raises(ConnectionError) as error:
+        client.call('update_balance', 1, -100, 'purchase', 'Beer')
+    assert not isinstance(error.value, WalletOutcomeUnknown)
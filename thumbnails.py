@@ -0,0 +1,118 @@
+import os
+import queue
+import hashlib
+import logging
+import threading
+import configparser
+import tkinter as tk
+from collections import OrderedDict
+
+
+def load_thumbnail_config(config_file='settings.cfg'):
+    """Load thumbnail settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'enabled': config.getboolean('Thumbnails', 'enabled', fallback=True),
+        'directory': config.get('Thumbnails', 'directory', fallback='thumbnails'),
+        'size': config.getint('Thumbnails', 'size', fallback=48),
+        'max_images': config.getint('Thumbnails', 'max_images', fallback=128)
+    }
+
+
+class ThumbnailCache:
+    """Small button images for menu items, decoded from images/ at most once.
+
+    Thumbnails are written as PNGs to an on-disk cache keyed by the source
+    file's path, mtime and size, so Tk can load them directly on later runs
+    without PIL. Missing thumbnails are made by a background thread; PIL is
+    only imported there. Loaded PhotoImages live in a bounded LRU, and
+    get() never decodes on the Tk thread: it returns None and calls
+    on_ready(source) via root.after() once the thumbnail exists.
+    """
+
+    def __init__(self, root, config=None):
+        self.root = root
+        self.config = config or load_thumbnail_config()
+        self.logger = logging.getLogger(__name__)
+        self.images = OrderedDict()
+        self.pending = set()
+        self.requests = queue.Queue()
+        self.thread = None
+        self.disabled = False
+
+    def thumbnail_path(self, source):
+        stat = os.stat(source)
+        key = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|{self.config['size']}"
+        name = hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+        return os.path.join(self.config['directory'], f"{name}.png")
+
+    def get(self, source, on_ready=None):
+        """Return a PhotoImage for source, or None if it is not ready yet."""
+        if self.disabled or not source:
+            return None
+        try:
+            thumbnail = self.thumbnail_path(source)
+        except OSError:
+            return None
+
+        image = self.images.get(thumbnail)
+        if image is not None:
+            self.images.move_to_end(thumbnail)
+            return image
+
+        if os.path.exists(thumbnail):
+            try:
+                image = tk.PhotoImage(file=thumbnail)
+            except tk.TclError as e:
+                self.logger.warning(f"Unreadable thumbnail {thumbnail}: {e}")
+                os.remove(thumbnail)
+                return None
+            self.images[thumbnail] = image
+            # Evicted images are redrawn from disk the next time their level is shown
+            while len(self.images) > self.config['max_images']:
+                self.images.popitem(last=False)
+            return image
+
+        if thumbnail not in self.pending:
+            self.pending.add(thumbnail)
+            self.requests.put((source, thumbnail, on_ready))
+            self.start()
+        return None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run_worker_loop, daemon=True)
+        self.thread.start()
+
+    def run_worker_loop(self):
+        while True:
+            source, thumbnail, on_ready = self.requests.get()
+            try:
+                self.make_thumbnail(source, thumbnail)
+            except ImportError:
+                self.logger.warning("Pillow is not installed; only cached thumbnails will be shown")
+                self.disabled = True
+                return
+            except Exception as e:
+                self.logger.error(f"Error making thumbnail for {source}: {e}")
+                continue
+            self.pending.discard(thumbnail)
+            if on_ready:
+                self.root.after(0, lambda source=source, on_ready=on_ready: on_ready(source))
+
+    def make_thumbnail(self, source, thumbnail):
+        from PIL import Image
+
+        directory = self.config['directory']
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        size = self.config['size']
+        with Image.open(source) as image:
+            image.draft('RGB', (size * 2, size * 2))
+            image = image.convert('RGB')
+            image.thumbnail((size, size))
+            temp_path = thumbnail + '.tmp'
+            image.save(temp_path, 'PNG')
+        os.replace(temp_path, thumbnail)
@@ -0,0 +1,157 @@
+import os
+import time
+import queue
+import logging
+import threading
+import configparser
+
+# Entries written per batch before the file is flushed
+MAX_BATCH = 64
+
+# Separator between log entries, as read by transaction_sync
+ENTRY_SEPARATOR = "=" * 80
+
+
+def load_log_config(config_file='settings.cfg'):
+    """Load transaction log settings, falling back to defaults when not configured."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'directory': config.get('TransactionLog', 'directory', fallback='transactions'),
+        # always: fsync every batch; interval: at most every fsync_interval seconds; never: leave it to the OS
+        'fsync': config.get('TransactionLog', 'fsync', fallback='interval'),
+        'fsync_interval': config.getfloat('TransactionLog', 'fsync_interval', fallback=1.0),
+        # Longest a checkout waits for a durable entry to reach the disk
+        'durable_timeout': config.getfloat('TransactionLog', 'durable_timeout', fallback=5.0)
+    }
+
+
+class TransactionLogger:
+    """Appends transaction log entries from a background writer thread.
+
+    The till only formats the entry and puts it on a queue. The writer keeps
+    the day's file open, writes whatever has queued up as one batch, and
+    switches to a new file when an entry's date changes. How often batches
+    are fsynced is set in the [TransactionLog] section of settings.cfg;
+    an entry logged as durable is fsynced with its batch whatever the policy
+    (unless it is never) and confirmed to the caller.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or load_log_config()
+        self.logger = logging.getLogger(__name__)
+        self.entries = queue.Queue()
+        self.thread = None
+        self.log_file = None
+        self.log_date = None
+        self.last_fsync = 0.0
+        self.unsynced = False
+
+    def start(self):
+        """Start the writer thread."""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run_writer_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Write out everything queued, fsync and close the file."""
+        if not self.thread:
+            return
+        self.entries.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def log(self, date_str, entry, durable=False):
+        """Queue one formatted entry for the transactions_<date_str>.log file.
+
+        With durable, returns a threading.Event that is set once the entry
+        has been written and fsynced. It is never set if the write fails.
+        """
+        written = threading.Event() if durable else None
+        self.entries.put((date_str, entry, written))
+        return written
+
+    def log_durably(self, date_str, entry):
+        """Log one entry and wait for it to reach the disk. Returns False if it did not in time."""
+        return self.log(date_str, entry, durable=True).wait(self.config['durable_timeout'])
+
+    def run_writer_loop(self):
+        running = True
+        while running:
+            # With unsynced writes pending, wake up in time to fsync them
+            try:
+                if self.unsynced:
+                    batch = [self.entries.get(timeout=self.config['fsync_interval'])]
+                else:
+                    batch = [self.entries.get()]
+            except queue.Empty:
+                self.sync()
+                continue
+
+            # Group everything that queued up while the last batch was written
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.entries.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = [entry for entry in batch if entry is not None]
+
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.logger.error(f"Error writing transaction log: {e}")
+                print(f"Error logging transaction: {str(e)}")
+
+        self.close()
+
+    def write_batch(self, batch):
+        waiting = []
+        for date_str, entry, written in batch:
+            if date_str != self.log_date:
+                self.open_day(date_str)
+            self.log_file.write(entry + "\n" + ENTRY_SEPARATOR + "\n")
+            # An earlier day's file is fsynced when open_day closes it
+            if written is not None:
+                waiting.append(written)
+
+        if self.log_file and batch:
+            self.log_file.flush()
+            policy = self.config['fsync']
+            if policy == 'always' or (waiting and policy != 'never'):
+                self.sync()
+            elif policy == 'interval':
+                self.unsynced = True
+                if time.monotonic() - self.last_fsync >= self.config['fsync_interval']:
+                    self.sync()
+
+        for written in waiting:
+            written.set()
+
+    def sync(self):
+        """fsync the open file so written entries survive a power cut."""
+        if self.log_file:
+            os.fsync(self.log_file.fileno())
+        self.last_fsync = time.monotonic()
+        self.unsynced = False
+
+    def open_day(self, date_str):
+        """Close the current day's file and open the one for date_str."""
+        self.close()
+        directory = self.config['directory']
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.log_file = open(os.path.join(directory, f'transactions_{date_str}.log'), 'a')
+        self.log_date = date_str
+
+    def close(self):
+        if self.log_file:
+            self.log_file.flush()
+            if self.config['fsync'] != 'never':
+                self.sync()
+            self.log_file.close()
+        self.log_file = None
+        self.log_date = None
@@ -5,12 +5,17 @@ from datetime import datetime
 import configparser
 import logging
 import json
+from money import Money
+from order_model import parse_order_line
+from connectivity import ConnectivityManager
 
 class TransactionSync:
     def __init__(self):
         self.config = self.load_config()
         self.last_sync_time = 0
         self.setup_logging()
+        self.connectivity = ConnectivityManager(services=['mysql'])
+        self.connectivity.subscribe(self.on_connectivity_change)
         
     def setup_logging(self):
         """Setup logging configuration."""
@@ -52,8 +57,14 @@ class TransactionSync:
             return connection
         except mysql.connector.Error as err:
             self.logger.error(f"Error connecting to MySQL: {err}")
+            self.connectivity.report_failure('mysql')
             return None
 
+    def on_connectivity_change(self, service, is_up):
+        """Sync straight away when the MySQL server comes back."""
+        if service == 'mysql' and is_up:
+            self.last_sync_time = 0
+
     def parse_transaction_file(self, file_path):
         """Parse a transaction log file and return list of transactions."""
         transactions = []
@@ -81,16 +92,17 @@ class TransactionSync:
                         elif line.startswith('Payment Method:'):
                             transaction['payment_method'] = line.split(': ')[1].strip()
                         elif line.startswith('Total Amount:'):
-                            transaction['total_amount'] = float(line.split('R')[1].strip())
+                            transaction['total_amount'] = Money.parse(line.split(': ')[1])
                         elif line.startswith('Discount Amount:'):
-                            transaction['discount_amount'] = float(line.split('R')[1].strip())
+                            transaction['discount_amount'] = Money.parse(line.split(': ')[1])
                         elif line.startswith('- '):
-                            item_line = line[2:].strip()
-                            if ' - ' in item_line:
-                                item_name, item_price = item_line.split(' - ')
+                            parsed = parse_order_line(line[2:])
+                            if parsed:
+                                item_name, quantity, item_total = parsed
                                 transaction['items'].append({
-                                    'name': item_name.strip(),
-                                    'price': float(item_price.replace('R', '').strip())
+                                    'name': item_name,
+                                    'quantity': quantity,
+                                    'price_cents': int(item_total) // quantity
                                 })
                     
                     if transaction['timestamp'] and transaction['payment_method'] and transaction['total_amount']:
@@ -101,8 +113,31 @@ class TransactionSync:
             self.logger.error(f"Error parsing transaction file {file_path}: {e}")
             return []
 
+    def migrate_amount_columns(self, cursor):
+        """Add integer-cents amount columns to tables created with DECIMAL amounts.
+
+        The DECIMAL columns stay and are still written, so reports that read
+        them keep working.
+        """
+        cursor.execute("SHOW COLUMNS FROM transactions LIKE 'total_cents'")
+        if cursor.fetchone():
+            return
+        
+        self.logger.info("Migrating MySQL transaction amounts to integer cents")
+        cursor.execute('''
+            ALTER TABLE transactions
+            ADD COLUMN total_cents BIGINT,
+            ADD COLUMN discount_cents BIGINT
+        ''')
+        cursor.execute('''
+            UPDATE transactions
+            SET total_cents = ROUND(total_amount * 100),
+                discount_cents = ROUND(discount_amount * 100)
+        ''')
+
     def upload_transactions(self):
         """Upload new transactions to MySQL server."""
+        connection = None
         try:
             # Get list of transaction files
             transaction_files = []
@@ -114,6 +149,11 @@ class TransactionSync:
                 self.logger.info("No transaction files found")
                 return
             
+            # Don't wait out a connect timeout on a server known to be down
+            if not self.connectivity.is_up('mysql'):
+                self.logger.info("MySQL server unreachable, will sync when it returns")
+                return
+            
             # Connect to MySQL
             connection = self.get_mysql_connection()
             if not connection:
@@ -130,10 +170,13 @@ class TransactionSync:
                     payment_method VARCHAR(50),
                     total_amount DECIMAL(10,2),
                     discount_amount DECIMAL(10,2),
+                    total_cents BIGINT,
+                    discount_cents BIGINT,
                     items JSON,
                     sync_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            self.migrate_amount_columns(cursor)
             
             # Process each transaction file
             for file_name in transaction_files:
@@ -152,17 +195,22 @@ class TransactionSync:
                     ))
                     
                     if not cursor.fetchone():
-                        # Insert new transaction
+                        # Insert new transaction, with amounts in Rand and in cents
+                        total = transaction['total_amount']
+                        discount = transaction['discount_amount']
                         cursor.execute('''
                             INSERT INTO transactions 
-                            (pos_id, timestamp, payment_method, total_amount, discount_amount, items)
-                            VALUES (%s, %s, %s, %s, %s, %s)
+                            (pos_id, timestamp, payment_method, total_amount, discount_amount,
+                             total_cents, discount_cents, items)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                         ''', (
                             self.config['pos_id'],
                             transaction['timestamp'],
                             transaction['payment_method'],
-                            transaction['total_amount'],
-                            transaction.get('discount_amount'),
+                            total.to_decimal(),
+                            discount.to_decimal() if discount is not None else None,
+                            int(total),
+                            int(discount) if discount is not None else None,
                             json.dumps(transaction['items'])
                         ))
             
@@ -180,6 +228,7 @@ class TransactionSync:
     def run_sync_loop(self):
         """Run the sync loop continuously."""
         self.logger.info("Starting transaction sync service")
+        self.connectivity.start()
         while True:
             try:
                 current_time = time.time()
@@ -1,13 +1,174 @@
+import os
+import uuid
 import sqlite3
+import functools
+import threading
 from decimal import Decimal
 import json
 from datetime import datetime
+from money import Money
+from ledger_archive import load_archive_config, archive_path, archived_months
+from wallet_service import load_wallet_config, WalletClient
+from ledger_sync import load_replication_config, merge_ranges, MEMBER_EVENTS
+
+# Bump when a migration in migrate_database changes the stored schema.
+SCHEMA_VERSION = 6
+
+# Money columns hold integer cents (see money.Money)
+USERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        phone TEXT,
+        email TEXT,
+        balance INTEGER DEFAULT 0,
+        discount_rate DECIMAL(5,2) DEFAULT 0.00,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        event_baseline INTEGER DEFAULT 0,
+        member_uid TEXT,
+        profile_version TEXT
+    )
+'''
+
+TRANSACTIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        amount INTEGER,
+        type TEXT,
+        description TEXT,
+        payment_method TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        event_id TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+'''
+
+# get_ledger's running balance looks up each user's earlier rows by time
+TRANSACTIONS_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_time
+    ON transactions (user_id, timestamp)
+'''
+
+# Immutable member, tag, debit and top-up events, replicated between
+# terminals by ledger_sync.py. Events name the member by member_uid, which is
+# the same on every terminal; user_id is this terminal's row for it (NULL
+# until the member's own event arrives). Balances are projections:
+# event_baseline + compacted_balances + SUM(amount).
+LEDGER_EVENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS ledger_events (
+        event_id TEXT PRIMARY KEY,
+        origin TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        user_id INTEGER,
+        amount INTEGER,
+        type TEXT,
+        description TEXT,
+        created_at TIMESTAMP,
+        member_uid TEXT,
+        details TEXT,
+        UNIQUE (origin, seq)
+    )
+'''
+
+# Each member's total of the balance events from one origin that were
+# compacted away (see ledger_archive.py), up to ledger_state.compacted_seq
+COMPACTED_BALANCES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS compacted_balances (
+        origin TEXT,
+        member_uid TEXT,
+        amount INTEGER DEFAULT 0,
+        PRIMARY KEY (origin, member_uid)
+    )
+'''
+
+# Columns of an event as exchanged between terminals
+EVENT_COLUMNS = 'event_id, origin, seq, member_uid, amount, type, description, created_at, details'
+
+# Member fields carried whole by member and member_update events
+PROFILE_FIELDS = ('name', 'phone', 'email', 'discount_rate')
+
+# Databases already created and migrated by this process
+_ready_databases = set()
+_setup_lock = threading.Lock()
+
+def wallet_operation(method):
+    """Run the method on the shared wallet service when in client mode."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.wallet is not None:
+            return self.wallet.call(method.__name__, *args, **kwargs)
+        self.ensure_database()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+def server_only(method):
+    """Run the method only where users.db lives; the wallet service does not offer it to other tills."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.wallet is not None:
+            return False, "This can only be done on the wallet server"
+        self.ensure_database()
+        return method(self, *args, **kwargs)
+    return wrapper
 
 class UserManagement:
-    def __init__(self):
+    def __init__(self, local=False, defer_setup=False):
         self.db_name = 'users.db'
-        self.initialize_database()
-        self.migrate_database()
+        self.archive_dir = load_archive_config()['archive_dir']
+        self.origin = load_replication_config()['origin']
+        
+        # With [Wallet] mode = client, balances live in wallet_service.py on
+        # another machine and every operation below is forwarded there
+        self.wallet = None
+        wallet_config = load_wallet_config()
+        if wallet_config['mode'] == 'client' and not local:
+            self.wallet = WalletClient(
+                wallet_config['host'],
+                wallet_config['port'],
+                wallet_config['pool_size'],
+                wallet_config['timeout']
+            )
+            return
+        
+        # The till defers this until after its first frame (see warm_up)
+        if not defer_setup:
+            self.ensure_database()
+
+    def ensure_database(self):
+        """Create and migrate the database once per process, and only if it is not current."""
+        key = os.path.abspath(self.db_name)
+        if key in _ready_databases:
+            return
+        with _setup_lock:
+            if key in _ready_databases:
+                return
+            if self.schema_version() != SCHEMA_VERSION:
+                self.initialize_database()
+                self.migrate_database()
+            _ready_databases.add(key)
+
+    def schema_version(self):
+        """Return the database's user_version, or None if it has no users table yet."""
+        if not os.path.exists(self.db_name):
+            return None
+        conn = sqlite3.connect(self.db_name)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'")
+            if not cursor.fetchone():
+                return None
+            cursor.execute("PRAGMA user_version")
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def warm_up(self):
+        """Do the slow first-use work ahead of the first sale: database setup or a wallet connection."""
+        if self.wallet is not None:
+            self.wallet.warm_up()
+        else:
+            self.ensure_database()
 
     def migrate_database(self):
         """Migrate the database to add new columns if they don't exist."""
@@ -27,30 +188,182 @@ class UserManagement:
                 ''')
                 conn.commit()
                 print("Migration completed successfully")
+
+            cursor.execute("PRAGMA user_version")
+            version = cursor.fetchone()[0]
+            
+            # Convert Rand DECIMAL columns to integer cents
+            if version < 1:
+                self.migrate_to_integer_cents(cursor)
+                cursor.execute("PRAGMA user_version = 1")
+                conn.commit()
+            
+            # Existing balances become the baseline that ledger events add to
+            if version < 2:
+                self.migrate_to_ledger_events(cursor)
+                cursor.execute("PRAGMA user_version = 2")
+                conn.commit()
+            
+            # Recreate the running-balance index that rebuilding transactions
+            # in version 1 dropped
+            if version < 3:
+                cursor.execute(TRANSACTIONS_INDEX)
+                cursor.execute("PRAGMA user_version = 3")
+                conn.commit()
+            
+            # Events name members by a uid that is the same on every terminal
+            if version < 4:
+                self.migrate_to_member_uids(cursor)
+                cursor.execute("PRAGMA user_version = 4")
+                conn.commit()
+            
+            # Old events acknowledged by every peer can be compacted away
+            if version < 5:
+                self.migrate_to_compacted_events(cursor)
+                cursor.execute("PRAGMA user_version = 5")
+                conn.commit()
+            
+            # Compacted balance events are kept as per-member totals, and
+            # acks from peers that stopped syncing expire
+            if version < 6:
+                self.migrate_to_compacted_balances(cursor)
+                cursor.execute("PRAGMA user_version = 6")
+                conn.commit()
             
+            # Indexes go last: rebuilding a table above drops the indexes on it
+            self.create_indexes(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+
         except Exception as e:
             print(f"Error during migration: {str(e)}")
         finally:
             conn.close()
 
+    def create_indexes(self, cursor):
+        """Create the indexes the ledger queries rely on, if they are missing."""
+        cursor.execute(TRANSACTIONS_INDEX)
+        # Replicated events find their member by uid
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_users_member_uid
+            ON users (member_uid)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ledger_events_member
+            ON ledger_events (member_uid)
+        ''')
+
+    def migrate_to_integer_cents(self, cursor):
+        """Rebuild the money columns as INTEGER cents.
+
+        Older databases stored balances and amounts as DECIMAL Rand values,
+        which SQLite keeps as REAL and which drift under repeated arithmetic.
+        """
+        cursor.execute("PRAGMA table_info(users)")
+        column_types = {column[1]: column[2].upper() for column in cursor.fetchall()}
+        if column_types.get('balance') == 'INTEGER':
+            return
+
+        print("Converting balances to integer cents...")
+        cursor.execute("BEGIN TRANSACTION")
+
+        # Copy into fresh tables and swap them in, so foreign keys on
+        # rfid_tags keep pointing at "users"
+        cursor.execute(USERS_TABLE.format(table='users_cents'))
+        cursor.execute(TRANSACTIONS_TABLE.format(table='transactions_cents'))
+
+        cursor.execute('''
+            INSERT INTO users_cents (id, name, phone, email, balance, discount_rate, created_at)
+            SELECT id, name, phone, email, CAST(ROUND(COALESCE(balance, 0) * 100) AS INTEGER),
+                   discount_rate, created_at
+            FROM users
+        ''')
+        cursor.execute('''
+            INSERT INTO transactions_cents (id, user_id, amount, type, description, payment_method, timestamp)
+            SELECT id, user_id, CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER),
+                   type, description, payment_method, timestamp
+            FROM transactions
+        ''')
+
+        cursor.execute("DROP TABLE users")
+        cursor.execute("DROP TABLE transactions")
+        cursor.execute("ALTER TABLE users_cents RENAME TO users")
+        cursor.execute("ALTER TABLE transactions_cents RENAME TO transactions")
+        print("Balance conversion completed successfully")
+
+    def migrate_to_ledger_events(self, cursor):
+        """Add the event columns to databases created before replication."""
+        cursor.execute("PRAGMA table_info(users)")
+        if 'event_baseline' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE users ADD COLUMN event_baseline INTEGER DEFAULT 0")
+        cursor.execute("PRAGMA table_info(transactions)")
+        if 'event_id' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE transactions ADD COLUMN event_id TEXT")
+        cursor.execute('''
+            UPDATE users
+            SET event_baseline = balance - COALESCE(
+                (SELECT SUM(amount) FROM ledger_events e WHERE e.user_id = users.id), 0)
+        ''')
+
+    def migrate_to_member_uids(self, cursor):
+        """Give every member a uid and key the events already held by it.
+
+        Existing members are named after their first RFID tag, so terminals
+        started from copies of the same users.db agree on who is who.
+        """
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'member_uid' not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN member_uid TEXT")
+        if 'profile_version' not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN profile_version TEXT")
+        cursor.execute("PRAGMA table_info(ledger_events)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'member_uid' not in columns:
+            cursor.execute("ALTER TABLE ledger_events ADD COLUMN member_uid TEXT")
+        if 'details' not in columns:
+            cursor.execute("ALTER TABLE ledger_events ADD COLUMN details TEXT")
+        cursor.execute('''
+            UPDATE users
+            SET member_uid = 'tag:' || (SELECT MIN(rfid) FROM rfid_tags r WHERE r.user_id = users.id)
+            WHERE member_uid IS NULL
+        ''')
+        cursor.execute("UPDATE users SET member_uid = lower(hex(randomblob(16))) WHERE member_uid IS NULL")
+        cursor.execute('''
+            UPDATE ledger_events
+            SET member_uid = (SELECT member_uid FROM users u WHERE u.id = ledger_events.user_id)
+            WHERE member_uid IS NULL
+        ''')
+
+    def migrate_to_compacted_events(self, cursor):
+        """Add the per-origin compaction floor to ledger_state."""
+        cursor.execute("PRAGMA table_info(ledger_state)")
+        if 'compacted_seq' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE ledger_state ADD COLUMN compacted_seq INTEGER DEFAULT 0")
+
+    def migrate_to_compacted_balances(self, cursor):
+        """Add compacted_balances and the time of each peer's last ack."""
+        cursor.execute(COMPACTED_BALANCES_TABLE)
+        cursor.execute("PRAGMA table_info(peer_acks)")
+        if 'updated_at' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE peer_acks ADD COLUMN updated_at TIMESTAMP")
+            cursor.execute("UPDATE peer_acks SET updated_at = CURRENT_TIMESTAMP")
+
     def initialize_database(self):
         """Create the database and tables if they don't exist."""
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
 
+            # Only takes effect on a new, empty database: ledger_archive.py can
+            # then release archived pages without a full VACUUM
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            
+            # WAL lets backups and reports read while the till writes
+            cursor.execute("PRAGMA journal_mode=WAL")
+
             # Create users table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    phone TEXT,
-                    email TEXT,
-                    balance DECIMAL(10,2) DEFAULT 0.00,
-                    discount_rate DECIMAL(5,2) DEFAULT 0.00,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            cursor.execute(USERS_TABLE.format(table='users'))
 
             # Create RFID tags table
             cursor.execute('''
@@ -63,17 +376,43 @@ class UserManagement:
                 )
             ''')
 
-            # Create transaction history table
+            # Create transaction history table; its index is added by migrate_database
+            cursor.execute(TRANSACTIONS_TABLE.format(table='transactions'))
+
+            # Replicated ledger events
+            cursor.execute(LEDGER_EVENTS_TABLE)
+
+            # Last event seq used by each origin, kept by clear_all_data so
+            # event ids are never reused, and the seq up to which its events
+            # have been compacted (see ledger_archive.py)
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    amount DECIMAL(10,2),
-                    type TEXT,
-                    description TEXT,
-                    payment_method TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
+                CREATE TABLE IF NOT EXISTS ledger_state (
+                    origin TEXT PRIMARY KEY,
+                    last_seq INTEGER DEFAULT 0,
+                    compacted_seq INTEGER DEFAULT 0
+                )
+            ''')
+
+            # Each peer's unbroken run of events from every origin, as last
+            # seen, keyed by the peer's [POS] id
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS peer_acks (
+                    peer TEXT,
+                    origin TEXT,
+                    seq INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP,
+                    PRIMARY KEY (peer, origin)
+                )
+            ''')
+
+            cursor.execute(COMPACTED_BALANCES_TABLE)
+
+            # Sum of each user's archived ledger rows (see ledger_archive.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS balance_checkpoints (
+                    user_id INTEGER PRIMARY KEY,
+                    balance INTEGER DEFAULT 0,
+                    as_of TIMESTAMP
                 )
             ''')
 
@@ -85,8 +424,10 @@ class UserManagement:
         finally:
             conn.close()
 
-    def add_user(self, name, phone, email, rfid_tag, discount_rate=0.00, opening_balance=0.00):
-        """Add a new user to the database."""
+    @wallet_operation
+    def add_user(self, name, phone, email, rfid_tag, discount_rate=0.00, opening_balance=0):
+        """Add a new user to the database. opening_balance is in integer cents."""
+        opening_balance = int(opening_balance)
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
@@ -94,26 +435,21 @@ class UserManagement:
             # Start transaction
             cursor.execute("BEGIN TRANSACTION")
             
-            # Insert user with opening balance
-            cursor.execute('''
-                INSERT INTO users (name, phone, email, discount_rate, balance)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, phone, email, discount_rate, opening_balance))
-            
-            user_id = cursor.lastrowid
+            cursor.execute("SELECT 1 FROM rfid_tags WHERE rfid = ?", (rfid_tag,))
+            if cursor.fetchone():
+                conn.rollback()
+                return False, "RFID tag already exists"
             
-            # Insert RFID tag
-            cursor.execute('''
-                INSERT INTO rfid_tags (user_id, rfid)
-                VALUES (?, ?)
-            ''', (user_id, rfid_tag))
+            # The member, their tag and any opening balance are all ledger
+            # events, so every terminal learns about the new member
+            member_uid = uuid.uuid4().hex
+            profile = {'name': name, 'phone': phone, 'email': email, 'discount_rate': str(discount_rate)}
+            self._record_event(cursor, member_uid, 0, 'member', 'Member added', profile)
+            self._record_event(cursor, member_uid, 0, 'tag_add', 'RFID tag added', {'rfid': rfid_tag})
             
-            # If there's an opening balance, record it as a transaction
+            # If there's an opening balance, record it as a ledger event
             if opening_balance > 0:
-                cursor.execute('''
-                    INSERT INTO transactions (user_id, amount, type, description, payment_method)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (user_id, opening_balance, 'deposit', 'Opening balance', 'cash'))
+                self._record_event(cursor, member_uid, opening_balance, 'deposit', 'Opening balance')
             
             conn.commit()
             return True, "User added successfully"
@@ -126,6 +462,7 @@ class UserManagement:
         finally:
             conn.close()
 
+    @wallet_operation
     def get_user_by_rfid(self, rfid_tag):
         """Get user information by RFID tag."""
         try:
@@ -146,7 +483,7 @@ class UserManagement:
                     'name': user[1],
                     'phone': user[2],
                     'email': user[3],
-                    'balance': Decimal(str(user[4])),
+                    'balance': Money(user[4] or 0),
                     'discount_rate': Decimal(str(user[5]))
                 }
             return None
@@ -156,6 +493,7 @@ class UserManagement:
         finally:
             conn.close()
 
+    @wallet_operation
     def get_user_rfid_tags(self, user_id):
         """Get all RFID tags for a user."""
         try:
@@ -176,26 +514,28 @@ class UserManagement:
         finally:
             conn.close()
 
+    @wallet_operation
     def add_rfid_tag(self, user_id, rfid_tag):
         """Add a new RFID tag to a user."""
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT INTO rfid_tags (user_id, rfid)
-                VALUES (?, ?)
-            ''', (user_id, rfid_tag))
+            cursor.execute("SELECT 1 FROM rfid_tags WHERE rfid = ?", (rfid_tag,))
+            if cursor.fetchone():
+                return False, "RFID tag already exists"
+            
+            member_uid = self._member_uid(cursor, user_id)
+            self._record_event(cursor, member_uid, 0, 'tag_add', 'RFID tag added', {'rfid': rfid_tag})
             
             conn.commit()
             return True, "RFID tag added successfully"
-        except sqlite3.IntegrityError:
-            return False, "RFID tag already exists"
         except Exception as e:
             return False, f"Error adding RFID tag: {str(e)}"
         finally:
             conn.close()
 
+    @wallet_operation
     def remove_rfid_tag(self, user_id, rfid_tag):
         """Remove an RFID tag from a user."""
         try:
@@ -203,13 +543,16 @@ class UserManagement:
             cursor = conn.cursor()
             
             cursor.execute('''
-                DELETE FROM rfid_tags
+                SELECT 1 FROM rfid_tags
                 WHERE user_id = ? AND rfid = ?
             ''', (user_id, rfid_tag))
             
-            if cursor.rowcount == 0:
+            if not cursor.fetchone():
                 return False, "RFID tag not found"
             
+            member_uid = self._member_uid(cursor, user_id)
+            self._record_event(cursor, member_uid, 0, 'tag_remove', 'RFID tag removed', {'rfid': rfid_tag})
+            
             conn.commit()
             return True, "RFID tag removed successfully"
         except Exception as e:
@@ -217,35 +560,41 @@ class UserManagement:
         finally:
             conn.close()
 
+    @wallet_operation
     def update_user(self, user_id, name=None, phone=None, email=None, discount_rate=None):
         """Update user information."""
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
             
-            updates = []
-            values = []
+            updates = {}
             
             if name is not None:
-                updates.append("name = ?")
-                values.append(name)
+                updates['name'] = name
             if phone is not None:
-                updates.append("phone = ?")
-                values.append(phone)
+                updates['phone'] = phone
             if email is not None:
-                updates.append("email = ?")
-                values.append(email)
+                updates['email'] = email
             if discount_rate is not None:
-                updates.append("discount_rate = ?")
-                values.append(discount_rate)
+                updates['discount_rate'] = str(discount_rate)
             
             if not updates:
                 return False, "No updates provided"
             
-            values.append(user_id)
-            query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
+            cursor.execute('''
+                SELECT member_uid, name, phone, email, discount_rate
+                FROM users
+                WHERE id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+            if not row:
+                return False, "User not found"
             
-            cursor.execute(query, values)
+            # The event carries the whole profile, so the latest one wins everywhere
+            profile = dict(zip(PROFILE_FIELDS, row[1:]))
+            profile['discount_rate'] = str(profile['discount_rate'])
+            profile.update(updates)
+            self._record_event(cursor, row[0], 0, 'member_update', 'Member details updated', profile)
             conn.commit()
             return True, "User updated successfully"
         except Exception as e:
@@ -253,8 +602,13 @@ class UserManagement:
         finally:
             conn.close()
 
+    @wallet_operation
     def update_balance(self, user_id, amount, transaction_type, description="", card_id=None, order_summary=None):
-        """Update user balance and record transaction."""
+        """Update user balance and record transaction.
+
+        amount is a Money value (integer cents); negative amounts are debits.
+        """
+        amount = int(amount)
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
@@ -262,13 +616,6 @@ class UserManagement:
             # Start transaction
             cursor.execute("BEGIN TRANSACTION")
             
-            # Update user balance
-            cursor.execute('''
-                UPDATE users
-                SET balance = balance + ?
-                WHERE id = ?
-            ''', (amount, user_id))
-            
             # Build transaction description
             full_description = description
             if card_id:
@@ -276,11 +623,9 @@ class UserManagement:
             if order_summary:
                 full_description += f"\nOrder Summary:\n{order_summary}"
             
-            # Record transaction
-            cursor.execute('''
-                INSERT INTO transactions (user_id, amount, type, description)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, amount, transaction_type, full_description))
+            # Record the event and project it onto the balance and history
+            member_uid = self._member_uid(cursor, user_id)
+            self._record_event(cursor, member_uid, amount, transaction_type, full_description)
             
             # Commit transaction
             conn.commit()
@@ -291,36 +636,445 @@ class UserManagement:
         finally:
             conn.close()
 
-    def get_transaction_history(self, user_id, limit=10):
-        """Get transaction history for a user."""
+    def _member_uid(self, cursor, user_id):
+        """Return the uid replicated events use for this terminal's user_id."""
+        cursor.execute("SELECT member_uid FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"User {user_id} not found")
+        return row[0]
+
+    def _record_event(self, cursor, member_uid, amount, transaction_type, description, details=None):
+        """Create a new event from this terminal and apply it. Returns the event id."""
+        # ledger_state outlives clear_all_data, so a seq is never handed out twice
+        cursor.execute("INSERT OR IGNORE INTO ledger_state (origin, last_seq) VALUES (?, 0)", (self.origin,))
+        cursor.execute('''
+            UPDATE ledger_state
+            SET last_seq = MAX(last_seq, (SELECT COALESCE(MAX(seq), 0) FROM ledger_events WHERE origin = ?)) + 1
+            WHERE origin = ?
+        ''', (self.origin, self.origin))
+        cursor.execute("SELECT last_seq FROM ledger_state WHERE origin = ?", (self.origin,))
+        seq = cursor.fetchone()[0]
+        event = (
+            f"{self.origin}:{seq}",
+            self.origin,
+            seq,
+            member_uid,
+            int(amount),
+            transaction_type,
+            description,
+            datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            json.dumps(details) if details is not None else None
+        )
+        self._apply_event(cursor, event)
+        return event[0]
+
+    def _apply_event(self, cursor, event):
+        """Store an event and update the projections. Returns False for duplicates.
+
+        An event for a member whose own event has not arrived yet is stored
+        unprojected and projected when the member event comes in.
+        """
+        event_id, origin, seq, member_uid, amount, transaction_type, description, created_at, details = event
+        cursor.execute("SELECT 1 FROM ledger_events WHERE event_id = ?", (event_id,))
+        if cursor.fetchone():
+            return False
+        # Compacted balance events are already in compacted_balances; member
+        # and tag events are never compacted
+        if transaction_type not in MEMBER_EVENTS:
+            cursor.execute("SELECT compacted_seq FROM ledger_state WHERE origin = ?", (origin,))
+            row = cursor.fetchone()
+            if row and seq <= (row[0] or 0):
+                return False
+        
+        if transaction_type == 'member':
+            profile = json.loads(details or '{}')
+            cursor.execute('''
+                INSERT INTO users (name, phone, email, discount_rate, balance, member_uid, profile_version)
+                SELECT ?, ?, ?, ?, (SELECT COALESCE(SUM(amount), 0) FROM compacted_balances WHERE member_uid = ?), ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM users WHERE member_uid = ?)
+            ''', (profile.get('name') or '', profile.get('phone'), profile.get('email'),
+                  profile.get('discount_rate', 0), member_uid, member_uid, self._event_version(event), member_uid))
+        
+        cursor.execute("SELECT id FROM users WHERE member_uid = ?", (member_uid,))
+        row = cursor.fetchone()
+        user_id = row[0] if row else None
+        cursor.execute(f'''
+            INSERT INTO ledger_events ({EVENT_COLUMNS}, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', tuple(event) + (user_id,))
+        if user_id is None:
+            return True
+        
+        if transaction_type == 'member':
+            # Project the member's events that got here first
+            cursor.execute(f'''
+                SELECT {EVENT_COLUMNS}
+                FROM ledger_events
+                WHERE member_uid = ? AND user_id IS NULL
+                ORDER BY created_at, origin, seq
+            ''', (member_uid,))
+            for waiting in cursor.fetchall():
+                self._project_event(cursor, user_id, waiting)
+            cursor.execute("UPDATE ledger_events SET user_id = ? WHERE member_uid = ? AND user_id IS NULL",
+                           (user_id, member_uid))
+        else:
+            self._project_event(cursor, user_id, event)
+        return True
+
+    def _project_event(self, cursor, user_id, event):
+        """Apply one event to the member, tag, balance and history tables."""
+        event_id, origin, seq, member_uid, amount, transaction_type, description, created_at, details = event
+        if transaction_type == 'member':
+            return
+        if transaction_type == 'member_update':
+            # Last writer wins, by event time then origin and seq
+            version = self._event_version(event)
+            profile = json.loads(details)
+            cursor.execute('''
+                UPDATE users
+                SET name = ?, phone = ?, email = ?, discount_rate = ?, profile_version = ?
+                WHERE id = ? AND COALESCE(profile_version, '') < ?
+            ''', tuple(profile.get(field) for field in PROFILE_FIELDS) + (version, user_id, version))
+        elif transaction_type == 'tag_add':
+            # A removal that arrived before this add still wins if it came after it
+            cursor.execute(f'''
+                SELECT {EVENT_COLUMNS}
+                FROM ledger_events
+                WHERE member_uid = ? AND type = 'tag_remove' AND details = ?
+            ''', (member_uid, details))
+            version = self._event_version(event)
+            if any(self._event_version(removal) > version for removal in cursor.fetchall()):
+                return
+            cursor.execute('''
+                INSERT OR IGNORE INTO rfid_tags (user_id, rfid)
+                VALUES (?, ?)
+            ''', (user_id, json.loads(details)['rfid']))
+        elif transaction_type == 'tag_remove':
+            cursor.execute('''
+                DELETE FROM rfid_tags
+                WHERE user_id = ? AND rfid = ?
+            ''', (user_id, json.loads(details)['rfid']))
+        else:
+            cursor.execute('''
+                UPDATE users
+                SET balance = balance + ?
+                WHERE id = ?
+            ''', (amount, user_id))
+            cursor.execute('''
+                INSERT INTO transactions (user_id, amount, type, description, timestamp, event_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, amount, transaction_type, description, created_at, event_id))
+
+    def _event_version(self, event):
+        """Sort key deciding which member_update is the latest."""
+        return f"{event[7]}|{event[1]}|{event[2]:012d}"
+
+    def apply_events(self, events):
+        """Apply events received from another terminal in one transaction.
+
+        Events are keyed by id, balance events are additive and member
+        updates resolve to the latest, so applying them in any order, or more
+        than once, converges on the same members and balances. Returns the
+        number of events that were new to this terminal.
+        """
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+            cursor.execute("BEGIN TRANSACTION")
+            applied = sum(1 for event in events if self._apply_event(cursor, tuple(event)))
+            conn.commit()
+            return applied
+        except Exception as e:
+            conn.rollback()
+            print(f"Error applying ledger events: {str(e)}")
+            raise
+        finally:
+            conn.close()
+
+    def get_event_ranges(self):
+        """Return {origin: [[first_seq, last_seq], ...]} for the events held here."""
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
+            # Consecutive seqs share the same seq - row_number, so each group is a range
+            cursor.execute('''
+                SELECT origin, MIN(seq), MAX(seq)
+                FROM (
+                    SELECT origin, seq,
+                           seq - ROW_NUMBER() OVER (PARTITION BY origin ORDER BY seq) AS run
+                    FROM ledger_events
+                )
+                GROUP BY origin, run
+                ORDER BY origin, MIN(seq)
+            ''')
+            ranges = {}
+            for origin, first_seq, last_seq in cursor.fetchall():
+                ranges.setdefault(origin, []).append([first_seq, last_seq])
             
+            # Compacted events still count as held
+            cursor.execute("SELECT origin, compacted_seq FROM ledger_state WHERE compacted_seq > 0")
+            for origin, compacted_seq in cursor.fetchall():
+                ranges[origin] = merge_ranges(ranges.get(origin, []) + [[1, compacted_seq]])
+            return ranges
+        finally:
+            conn.close()
+
+    def get_missing_events(self, peer_ranges, limit=500):
+        """Return up to limit events held here that fall outside peer_ranges."""
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+            events = []
+            for origin in self.get_event_ranges():
+                held = peer_ranges.get(origin, [])
+                clause = " OR ".join("seq BETWEEN ? AND ?" for _ in held) or "0"
+                params = [origin] + [seq for seq_range in held for seq in seq_range]
+                cursor.execute(f'''
+                    SELECT {EVENT_COLUMNS}
+                    FROM ledger_events
+                    WHERE origin = ? AND NOT ({clause})
+                    ORDER BY seq
+                    LIMIT ?
+                ''', params + [limit - len(events)])
+                events.extend(cursor.fetchall())
+                if len(events) >= limit:
+                    break
+            return events
+        finally:
+            conn.close()
+
+    def record_peer_ranges(self, peer, ranges):
+        """Remember how far the peer with [POS] id peer holds every origin's events without a gap."""
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+            for origin, origin_ranges in ranges.items():
+                held = origin_ranges[0][1] if origin_ranges and origin_ranges[0][0] <= 1 else 0
+                cursor.execute('''
+                    INSERT INTO peer_acks (peer, origin, seq, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(peer, origin) DO UPDATE
+                    SET seq = MAX(seq, excluded.seq), updated_at = excluded.updated_at
+                ''', (peer, origin, held))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_snapshots(self, peer_ranges):
+        """Return compacted balance totals for each origin compacted past what peer_ranges hold.
+
+        A peer that never held those events, such as a new or rebuilt
+        terminal, can only get their balances this way.
+        """
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+            cursor.execute("SELECT origin, compacted_seq FROM ledger_state WHERE compacted_seq > 0")
+            snapshots = []
+            for origin, compacted_seq in cursor.fetchall():
+                held = peer_ranges.get(origin) or []
+                if held and held[0][0] <= 1 and held[0][1] >= compacted_seq:
+                    continue
+                cursor.execute("SELECT member_uid, amount FROM compacted_balances WHERE origin = ?", (origin,))
+                snapshots.append({'origin': origin, 'through': compacted_seq, 'balances': dict(cursor.fetchall())})
+            return snapshots
+        finally:
+            conn.close()
+
+    def apply_snapshots(self, snapshots):
+        """Adopt compacted balance totals for origins compacted further than here.
+
+        The origin's balance events up to the snapshot's seq are replaced by
+        its totals, so balances come out the same whichever of those events
+        were held here. Returns the number of snapshots adopted.
+        """
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+            cursor.execute("BEGIN TRANSACTION")
+            adopted = 0
+            for snapshot in snapshots:
+                origin, through, balances = snapshot['origin'], snapshot['through'], snapshot['balances']
+                cursor.execute("SELECT compacted_seq FROM ledger_state WHERE origin = ?", (origin,))
+                row = cursor.fetchone()
+                if row and through <= (row[0] or 0):
+                    continue
+                
+                placeholders = ', '.join('?' for _ in MEMBER_EVENTS)
+                cursor.execute(f'''
+                    SELECT member_uid, SUM(amount) FROM ledger_events
+                    WHERE origin = ? AND seq <= ? AND type NOT IN ({placeholders})
+                    GROUP BY member_uid
+                ''', (origin, through) + MEMBER_EVENTS)
+                held = dict(cursor.fetchall())
+                cursor.execute("SELECT member_uid, amount FROM compacted_balances WHERE origin = ?", (origin,))
+                previous = dict(cursor.fetchall())
+                for member_uid in set(balances) | set(held) | set(previous):
+                    change = balances.get(member_uid, 0) - held.get(member_uid, 0) - previous.get(member_uid, 0)
+                    cursor.execute("UPDATE users SET balance = balance + ? WHERE member_uid = ?", (change, member_uid))
+                
+                cursor.execute(f'''
+                    DELETE FROM ledger_events
+                    WHERE origin = ? AND seq <= ? AND type NOT IN ({placeholders})
+                ''', (origin, through) + MEMBER_EVENTS)
+                cursor.execute("DELETE FROM compacted_balances WHERE origin = ?", (origin,))
+                cursor.executemany('''
+                    INSERT INTO compacted_balances (origin, member_uid, amount)
+                    VALUES (?, ?, ?)
+                ''', [(origin, member_uid, amount) for member_uid, amount in balances.items()])
+                # A rebuilt terminal must not hand out its own compacted seqs again
+                cursor.execute('''
+                    INSERT INTO ledger_state (origin, last_seq, compacted_seq)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(origin) DO UPDATE
+                    SET compacted_seq = excluded.compacted_seq, last_seq = MAX(last_seq, excluded.last_seq)
+                ''', (origin, through, through))
+                adopted += 1
+            conn.commit()
+            return adopted
+        except Exception as e:
+            conn.rollback()
+            print(f"Error applying ledger snapshots: {str(e)}")
+            raise
+        finally:
+            conn.close()
+
+    def rebuild_balances(self):
+        """Recompute every balance from its baseline and the ledger events."""
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
             cursor.execute('''
-                SELECT amount, type, description, timestamp
-                FROM transactions
-                WHERE user_id = ?
-                ORDER BY timestamp DESC
+                UPDATE users
+                SET balance = event_baseline + COALESCE(
+                    (SELECT SUM(amount) FROM compacted_balances c WHERE c.member_uid = users.member_uid), 0) + COALESCE(
+                    (SELECT SUM(amount) FROM ledger_events e WHERE e.user_id = users.id), 0)
+            ''')
+            conn.commit()
+            return True, "Balances rebuilt from ledger events"
+        except Exception as e:
+            return False, f"Error rebuilding balances: {str(e)}"
+        finally:
+            conn.close()
+
+    @wallet_operation
+    def get_transaction_history(self, user_id, limit=10):
+        """Get transaction history for a user."""
+        return [
+            {
+                'amount': entry['amount'],
+                'type': entry['type'],
+                'description': entry['description'],
+                'timestamp': entry['timestamp']
+            }
+            for entry in self.get_ledger(user_id=user_id, limit=limit)
+        ]
+
+    @wallet_operation
+    def get_ledger(self, user_id=None, transaction_type=None, start=None, end=None, limit=100):
+        """Get ledger entries, newest first, with the balance after each entry.
+
+        Rows older than the archive horizon live in monthly archive databases;
+        those are only attached when the hot table cannot satisfy the request
+        and the requested range reaches back past the horizon. start and end
+        are inclusive 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' strings.
+        """
+        if end and len(end) == 10:
+            end += ' 23:59:59'
+
+        filters = []
+        params = []
+        if user_id is not None:
+            filters.append("t.user_id = ?")
+            params.append(user_id)
+        if transaction_type:
+            filters.append("t.type = ?")
+            params.append(transaction_type)
+        if start:
+            filters.append("t.timestamp >= ?")
+            params.append(start)
+        if end:
+            filters.append("t.timestamp <= ?")
+            params.append(end)
+        where = " AND ".join(filters) or "1=1"
+
+        try:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+
+            # Hot rows: running balance continues from the archive checkpoint
+            cursor.execute(f'''
+                SELECT t.id, t.user_id, u.name, t.amount, t.type, t.description, t.timestamp,
+                       COALESCE(c.balance, 0) +
+                       (SELECT SUM(amount) FROM transactions
+                        WHERE user_id = t.user_id
+                        AND (timestamp < t.timestamp OR (timestamp = t.timestamp AND id <= t.id)))
+                FROM transactions t
+                JOIN users u ON t.user_id = u.id
+                LEFT JOIN balance_checkpoints c ON c.user_id = t.user_id
+                WHERE {where}
+                ORDER BY t.timestamp DESC, t.id DESC
                 LIMIT ?
-            ''', (user_id, limit))
-            
-            transactions = []
-            for row in cursor.fetchall():
-                transactions.append({
-                    'amount': Decimal(str(row[0])),
-                    'type': row[1],
-                    'description': row[2],
-                    'timestamp': row[3]
-                })
-            
-            return transactions
+            ''', params + [limit])
+            entries = [self._ledger_entry(row, None) for row in cursor.fetchall()]
+
+            if len(entries) < limit:
+                cursor.execute("SELECT MAX(as_of) FROM balance_checkpoints")
+                horizon = cursor.fetchone()[0]
+                if horizon and (not start or start < horizon):
+                    entries.extend(self._archived_ledger(
+                        conn, where, params, start, end, limit - len(entries)))
+
+            return entries
         except Exception as e:
-            print(f"Error getting transaction history: {str(e)}")
+            print(f"Error getting ledger: {str(e)}")
             return []
         finally:
             conn.close()
 
+    def _archived_ledger(self, conn, where, params, start, end, limit):
+        """Read ledger rows from monthly archives, newest month first."""
+        entries = []
+        cursor = conn.cursor()
+        for month in archived_months(self.archive_dir):
+            if len(entries) >= limit:
+                break
+            if end and month > end[:7]:
+                continue
+            if start and month < start[:7]:
+                break
+
+            cursor.execute("ATTACH DATABASE ? AS archive", (archive_path(self.archive_dir, month),))
+            try:
+                cursor.execute(f'''
+                    SELECT t.id, t.user_id, u.name, t.amount, t.type, t.description, t.timestamp,
+                           t.balance_after
+                    FROM archive.transactions t
+                    JOIN users u ON t.user_id = u.id
+                    WHERE {where}
+                    ORDER BY t.timestamp DESC, t.id DESC
+                    LIMIT ?
+                ''', params + [limit - len(entries)])
+                entries.extend(self._ledger_entry(row, month) for row in cursor.fetchall())
+            finally:
+                cursor.execute("DETACH DATABASE archive")
+        return entries
+
+    def _ledger_entry(self, row, archive_month):
+        return {
+            'id': row[0],
+            'user_id': row[1],
+            'name': row[2],
+            'amount': Money(row[3] or 0),
+            'type': row[4],
+            'description': row[5],
+            'timestamp': row[6],
+            'balance_after': Money(row[7] or 0),
+            'archive_month': archive_month
+        }
+
+    @wallet_operation
     def get_all_users(self):
         """Get all users from the database."""
         try:
@@ -341,7 +1095,7 @@ class UserManagement:
                     'phone': row[2],
                     'email': row[3],
                     'rfid_tag': row[4],
-                    'balance': Decimal(str(row[5])),
+                    'balance': Money(row[5] or 0),
                     'discount_rate': Decimal(str(row[6]))
                 })
             
@@ -352,22 +1106,42 @@ class UserManagement:
         finally:
             conn.close()
 
+    @server_only
     def delete_user(self, user_id):
-        """Delete a user from the database."""
+        """Delete a user, with their tags, events and ledger rows, from the database."""
+        # Peers would only send the member and their events back
+        if load_replication_config()['enabled']:
+            return False, "Turn off [Replication] before deleting users; peers still hold this member and their events"
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
             
-            cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            cursor.execute("BEGIN TRANSACTION")
+            cursor.execute("SELECT member_uid FROM users WHERE id = ?", (user_id,))
+            row = cursor.fetchone()
+            if not row:
+                conn.rollback()
+                return False, "User not found"
+            cursor.execute("DELETE FROM transactions WHERE user_id = ?", (user_id,))
+            cursor.execute("DELETE FROM ledger_events WHERE user_id = ? OR member_uid = ?", (user_id, row[0]))
+            cursor.execute("DELETE FROM compacted_balances WHERE member_uid = ?", (row[0],))
+            cursor.execute("DELETE FROM balance_checkpoints WHERE user_id = ?", (user_id,))
+            cursor.execute("DELETE FROM rfid_tags WHERE user_id = ?", (user_id,))
+            cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
             conn.commit()
             return True, "User deleted successfully"
         except Exception as e:
+            conn.rollback()
             return False, f"Error deleting user: {str(e)}"
         finally:
             conn.close()
 
+    @server_only
     def clear_all_data(self):
         """Clear all data from the database."""
+        # Peers would only send everything back
+        if load_replication_config()['enabled']:
+            return False, "Turn off [Replication] before clearing data; peers still hold these members and events"
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
@@ -377,14 +1151,22 @@ class UserManagement:
             
             # Delete all data from tables in correct order (respecting foreign keys)
             cursor.execute("DELETE FROM transactions")
+            cursor.execute("DELETE FROM ledger_events")
+            cursor.execute("DELETE FROM compacted_balances")
+            cursor.execute("DELETE FROM balance_checkpoints")
             cursor.execute("DELETE FROM rfid_tags")
             cursor.execute("DELETE FROM users")
             
-            # Reset auto-increment counters
+            # Reset auto-increment counters; ledger_state keeps event seqs increasing
             cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('users', 'rfid_tags', 'transactions')")
             
             # Commit transaction
             conn.commit()
+            
+            # Archived ledger rows refer to the deleted user ids
+            for month in archived_months(self.archive_dir):
+                os.remove(archive_path(self.archive_dir, month))
+            
             return True, "All data cleared successfully"
         except Exception as e:
             conn.rollback()
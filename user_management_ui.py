@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from user_management import UserManagement
-from decimal import Decimal
+from money import Money
+from order_model import parse_order_line
 import sqlite3
 from datetime import datetime, timedelta
 import os
@@ -234,6 +235,8 @@ class UserManagementUI:
         refresh_button.pack(pady=5)
         
         # Load initial data
+        self.user_filter_ids = {}
+        self.ledger_entries = {}
         self.load_user_filter()
         self.load_transactions()
 
@@ -363,122 +366,86 @@ class UserManagementUI:
         if not selected:
             return
         
-        # Get the selected item's values
-        item = self.transaction_tree.item(selected[0])
-        values = item['values']
-        
         # Clear the details text
         self.details_text.delete(1.0, tk.END)
         
-        # Get the full transaction details from the database
-        try:
-            conn = sqlite3.connect(self.user_management.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT t.description, t.type, t.amount, t.timestamp,
-                       (SELECT SUM(amount) FROM transactions 
-                        WHERE user_id = t.user_id 
-                        AND timestamp <= t.timestamp) as balance
-                FROM transactions t
-                JOIN users u ON t.user_id = u.id
-                WHERE u.name = ? AND t.timestamp = ?
-            ''', (values[0], values[3]))  # User name and timestamp
-            
-            transaction = cursor.fetchone()
-            if transaction:
-                description, type_, amount, timestamp, balance = transaction
-                
-                # Format the details with proper spacing
-                self.details_text.insert(tk.END, f"Transaction Type: {type_.title()}\n")
-                self.details_text.insert(tk.END, f"Amount: R{amount}\n")
-                self.details_text.insert(tk.END, f"Date: {timestamp}\n")
-                self.details_text.insert(tk.END, f"Balance After: R{balance}\n\n")
-                
-                # Add description with proper formatting
-                if description:
-                    self.details_text.insert(tk.END, "Details:\n")
-                    self.details_text.insert(tk.END, description)
-                
-                # Configure tags for better formatting
-                self.details_text.tag_configure("bold", font=('Arial', 10, 'bold'))
-                self.details_text.tag_add("bold", "1.0", "1.end")
-                self.details_text.tag_add("bold", "2.0", "2.end")
-                self.details_text.tag_add("bold", "3.0", "3.end")
-                self.details_text.tag_add("bold", "4.0", "4.end")
-                self.details_text.tag_add("bold", "6.0", "6.end")
-            
-        except Exception as e:
-            print(f"Error loading transaction details: {str(e)}")
+        # Details come from the ledger rows loaded for the list
+        transaction = self.ledger_entries.get(selected[0])
+        if not transaction:
             self.details_text.insert(tk.END, "Error loading transaction details")
-        finally:
-            conn.close()
+            return
+        
+        # Format the details with proper spacing
+        self.details_text.insert(tk.END, f"Transaction Type: {(transaction['type'] or '').title()}\n")
+        self.details_text.insert(tk.END, f"Amount: R{transaction['amount']}\n")
+        self.details_text.insert(tk.END, f"Date: {transaction['timestamp']}\n")
+        self.details_text.insert(tk.END, f"Balance After: R{transaction['balance_after']}\n\n")
+        
+        # Add description with proper formatting
+        if transaction['description']:
+            self.details_text.insert(tk.END, "Details:\n")
+            self.details_text.insert(tk.END, transaction['description'])
+        
+        # Configure tags for better formatting
+        self.details_text.tag_configure("bold", font=('Arial', 10, 'bold'))
+        self.details_text.tag_add("bold", "1.0", "1.end")
+        self.details_text.tag_add("bold", "2.0", "2.end")
+        self.details_text.tag_add("bold", "3.0", "3.end")
+        self.details_text.tag_add("bold", "4.0", "4.end")
+        self.details_text.tag_add("bold", "6.0", "6.end")
 
     def load_transactions(self):
         # Clear existing items
         for item in self.transaction_tree.get_children():
             self.transaction_tree.delete(item)
+        self.ledger_entries = {}
         
         # Clear details
         self.details_text.delete(1.0, tk.END)
         
         try:
-            conn = sqlite3.connect(self.user_management.db_name)
-            cursor = conn.cursor()
-            
-            # Build the query with filters
-            query = '''
-                SELECT t.id, u.name, t.amount, t.type, t.timestamp,
-                       (SELECT SUM(amount) FROM transactions 
-                        WHERE user_id = t.user_id 
-                        AND timestamp <= t.timestamp) as balance
-                FROM transactions t
-                JOIN users u ON t.user_id = u.id
-                WHERE 1=1
-            '''
-            params = []
-            
             # Add user filter
+            user_id = None
             if self.user_filter.get() != 'All':
-                query += " AND u.name = ?"
-                params.append(self.user_filter.get())
+                user_id = self.user_filter_ids.get(self.user_filter.get())
             
             # Add type filter
+            transaction_type = None
             if self.type_filter.get() != 'All':
-                query += " AND t.type = ?"
-                params.append(self.type_filter.get())
+                transaction_type = self.type_filter.get()
             
             # Add date filter
-            date_filter = self.date_filter.get().strip()
+            date_filter = self.date_filter.get().strip() or None
             if date_filter:
                 try:
                     # Try to parse the date
                     datetime.strptime(date_filter, '%Y-%m-%d')
-                    query += " AND DATE(t.timestamp) = ?"
-                    params.append(date_filter)
                 except ValueError:
                     messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD")
                     return
             
-            # Add ordering and limit
-            query += " ORDER BY t.timestamp DESC LIMIT 100"
-            
-            cursor.execute(query, params)
-            
-            for row in cursor.fetchall():
-                self.transaction_tree.insert("", "end", values=(
-                    row[1],  # User name
-                    f"R{row[2]}",  # Amount
-                    row[3],  # Type
-                    row[4],  # Date
-                    f"R{row[5]}"  # Balance
+            # Archives are only attached if the range reaches past the hot ledger
+            entries = self.user_management.get_ledger(
+                user_id=user_id,
+                transaction_type=transaction_type,
+                start=date_filter,
+                end=date_filter,
+                limit=100
+            )
+            
+            for entry in entries:
+                item_id = self.transaction_tree.insert("", "end", values=(
+                    entry['name'],  # User name
+                    f"R{entry['amount']}",  # Amount
+                    entry['type'],  # Type
+                    entry['timestamp'],  # Date
+                    f"R{entry['balance_after']}"  # Balance
                 ))
+                self.ledger_entries[item_id] = entry
                 
         except Exception as e:
             print(f"Error loading transactions: {str(e)}")
             messagebox.showerror("Error", f"Failed to load transactions: {str(e)}")
-        finally:
-            conn.close()
 
     def load_user_filter(self):
         """Load users into the user filter combobox."""
@@ -486,8 +453,10 @@ class UserManagementUI:
             conn = sqlite3.connect(self.user_management.db_name)
             cursor = conn.cursor()
             
-            cursor.execute('SELECT name FROM users ORDER BY name')
-            users = ['All'] + [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT id, name FROM users ORDER BY name')
+            rows = cursor.fetchall()
+            self.user_filter_ids = {name: user_id for user_id, name in rows}
+            users = ['All'] + [name for _, name in rows]
             
             self.user_filter['values'] = users
             self.user_filter.set('All')
@@ -536,8 +505,8 @@ class UserManagementUI:
                 rfid_tags = [row[0] for row in cursor.fetchall()]
                 rfid_tags_str = ", ".join(rfid_tags) if rfid_tags else "No tags"
                 
-                # Format balance with 2 decimal places
-                balance = f"R{float(user[4]):.2f}"
+                # Format balance from integer cents
+                balance = f"R{Money(user[4] or 0)}"
                 
                 # Format discount rate
                 discount = f"{float(user[5]):.1f}%"
@@ -718,7 +687,7 @@ class UserManagementUI:
             user_data = {
                 'id': user[0],
                 'name': user[1],
-                'balance': Decimal(str(user[2]))
+                'balance': Money(user[2] or 0)
             }
             
             dialog = tk.Toplevel(self.root)
@@ -740,10 +709,10 @@ class UserManagementUI:
                         messagebox.showerror("Error", "Please enter an amount")
                         return
                     
-                    # Convert to Decimal
+                    # Convert to integer cents
                     try:
-                        amount = Decimal(amount_str)
-                    except:
+                        amount = Money.parse(amount_str)
+                    except ValueError:
                         messagebox.showerror("Error", "Please enter a valid number")
                         return
                     
@@ -755,7 +724,7 @@ class UserManagementUI:
                     
                     success, message = self.user_management.update_balance(
                         int(user_data['id']),  # Ensure ID is integer
-                        float(amount),  # Convert Decimal to float for database
+                        amount,
                         "load",
                         "Money loaded to account"
                     )
@@ -908,8 +877,8 @@ class UserManagementUI:
             rfid_tags = self.user_management.get_user_rfid_tags(user['id'])
             rfid_tags_str = ", ".join(rfid_tags) if rfid_tags else "No tags"
             
-            # Format balance with 2 decimal places
-            balance = f"R{user['balance']:.2f}"
+            # Format balance from integer cents
+            balance = f"R{user['balance']}"
             
             # Format discount rate
             discount = f"{user['discount_rate']:.1f}%"
@@ -959,8 +928,8 @@ class UserManagementUI:
             
             # Initialize data structures
             wyvern_transactions = []
-            total_sales = Decimal('0.00')
-            total_discounts = Decimal('0.00')
+            total_sales = Money(0)
+            total_discounts = Money(0)
             
             # Process all transaction log files in the date range
             current_date = start_date
@@ -994,14 +963,13 @@ class UserManagementUI:
                                         card_id = payment_method.replace('wyvern_card_', '')
                                         payment_method = 'wyvern'
                                 elif line.startswith('Total Amount:'):
-                                    total_amount = Decimal(line.split('R')[1].strip())
+                                    total_amount = Money.parse(line.split(': ')[1])
                                 elif line.startswith('Discount Amount:'):
-                                    discount_amount = Decimal(line.split('R')[1].strip())
+                                    discount_amount = Money.parse(line.split(': ')[1])
                                 elif line.startswith('- '):
-                                    item_line = line[2:].strip()
-                                    if ' - ' in item_line:
-                                        item_name, item_price = item_line.split(' - ')
-                                        items.append((item_name.strip(), item_price.strip()))
+                                    parsed = parse_order_line(line[2:])
+                                    if parsed:
+                                        items.append(parsed)
                             
                             if payment_method == 'wyvern' and total_amount and timestamp:
                                 trans_time = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
@@ -1015,7 +983,7 @@ class UserManagementUI:
                                     'timestamp': trans_time,
                                     'card_id': card_id,
                                     'amount': total_amount,
-                                    'discount_amount': discount_amount or Decimal('0.00'),
+                                    'discount_amount': discount_amount or Money(0),
                                     'items': items
                                 }
                                 
@@ -1039,22 +1007,22 @@ class UserManagementUI:
                 for trans in sorted(wyvern_transactions, key=lambda x: x['timestamp']):
                     self.sales_report_text.insert(tk.END, f"Time: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
                     self.sales_report_text.insert(tk.END, f"Card ID: {trans['card_id']}\n")
-                    self.sales_report_text.insert(tk.END, f"Total Amount: R{trans['amount']:.2f}\n")
+                    self.sales_report_text.insert(tk.END, f"Total Amount: R{trans['amount']}\n")
                     if trans['discount_amount'] > 0:
-                        self.sales_report_text.insert(tk.END, f"Discount Amount: R{trans['discount_amount']:.2f}\n")
-                        self.sales_report_text.insert(tk.END, f"Amount After Discount: R{(trans['amount'] - trans['discount_amount']):.2f}\n")
+                        self.sales_report_text.insert(tk.END, f"Discount Amount: R{trans['discount_amount']}\n")
+                        self.sales_report_text.insert(tk.END, f"Amount After Discount: R{(trans['amount'] - trans['discount_amount'])}\n")
                     self.sales_report_text.insert(tk.END, "Items:\n")
-                    for item_name, item_price in trans['items']:
-                        self.sales_report_text.insert(tk.END, f"  - {item_name}: {item_price}\n")
+                    for item_name, quantity, item_total in trans['items']:
+                        self.sales_report_text.insert(tk.END, f"  - {item_name}{f' x{quantity}' if quantity > 1 else ''}: R{item_total}\n")
                     self.sales_report_text.insert(tk.END, "-" * 80 + "\n")
                 
                 # Display summary
                 self.sales_report_text.insert(tk.END, "\nSummary:\n")
                 self.sales_report_text.insert(tk.END, "=" * 80 + "\n")
                 self.sales_report_text.insert(tk.END, f"Total Transactions: {len(wyvern_transactions)}\n")
-                self.sales_report_text.insert(tk.END, f"Total Sales: R{total_sales:.2f}\n")
-                self.sales_report_text.insert(tk.END, f"Total Discounts: R{total_discounts:.2f}\n")
-                self.sales_report_text.insert(tk.END, f"Net Sales: R{(total_sales - total_discounts):.2f}\n")
+                self.sales_report_text.insert(tk.END, f"Total Sales: R{total_sales}\n")
+                self.sales_report_text.insert(tk.END, f"Total Discounts: R{total_discounts}\n")
+                self.sales_report_text.insert(tk.END, f"Net Sales: R{(total_sales - total_discounts)}\n")
             else:
                 self.sales_report_text.insert(tk.END, "No Wyvern card transactions found for the selected period.\n")
             
@@ -1085,7 +1053,7 @@ class UserManagementUI:
             
             # Initialize data structures
             payment_methods = {'cash': 0, 'card': 0, 'wyvern': 0}
-            payment_totals = {'cash': Decimal('0.00'), 'card': Decimal('0.00'), 'wyvern': Decimal('0.00')}
+            payment_totals = {'cash': Money(0), 'card': Money(0), 'wyvern': Money(0)}
             item_counts = {}
             total_items = 0
             
@@ -1119,14 +1087,13 @@ class UserManagementUI:
                                     if payment_method.startswith('wyvern_card_'):
                                         payment_method = 'wyvern'
                                 elif line.startswith('Total Amount:'):
-                                    total_amount = Decimal(line.split('R')[1].strip())
+                                    total_amount = Money.parse(line.split(': ')[1])
                                 elif line.startswith('Discount Amount:'):
-                                    discount_amount = Decimal(line.split('R')[1].strip())
+                                    discount_amount = Money.parse(line.split(': ')[1])
                                 elif line.startswith('- '):
-                                    item_line = line[2:].strip()
-                                    if ' - ' in item_line:
-                                        item_name, item_price = item_line.split(' - ')
-                                        items.append((item_name.strip(), item_price.strip()))
+                                    parsed = parse_order_line(line[2:])
+                                    if parsed:
+                                        items.append(parsed)
                             
                             if payment_method and total_amount and timestamp:
                                 trans_time = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
@@ -1141,10 +1108,10 @@ class UserManagementUI:
                                     payment_totals[payment_method] += total_amount
                                 
                                 # Update item counts
-                                for item_name, item_price in items:
+                                for item_name, quantity, item_total in items:
                                     item_key = f"{item_name} ({payment_method})"
-                                    item_counts[item_key] = item_counts.get(item_key, 0) + 1
-                                    total_items += 1
+                                    item_counts[item_key] = item_counts.get(item_key, 0) + quantity
+                                    total_items += quantity
                 
                 # Increment date by one day
                 current_date = current_date + timedelta(days=1)
@@ -1156,10 +1123,10 @@ class UserManagementUI:
             # Display payment method summary
             self.menu_items_report_text.insert(tk.END, "Payment Method Summary:\n")
             self.menu_items_report_text.insert(tk.END, "-" * 80 + "\n")
-            self.menu_items_report_text.insert(tk.END, f"Cash Sales: {payment_methods['cash']} transactions (R{payment_totals['cash']:.2f})\n")
-            self.menu_items_report_text.insert(tk.END, f"Card Sales: {payment_methods['card']} transactions (R{payment_totals['card']:.2f})\n")
-            self.menu_items_report_text.insert(tk.END, f"Wyvern Card Sales: {payment_methods['wyvern']} transactions (R{payment_totals['wyvern']:.2f})\n")
-            self.menu_items_report_text.insert(tk.END, f"Total Sales: R{sum(payment_totals.values()):.2f}\n\n")
+            self.menu_items_report_text.insert(tk.END, f"Cash Sales: {payment_methods['cash']} transactions (R{payment_totals['cash']})\n")
+            self.menu_items_report_text.insert(tk.END, f"Card Sales: {payment_methods['card']} transactions (R{payment_totals['card']})\n")
+            self.menu_items_report_text.insert(tk.END, f"Wyvern Card Sales: {payment_methods['wyvern']} transactions (R{payment_totals['wyvern']})\n")
+            self.menu_items_report_text.insert(tk.END, f"Total Sales: R{sum(payment_totals.values(), Money(0))}\n\n")
             
             # Display item sales by payment method
             if item_counts:
@@ -1252,8 +1219,8 @@ class UserManagementUI:
             # Initialize data structures
             cash_transactions = []
             card_transactions = []
-            total_cash = Decimal('0.00')
-            total_card = Decimal('0.00')
+            total_cash = Money(0)
+            total_card = Money(0)
             
             # Process all transaction log files in the date range
             current_date = start_date
@@ -1284,12 +1251,11 @@ class UserManagementUI:
                                     if payment_method.startswith('wyvern_card_'):
                                         payment_method = 'wyvern'
                                 elif line.startswith('Total Amount:'):
-                                    total_amount = Decimal(line.split('R')[1].strip())
+                                    total_amount = Money.parse(line.split(': ')[1])
                                 elif line.startswith('- '):
-                                    item_line = line[2:].strip()
-                                    if ' - ' in item_line:
-                                        item_name, item_price = item_line.split(' - ')
-                                        items.append((item_name.strip(), item_price.strip()))
+                                    parsed = parse_order_line(line[2:])
+                                    if parsed:
+                                        items.append(parsed)
                             
                             if payment_method and total_amount and timestamp:
                                 trans_time = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
@@ -1332,10 +1298,10 @@ class UserManagementUI:
                 self.report_text.insert(tk.END, "-" * 80 + "\n")
                 for trans in sorted(cash_transactions, key=lambda x: x['timestamp']):
                     self.report_text.insert(tk.END, f"Time: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    self.report_text.insert(tk.END, f"Amount: R{trans['amount']:.2f}\n")
+                    self.report_text.insert(tk.END, f"Amount: R{trans['amount']}\n")
                     self.report_text.insert(tk.END, "Items:\n")
-                    for item_name, item_price in trans['items']:
-                        self.report_text.insert(tk.END, f"  - {item_name}: {item_price}\n")
+                    for item_name, quantity, item_total in trans['items']:
+                        self.report_text.insert(tk.END, f"  - {item_name}{f' x{quantity}' if quantity > 1 else ''}: R{item_total}\n")
                     self.report_text.insert(tk.END, "-" * 80 + "\n")
             
             # Display card transactions
@@ -1344,19 +1310,19 @@ class UserManagementUI:
                 self.report_text.insert(tk.END, "-" * 80 + "\n")
                 for trans in sorted(card_transactions, key=lambda x: x['timestamp']):
                     self.report_text.insert(tk.END, f"Time: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    self.report_text.insert(tk.END, f"Amount: R{trans['amount']:.2f}\n")
+                    self.report_text.insert(tk.END, f"Amount: R{trans['amount']}\n")
                     self.report_text.insert(tk.END, "Items:\n")
-                    for item_name, item_price in trans['items']:
-                        self.report_text.insert(tk.END, f"  - {item_name}: {item_price}\n")
+                    for item_name, quantity, item_total in trans['items']:
+                        self.report_text.insert(tk.END, f"  - {item_name}{f' x{quantity}' if quantity > 1 else ''}: R{item_total}\n")
                     self.report_text.insert(tk.END, "-" * 80 + "\n")
             
             # Display summary
             self.report_text.insert(tk.END, "\nSummary:\n")
             self.report_text.insert(tk.END, "=" * 80 + "\n")
-            self.report_text.insert(tk.END, f"Total Cash Transactions: {len(cash_transactions)} (R{total_cash:.2f})\n")
-            self.report_text.insert(tk.END, f"Total Card Transactions: {len(card_transactions)} (R{total_card:.2f})\n")
+            self.report_text.insert(tk.END, f"Total Cash Transactions: {len(cash_transactions)} (R{total_cash})\n")
+            self.report_text.insert(tk.END, f"Total Card Transactions: {len(card_transactions)} (R{total_card})\n")
             self.report_text.insert(tk.END, f"Total Transactions: {len(cash_transactions) + len(card_transactions)}\n")
-            self.report_text.insert(tk.END, f"Total Sales: R{(total_cash + total_card):.2f}\n")
+            self.report_text.insert(tk.END, f"Total Sales: R{(total_cash + total_card)}\n")
             
         except ValueError as e:
             messagebox.showerror("Error", "Please enter valid dates in YYYY-MM-DD format")
@@ -1436,7 +1402,7 @@ class UserManagementUI:
                 email = email_entry.get().strip()
                 rfid = rfid_entry.get().strip()
                 discount_rate = float(discount_entry.get().strip())
-                opening_balance = float(balance_entry.get().strip())
+                opening_balance = Money.parse(balance_entry.get().strip())
                 
                 if not name or not rfid:
                     messagebox.showerror("Error", "Name and RFID tag are required")
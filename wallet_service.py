@@ -0,0 +1,379 @@
+import os
+import hmac
+import json
+import uuid
+import queue
+import socket
+import select
+import sqlite3
+import struct
+import hashlib
+import logging
+import threading
+import configparser
+import socketserver
+from decimal import Decimal
+from money import Money
+
+# Each frame is a 4-byte big-endian length followed by a compact JSON body.
+# Requests carry an id so a client can pipeline several before reading replies.
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# UserManagement methods exposed over the network. Deleting members and
+# clearing the ledger are only done at the wallet server itself.
+WALLET_OPERATIONS = {
+    'get_user_by_rfid', 'get_user_rfid_tags', 'get_transaction_history', 'get_ledger',
+    'get_all_users', 'add_user', 'add_rfid_tag', 'remove_rfid_tag', 'update_user',
+    'update_balance'
+}
+
+# Operations that are safe to retry on a fresh connection
+READ_OPERATIONS = {
+    'get_user_by_rfid', 'get_user_rfid_tags', 'get_transaction_history', 'get_ledger',
+    'get_all_users'
+}
+
+# Results of write requests by the client's idempotency key, kept in the
+# server's users.db so a write whose reply was lost can be resent safely,
+# even across a server restart
+REPLIES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS wallet_replies (
+        key TEXT PRIMARY KEY,
+        result TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Days a write's reply is kept for a resend
+REPLY_RETENTION_DAYS = 1
+
+# Result fields decoded back into Money / Decimal on the client
+MONEY_FIELDS = {'balance', 'amount', 'balance_after'}
+DECIMAL_FIELDS = {'discount_rate'}
+
+
+def load_wallet_config(config_file='settings.cfg'):
+    """Load wallet service settings, falling back to a local database."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return {
+        'mode': config.get('Wallet', 'mode', fallback='local'),
+        'host': config.get('Wallet', 'host', fallback='127.0.0.1'),
+        'port': config.getint('Wallet', 'port', fallback=8765),
+        'pool_size': config.getint('Wallet', 'pool_size', fallback=4),
+        'timeout': config.getfloat('Wallet', 'timeout', fallback=3.0)
+    }
+
+
+def load_network_config(config_file='settings.cfg'):
+    """Load the shared secret and listening interface used by all till network services."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    allowed_hosts = config.get('Network', 'allowed_hosts', fallback='')
+    return {
+        'secret': config.get('Network', 'secret', fallback=''),
+        'bind': config.get('Network', 'bind', fallback='127.0.0.1'),
+        'allowed_hosts': [host.strip() for host in allowed_hosts.split(',') if host.strip()],
+        'handshake_timeout': config.getfloat('Network', 'handshake_timeout', fallback=3.0)
+    }
+
+
+class WalletOutcomeUnknown(ConnectionError):
+    """A write was sent but no reply came back, even after resending it."""
+
+
+def is_loopback(host):
+    return host == 'localhost' or host.startswith('127.') or host == '::1'
+
+
+def handshake_mac(secret, challenge):
+    return hmac.new(secret.encode('utf-8'), challenge.encode('ascii'), hashlib.sha256).hexdigest()
+
+
+def server_handshake(sock, sock_file, client_address, network):
+    """Challenge a new connection to prove it knows the shared secret. Returns True if it does.
+
+    Without a secret configured only this machine is trusted.
+    """
+    host = client_address[0]
+    if network['allowed_hosts'] and host not in network['allowed_hosts'] and not is_loopback(host):
+        return False
+    if not network['secret'] and not is_loopback(host):
+        return False
+    challenge = os.urandom(16).hex()
+    sock.settimeout(network['handshake_timeout'])
+    try:
+        send_frame(sock, {'challenge': challenge})
+        reply = recv_frame(sock_file)
+    except (OSError, ValueError):
+        return False
+    sock.settimeout(None)
+    if not isinstance(reply, dict) or not isinstance(reply.get('auth'), str):
+        return False
+    return hmac.compare_digest(reply['auth'], handshake_mac(network['secret'], challenge))
+
+
+def client_handshake(sock, sock_file, secret):
+    """Answer a server's challenge on a new connection."""
+    challenge = recv_frame(sock_file)
+    if not isinstance(challenge, dict) or 'challenge' not in challenge:
+        raise ConnectionError("Server refused the connection (check [Network] secret and allowed_hosts)")
+    send_frame(sock, {'auth': handshake_mac(secret, challenge['challenge'])})
+
+
+def send_frame(sock, message):
+    body = json.dumps(message, separators=(',', ':'), default=str).encode('utf-8')
+    sock.sendall(FRAME_HEADER.pack(len(body)) + body)
+
+
+def recv_frame(sock_file):
+    """Read one frame from a socket file, or return None on a clean close."""
+    header = sock_file.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise ConnectionError("Connection closed mid-frame")
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {length} bytes")
+    body = sock_file.read(length)
+    if len(body) < length:
+        raise ConnectionError("Connection closed mid-frame")
+    return json.loads(body)
+
+
+def decode_result(value):
+    """Restore Money and Decimal fields in a result received over the wire."""
+    if isinstance(value, list):
+        return [decode_result(item) for item in value]
+    if isinstance(value, dict):
+        decoded = {}
+        for key, item in value.items():
+            if key in MONEY_FIELDS and item is not None:
+                decoded[key] = Money(item)
+            elif key in DECIMAL_FIELDS and item is not None:
+                decoded[key] = Decimal(str(item))
+            else:
+                decoded[key] = decode_result(item)
+        return decoded
+    return value
+
+
+class WalletRequestHandler(socketserver.StreamRequestHandler):
+    """Serves pipelined wallet requests on one client connection."""
+
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        if not server_handshake(self.request, self.rfile, self.client_address, self.server.network):
+            self.server.logger.warning(f"Rejected unauthenticated wallet client {self.client_address}")
+            return
+        while True:
+            try:
+                request = recv_frame(self.rfile)
+            except (ConnectionError, ValueError) as e:
+                self.server.logger.warning(f"Dropping wallet client {self.client_address}: {e}")
+                return
+            if request is None:
+                return
+            send_frame(self.request, self.server.dispatch(request))
+
+
+class WalletServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Owns the SQLite ledger and serves UserManagement calls to the tills."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, user_management, host='127.0.0.1', port=8765, network=None):
+        super().__init__((host, port), WalletRequestHandler)
+        self.user_management = user_management
+        self.network = network or load_network_config()
+        self.logger = logging.getLogger(__name__)
+        # Writers queue here instead of contending for SQLite's file lock
+        self.write_lock = threading.Lock()
+        conn = sqlite3.connect(self.user_management.db_name)
+        try:
+            conn.execute(REPLIES_TABLE)
+            conn.execute("DELETE FROM wallet_replies WHERE created_at < datetime('now', ?)",
+                         (f'-{REPLY_RETENTION_DAYS} days',))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def dispatch(self, request):
+        request_id = request.get('id')
+        operation = request.get('op')
+        if operation not in WALLET_OPERATIONS:
+            return {'id': request_id, 'ok': False, 'error': f"Unknown operation: {operation}"}
+        try:
+            method = getattr(self.user_management, operation)
+            args = request.get('args', [])
+            kwargs = request.get('kwargs', {})
+            if operation in READ_OPERATIONS:
+                result = method(*args, **kwargs)
+            else:
+                with self.write_lock:
+                    # A resent write gets the first attempt's result instead of running again
+                    key = request.get('key')
+                    conn = sqlite3.connect(self.user_management.db_name)
+                    try:
+                        row = conn.execute("SELECT result FROM wallet_replies WHERE key = ?", (key,)).fetchone()
+                        if row:
+                            return {'id': request_id, 'ok': True, 'result': json.loads(row[0])}
+                        result = method(*args, **kwargs)
+                        if key:
+                            conn.execute("INSERT INTO wallet_replies (key, result) VALUES (?, ?)",
+                                         (key, json.dumps(result, default=str)))
+                            conn.commit()
+                    finally:
+                        conn.close()
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            self.logger.error(f"Error handling {operation}: {e}")
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+
+class WalletClient:
+    """Pooled, pipelining client for a WalletServer."""
+
+    def __init__(self, host, port, pool_size=4, timeout=3.0, secret=None):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.secret = load_network_config()['secret'] if secret is None else secret
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.next_id = 0
+        self.id_lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock_file = sock.makefile('rb')
+        try:
+            client_handshake(sock, sock_file, self.secret)
+        except Exception:
+            sock_file.close()
+            sock.close()
+            raise
+        return sock, sock_file
+
+    def _acquire(self):
+        """Take a pooled connection the server has not closed, or open a new one."""
+        while True:
+            try:
+                connection = self.pool.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            # Idle connections have nothing to read; a readable one was closed
+            # by the server (say, on a restart) and would fail the next call
+            readable, _, _ = select.select([connection[0]], [], [], 0)
+            if not readable:
+                return connection
+            self._discard(connection)
+
+    def _release(self, connection):
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        sock, sock_file = connection
+        sock_file.close()
+        sock.close()
+
+    def warm_up(self):
+        """Open a pooled connection ahead of the first call; failures are left to call()."""
+        try:
+            self._release(self._connect())
+        except OSError:
+            pass
+
+    def _request_id(self):
+        with self.id_lock:
+            self.next_id += 1
+            return self.next_id
+
+    def call(self, operation, *args, **kwargs):
+        """Run one UserManagement operation on the server."""
+        return self.call_many([(operation, args, kwargs)])[0]
+
+    def call_many(self, calls):
+        """Pipeline several (operation, args, kwargs) calls over one connection.
+
+        All requests are written before any reply is read, so a batch costs a
+        single network round trip. Results are returned in call order.
+        Writes carry an idempotency key, so a batch whose replies were lost is
+        resent once; if that fails too, WalletOutcomeUnknown is raised because
+        the writes may or may not have been made.
+        """
+        requests = [
+            {'id': self._request_id(), 'op': operation, 'args': list(args), 'kwargs': kwargs}
+            for operation, args, kwargs in calls
+        ]
+        for request in requests:
+            if request['op'] not in READ_OPERATIONS:
+                request['key'] = uuid.uuid4().hex
+        writes = any('key' in request for request in requests)
+
+        sent = False
+        for attempt in range(2):
+            connection = None
+            try:
+                connection = self._acquire()
+                sock, sock_file = connection
+                sent = True
+                for request in requests:
+                    send_frame(sock, request)
+                replies = {}
+                while len(replies) < len(requests):
+                    reply = recv_frame(sock_file)
+                    if reply is None:
+                        raise ConnectionError("Wallet server closed the connection")
+                    replies[reply['id']] = reply
+                self._release(connection)
+                break
+            except (OSError, ConnectionError):
+                if connection:
+                    self._discard(connection)
+                if attempt or (writes and not sent):
+                    if writes and sent:
+                        raise WalletOutcomeUnknown(
+                            f"No reply from wallet server {self.address[0]}:{self.address[1]}; "
+                            f"the update may or may not have been made"
+                        )
+                    raise ConnectionError(f"Wallet server {self.address[0]}:{self.address[1]} unavailable")
+
+        results = []
+        for request in requests:
+            reply = replies[request['id']]
+            if not reply['ok']:
+                raise RuntimeError(reply['error'])
+            results.append(decode_result(reply['result']))
+        return results
+
+
+def main():
+    from user_management import UserManagement
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = load_wallet_config()
+    network = load_network_config()
+    if not network['secret'] and not is_loopback(network['bind']):
+        server_logger = logging.getLogger(__name__)
+        server_logger.warning("No [Network] secret set; only clients on this machine will be served")
+    user_management = UserManagement(local=True)
+    server = WalletServer(user_management, network['bind'], config['port'], network)
+    server.logger.info(f"Wallet service listening on {network['bind']}:{config['port']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.logger.info("Wallet service stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()